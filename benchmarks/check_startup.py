@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Check that pdf_minner starts quickly.
+
+Two checks, each in a fresh interpreter:
+  * no heavy module (PDF backends, GUI, ASCII art, subprocess) is loaded by
+    `import pdf_minner` or by `pdf_minner.py convert --help`;
+  * the cumulative import time of pdf_minner (from -X importtime, best of
+    --runs) stays within --budget-ms.
+
+Exits 1 when either check fails, so it can gate CI or a release script.
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cumulative `import pdf_minner` time allowed, in ms (tests/test_startup.py uses it too)
+IMPORT_BUDGET_MS = 40.0
+
+HEAVY = ("pdfminer", "pypdf", "tkinter", "pyfiglet", "subprocess", "numpy", "cProfile", "tracemalloc")
+
+_PROBE = """
+import sys
+sys.path.insert(0, {root!r})
+sys.argv = {argv!r}
+import pdf_minner
+if len(sys.argv) > 1:
+    try:
+        pdf_minner.main(sys.argv[1:])
+    except SystemExit:
+        pass
+heavy = {heavy!r}
+print("HEAVY:" + ",".join(sorted(m for m in sys.modules if m.split(".")[0] in heavy)))
+"""
+
+
+def heavy_modules(argv: list[str]) -> list[str]:
+    code = _PROBE.format(root=str(ROOT), argv=["pdf_minner.py"] + argv, heavy=HEAVY)
+    cp = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    marker = [line for line in cp.stdout.splitlines() if line.startswith("HEAVY:")][-1]
+    return [m for m in marker[len("HEAVY:"):].split(",") if m]
+
+
+def import_ms() -> float:
+    cp = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import pdf_minner"],
+        capture_output=True, text=True, cwd=ROOT, check=True,
+    )
+    for line in reversed(cp.stderr.splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == "pdf_minner":
+            return int(parts[1]) / 1000
+    raise RuntimeError("pdf_minner not found in -X importtime output")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                    help=f"allowed cumulative import time (default: {IMPORT_BUDGET_MS:g})")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    failed = False
+    for label, cli in (("import pdf_minner", []), ("convert --help", ["convert", "--help"])):
+        heavy = heavy_modules(cli)
+        status = "ok" if not heavy else "FAIL"
+        failed |= bool(heavy)
+        print(f"{label:<20} heavy modules: {', '.join(heavy) or 'none'}  [{status}]")
+
+    # Measure the cached-bytecode case even under PYTHONDONTWRITEBYTECODE
+    import py_compile
+    py_compile.compile(str(ROOT / "pdf_minner.py"), doraise=True)
+    best = min(import_ms() for _ in range(args.runs))
+    over = best > args.budget_ms
+    failed |= over
+    print(f"{'import time':<20} {best:.1f} ms (budget {args.budget_ms:g} ms)  [{'FAIL' if over else 'ok'}]")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Time each stage of the PDF Minner pipeline on synthetic documents.
+
+Every (kind, pages) case runs in a fresh interpreter so its peak RSS is
+its own. Results are written as JSON; pass --compare to check a run
+against an earlier one and flag stages that got slower.
+
+    python benchmarks/run_bench.py --sizes 10,100,1000 -o bench.json
+    python benchmarks/run_bench.py --sizes 10,100,1000 --compare bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+sys.path.insert(0, str(HERE))
+
+import pdf_minner as pm  # noqa: E402
+import synth_pdf  # noqa: E402
+
+# Differences below this many seconds are treated as noise when comparing
+NOISE_FLOOR = 0.005
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _timed(stages: dict, name: str, fn, *, repeat: int, pages: int, nbytes: int):
+    best_wall = best_cpu = None
+    out = None
+    for _ in range(repeat):
+        w0, c0 = time.perf_counter(), time.process_time()
+        out = fn()
+        wall, cpu = time.perf_counter() - w0, time.process_time() - c0
+        if best_wall is None or wall < best_wall:
+            best_wall, best_cpu = wall, cpu
+    stages[name] = {
+        "wall": best_wall,
+        "cpu": best_cpu,
+        "pages_per_s": pages / best_wall if best_wall else None,
+        "mb_per_s": nbytes / (1024 * 1024) / best_wall if best_wall else None,
+    }
+    return out
+
+
+def run_case(kind: str, pages: int, seed: int, backends: list[str], repeat: int, workdir: Path) -> dict:
+    data, truth = synth_pdf.make_document(kind, pages, seed)
+    pdf = workdir / f"{kind}-{pages}.pdf"
+    pdf.write_bytes(data)
+    stages: dict = {}
+    case = {"kind": kind, "pages": pages, "seed": seed, "bytes": len(data), "stages": stages}
+
+    text = None
+    for b in backends:
+        out = _timed(stages, f"extract[{b}]", lambda: pm.extract_pdf_text(pdf, backend=b),
+                     repeat=repeat, pages=pages, nbytes=len(data))
+        text = text or out
+    if text is None:
+        # No backend installed: run the text stages on the generator's ground truth
+        text = "\n\f\n".join("\n".join(lines) for lines in truth)
+        case["text_source"] = "synthetic"
+    nchars = len(text.encode("utf-8"))
+
+    page_texts = pm._split_pages(text)
+    kw = {"repeat": repeat, "pages": pages, "nbytes": nchars}
+    _timed(stages, "watermark_detect", lambda: pm.detect_watermark_candidates_with_counts(page_texts), **kw)
+    cands = sorted(pm.detect_watermark_candidates(page_texts))
+    cleaned = _timed(stages, "watermark_remove", lambda: pm.remove_watermarks_by_selection(text, cands), **kw)
+    _timed(stages, "format_detect", lambda: pm.detect_document_format(cleaned), **kw)
+    md = _timed(stages, "format", lambda: pm.format_document_md(cleaned), **kw)
+    md_lines = md.splitlines()
+    _timed(stages, "write", lambda: pm.write_markdown(workdir / "out.md", md_lines), **kw)
+    if backends:
+        _timed(stages, "convert_file", lambda: pm.convert_file(pdf, workdir / "full.md", remove_wm=True),
+               repeat=repeat, pages=pages, nbytes=len(data))
+    case["watermarks_found"] = len(cands)
+    case["peak_rss_mb"] = _peak_rss_mb()
+    return case
+
+
+def _run_case_subprocess(kind: str, pages: int, args) -> dict:
+    cmd = [sys.executable, __file__, "--case", f"{kind}:{pages}", "--seed", str(args.seed),
+           "--repeat", str(args.repeat), "--backends", ",".join(args.backends)]
+    cp = subprocess.run(cmd, capture_output=True, text=True)
+    if cp.returncode != 0:
+        return {"kind": kind, "pages": pages, "error": cp.stderr.strip()[-2000:]}
+    return json.loads(cp.stdout)
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    """Return human-readable regressions of `new` against `old`."""
+    index = {(c["kind"], c["pages"]): c for c in old.get("cases", []) if "stages" in c}
+    problems = []
+    for case in new.get("cases", []):
+        base = index.get((case.get("kind"), case.get("pages")))
+        if not base or "stages" not in case:
+            continue
+        for stage, cur in case["stages"].items():
+            prev = base["stages"].get(stage)
+            if not prev or not prev["wall"]:
+                continue
+            delta = cur["wall"] - prev["wall"]
+            if delta > NOISE_FLOOR and cur["wall"] > prev["wall"] * (1 + threshold):
+                problems.append(
+                    f"{case['kind']}/{case['pages']}p {stage}: {prev['wall'] * 1000:.1f} ms -> "
+                    f"{cur['wall'] * 1000:.1f} ms (+{(cur['wall'] / prev['wall'] - 1) * 100:.0f}%)"
+                )
+        if base.get("peak_rss_mb") and case.get("peak_rss_mb"):
+            if case["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+                problems.append(
+                    f"{case['kind']}/{case['pages']}p peak RSS: {base['peak_rss_mb']:.1f} MB -> "
+                    f"{case['peak_rss_mb']:.1f} MB"
+                )
+    return problems
+
+
+def _print_table(result: dict) -> None:
+    for case in result["cases"]:
+        if "error" in case:
+            print(f"{case['kind']:<12}{case['pages']:>6}p  ERROR {case['error'].splitlines()[-1]}")
+            continue
+        rss = case.get("peak_rss_mb")
+        rss_note = f"peak RSS {rss:.1f} MB" if rss else ""
+        print(f"{case['kind']:<12}{case['pages']:>6}p  {case['bytes'] / 1024:8.0f} KB  {rss_note}")
+        for stage, st in case["stages"].items():
+            pps = f"{st['pages_per_s']:10.0f} pages/s" if st["pages_per_s"] else ""
+            print(f"    {stage:<22}{st['wall'] * 1000:10.2f} ms  {pps}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--kinds", default=",".join(synth_pdf.KINDS))
+    ap.add_argument("--sizes", default="1,10,100", help="comma-separated page counts (1-5000)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    ap.add_argument("--backends", default=None,
+                    help="comma-separated extraction backends (default: every installed one)")
+    ap.add_argument("-o", "--output", type=Path, default=None, help="write results as JSON")
+    ap.add_argument("--compare", type=Path, default=None, help="earlier results to check for regressions")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before flagging (0.15 = 15%%)")
+    ap.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.backends is None:
+        args.backends = [b for b in pm.BACKENDS if pm.backend_available(b)]
+    else:
+        args.backends = [b for b in args.backends.split(",") if b]
+
+    if args.case:
+        kind, pages = args.case.split(":")
+        with tempfile.TemporaryDirectory(prefix="pdf_minner_bench-") as tmp:
+            case = run_case(kind, int(pages), args.seed, args.backends, args.repeat, Path(tmp))
+        json.dump(case, sys.stdout)
+        return 0
+
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backends": args.backends,
+            "formatter_version": pm.FORMATTER_VERSION,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "cases": [_run_case_subprocess(k, n, args) for k in args.kinds.split(",") for n in sizes],
+    }
+    _print_table(result)
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=1), encoding="utf-8")
+        print(f"\nSaved {args.output}")
+
+    if args.compare:
+        problems = compare(json.loads(args.compare.read_text(encoding="utf-8")), result, args.threshold)
+        if problems:
+            print(f"\n{len(problems)} regression(s) against {args.compare}:")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print(f"\nNo regressions against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic PDFs for benchmarking, no third-party packages.
+
+Three kinds of documents are benchmarked by default:
+  screenplay   scene headings, CHARACTER cues, parentheticals, dialogue
+  prose        headed sections of wrapped paragraphs
+  watermarked  a screenplay with a repeated header line and a diagonal stamp
+
+The other document formatters have a kind of their own (FORMAT_KINDS):
+  stageplay    ACT/SCENE headings, NAME. speeches and (stage directions)
+  transcript   timestamped Speaker: turns and Q./A. exchanges
+  plain        an inventory listing that no formatter claims
+
+Every document is generated from a seed, so the same (kind, pages, seed)
+always produces byte-identical files. Pages are plain Helvetica text
+(WinAnsi, ASCII only), which all extraction backends handle.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import zlib
+from pathlib import Path
+
+KINDS = ("screenplay", "prose", "watermarked")
+FORMAT_KINDS = ("stageplay", "transcript", "plain")
+
+LINES_PER_PAGE = 48
+WATERMARK_HEADER = "PROPERTY OF NORTHWIND PICTURES - DRAFT"
+WATERMARK_STAMP = "CONFIDENTIAL"
+
+_WORDS = (
+    "the a an and but or so then when while she he they we it this that door window light "
+    "car street room table chair phone voice hand eyes face moment night day morning rain "
+    "looks turns walks runs stops waits smiles laughs whispers shouts opens closes grabs "
+    "slowly quickly quietly suddenly again never always almost nothing something everything "
+    "house office kitchen hallway station river bridge city field road garden roof stairs"
+).split()
+_NAMES = ("ANNA", "MARCUS", "DR. OKAFOR", "LENA", "TOMAS", "RUTH", "SAM", "OLD MAN", "DETECTIVE REYES")
+_PLACES = ("KITCHEN", "POLICE STATION", "ROOFTOP", "CAR", "HOSPITAL CORRIDOR", "DINER", "FOREST ROAD")
+_TIMES = ("DAY", "NIGHT", "MORNING", "LATER", "CONTINUOUS")
+_TRANSITIONS = ("CUT TO:", "DISSOLVE TO:", "SMASH CUT TO:")
+
+
+def _sentence(rng: random.Random, lo: int = 4, hi: int = 12) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(lo, hi))]
+    return " ".join(words).capitalize() + rng.choice(".!?.")
+
+
+def _wrap(text: str, width: int = 60) -> list[str]:
+    out: list[str] = []
+    line = ""
+    for w in text.split():
+        if line and len(line) + 1 + len(w) > width:
+            out.append(line)
+            line = w
+        else:
+            line = f"{line} {w}" if line else w
+    if line:
+        out.append(line)
+    return out
+
+
+def _screenplay_page(rng: random.Random) -> list[str]:
+    lines: list[str] = []
+    while len(lines) < LINES_PER_PAGE - 6:
+        r = rng.random()
+        if r < 0.12:
+            lines += [f"{rng.choice(('INT.', 'EXT.'))} {rng.choice(_PLACES)} - {rng.choice(_TIMES)}", ""]
+        elif r < 0.18:
+            lines += [rng.choice(_TRANSITIONS), ""]
+        elif r < 0.35:
+            lines += _wrap(" ".join(_sentence(rng) for _ in range(rng.randint(1, 3)))) + [""]
+        else:
+            lines.append(rng.choice(_NAMES))
+            if rng.random() < 0.25:
+                lines.append(f"({rng.choice(('beat', 'quietly', 'to herself', 'laughing'))})")
+            lines += _wrap(_sentence(rng, 3, 14), 36) + [""]
+    return lines[:LINES_PER_PAGE]
+
+
+def _prose_page(rng: random.Random, page_no: int) -> list[str]:
+    lines: list[str] = []
+    if page_no % 4 == 0:
+        lines += [f"Chapter {page_no // 4 + 1}", ""]
+    while len(lines) < LINES_PER_PAGE - 8:
+        lines += _wrap(" ".join(_sentence(rng) for _ in range(rng.randint(3, 7))), 72) + [""]
+    return lines[:LINES_PER_PAGE]
+
+
+def _stageplay_page(rng: random.Random, page_no: int) -> list[str]:
+    lines: list[str] = []
+    if page_no % 2 == 0:
+        lines += [f"ACT {_ROMAN[page_no // 2]}", "", f"SCENE {page_no // 2 + 1}", ""]
+    while len(lines) < LINES_PER_PAGE - 6:
+        if rng.random() < 0.2:
+            lines += [f"({_sentence(rng, 3, 8)[:-1]})", ""]
+        else:
+            speech = _wrap(f"{rng.choice(_NAMES)}. {_sentence(rng, 4, 16)}", 64)
+            lines += speech + [""]
+    return lines[:LINES_PER_PAGE]
+
+
+def _transcript_page(rng: random.Random, page_no: int) -> list[str]:
+    lines: list[str] = []
+    t = page_no * 600
+    while len(lines) < LINES_PER_PAGE - 6:
+        t += rng.randint(5, 90)
+        if rng.random() < 0.3:
+            lines += _wrap(f"Q. {_sentence(rng, 4, 12)}", 64) + _wrap(f"A. {_sentence(rng, 2, 14)}", 64) + [""]
+        else:
+            who = rng.choice(("Interviewer", "Witness", "Ms. Reyes", "Mr. Okafor"))
+            stamp = f"[{t // 3600:02d}:{t // 60 % 60:02d}:{t % 60:02d}]"
+            lines += _wrap(f"{stamp} {who}: {_sentence(rng, 4, 18)}", 64) + [""]
+    return lines[:LINES_PER_PAGE]
+
+
+def _plain_page(rng: random.Random, page_no: int) -> list[str]:
+    lines: list[str] = []
+    for i in range(LINES_PER_PAGE - 8):
+        code = page_no * 100 + i
+        lines.append(f"{code:05d}  {rng.choice(_WORDS):<10} {rng.randint(1, 400):>4}  {rng.randint(0, 9999) / 100:8.2f}")
+    return lines
+
+
+_ROMAN = ("I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X") * 100
+
+
+def document_pages(kind: str, pages: int, seed: int = 0) -> list[list[str]]:
+    """The text lines of each page; this is the ground truth of the PDF."""
+    if kind not in KINDS + FORMAT_KINDS:
+        raise ValueError(f"unknown kind {kind!r}")
+    rng = random.Random(f"{kind}:{pages}:{seed}")
+    out: list[list[str]] = []
+    for i in range(pages):
+        if kind == "prose":
+            body = _prose_page(rng, i)
+        elif kind == "stageplay":
+            body = _stageplay_page(rng, i)
+        elif kind == "transcript":
+            body = _transcript_page(rng, i)
+        elif kind == "plain":
+            body = _plain_page(rng, i)
+        else:
+            body = _screenplay_page(rng)
+        if kind == "watermarked":
+            body = [WATERMARK_HEADER, ""] + body[: LINES_PER_PAGE - 3] + [str(i + 1)]
+        out.append(body)
+    return out
+
+
+def _escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _content_stream(lines: list[str], stamp: bool) -> bytes:
+    ops = ["BT", "/F1 11 Tf", "13 TL", "72 742 Td"]
+    for line in lines:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    if stamp:
+        # 45 degree stamp across the middle of the page
+        ops += ["q", "0.9 g", "0.7071 0.7071 -0.7071 0.7071 160 260 cm",
+                "BT", "/F1 64 Tf", f"0 0 Td ({WATERMARK_STAMP}) Tj", "ET", "Q"]
+    return "\n".join(ops).encode("latin-1")
+
+
+def build_pdf(page_lines: list[list[str]], *, stamp: bool = False, compress: bool = True) -> bytes:
+    """Assemble a minimal PDF 1.4 file with one text page per entry."""
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids: list[int] = []
+    for lines in page_lines:
+        data = _content_stream(lines, stamp)
+        if compress:
+            data = zlib.compress(data)
+            head = f"<< /Length {len(data)} /Filter /FlateDecode >>".encode()
+        else:
+            head = f"<< /Length {len(data)} >>".encode()
+        content = add(head + b"\nstream\n" + data + b"\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>".encode()
+        ))
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+    objects[pages_id - 1] = (
+        f"<< /Type /Pages /Count {len(kids)} /Kids [" + " ".join(f"{k} 0 R" for k in kids) + "] >>"
+    ).encode()
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R "
+        f"/Info << /Producer (pdf_minner synth) >> >>\nstartxref\n{xref}\n%%EOF\n"
+    ).encode()
+    return bytes(out)
+
+
+def make_document(kind: str, pages: int, seed: int = 0) -> tuple[bytes, list[list[str]]]:
+    """Return (pdf bytes, page lines) for one synthetic document."""
+    lines = document_pages(kind, pages, seed)
+    return build_pdf(lines, stamp=(kind == "watermarked")), lines
+
+
+def write_corpus(out_dir: Path, kinds: list[str], sizes: list[int], seed: int = 0) -> list[Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for kind in kinds:
+        for n in sizes:
+            path = out_dir / f"{kind}-{n:05d}p-s{seed}.pdf"
+            if not path.exists():
+                path.write_bytes(make_document(kind, n, seed)[0])
+            paths.append(path)
+    return paths
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Write a deterministic synthetic PDF corpus.")
+    ap.add_argument("out_dir", type=Path)
+    ap.add_argument("--kinds", default=",".join(KINDS))
+    ap.add_argument("--sizes", default="1,10,100,1000", help="comma-separated page counts (1-5000)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    if any(not 1 <= n <= 5000 for n in sizes):
+        ap.error("page counts must be between 1 and 5000")
+    for path in write_corpus(args.out_dir, args.kinds.split(","), sizes, args.seed):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
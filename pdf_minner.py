@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import functools
+import io
 import os
 import sys
 import time
 import threading
-import subprocess
+from collections.abc import Iterable, Iterator
 from queue import Queue, Empty
 from pathlib import Path
 
+# Heavy or rarely needed modules (pdfminer, pypdf, subprocess, tkinter,
+# pyfiglet, ...) are imported inside the functions that use them, so batch
+# runs and `--help` start quickly.
+
 
 # Optional color support
 try:
@@ -21,7 +27,7 @@ except Exception:  # fallback to no-colors
         CYAN = BLUE = GREEN = MAGENTA = YELLOW = RED = WHITE = ""
     Fore = _NoFore()
     class _NoStyle:
-        BRIGHT = NORMAL = ""
+        BRIGHT = NORMAL = RESET_ALL = ""
     Style = _NoStyle()
 
 
@@ -219,441 +225,5941 @@ def choose_dir_gui() -> Path | None:
         return None
 
 
+def ask_watermark_phrases(ranked: list[tuple[str, int]]) -> list[str]:
+    """Offer the top candidate, then the top 20, and return the phrases to remove."""
+    if not ranked:
+        return []
+    best, cnt = ranked[0]
+    ans = input(f"\nPossible watermark: '{best}' (~{cnt} pages). Remove? [Y/n]: ").strip().lower()
+    if ans in ("y", "yes", ""):  # default yes
+        return [best]
+    print("\nOther candidates:")
+    # show up to 20
+    show = ranked[:20]
+    for i, (s, c) in enumerate(show, start=1):
+        print(f"  {i:2d}) {s}  [{c}]")
+    raw = input("Enter numbers to remove (e.g., 1,3) or type custom phrases (empty: none): ").strip()
+    if not raw:
+        return []
+    if any(ch.isdigit() for ch in raw):
+        picks: list[str] = []
+        for part in raw.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if part.isdigit():
+                idx = int(part)
+                if 1 <= idx <= len(show):
+                    picks.append(show[idx-1][0])
+        return picks
+    # treat entire input as custom phrases separated by ;
+    return [p.strip() for p in raw.split(';') if p.strip()]
+
+
 # -------- PDF Extraction Backends --------
 
-def extract_pdf_text(path: Path, progress: Queue | None = None) -> str:
-    # Try pdfminer.six
-    try:
-        from pdfminer.high_level import extract_text  # type: ignore
-        if progress:
-            progress.put(("status", "extracting with pdfminer"))
-        return extract_text(str(path))
-    except Exception:
-        pass
+# Below this many pages a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 32
 
-    # Try pypdf with per-page progress
-    try:
-        from pypdf import PdfReader  # type: ignore
-        reader = PdfReader(str(path))
-        n = len(reader.pages)
-        texts: list[str] = []
-        for i, page in enumerate(reader.pages, start=1):
-            try:
-                txt = page.extract_text() or ""
-            except Exception:
-                txt = ""
-            texts.append(txt)
-            if progress:
-                progress.put(("progress", int(i * 100 / max(1, n))))
-        return "\n\f\n".join(texts)
-    except Exception:
-        pass
+# Backends in fallback order, and how each one joins pages into one string
+BACKENDS = ("pdfminer", "pypdf", "pdftotext")
+_PAGE_JOINERS = {
+    "pdfminer": lambda pages: "".join(p + "\f" for p in pages),
+    "pypdf": lambda pages: "\n\f\n".join(pages),
+    "pdftotext": lambda pages: "".join(p + "\f" for p in pages),
+}
 
-    # Try system pdftotext
-    exe = _which("pdftotext")
-    if exe:
-        if progress:
-            progress.put(("status", "extracting with pdftotext"))
-        try:
-            cp = subprocess.run([exe, "-layout", str(path), "-"], capture_output=True, check=True)
-            return cp.stdout.decode("utf-8", errors="ignore")
-        except Exception as e:
-            raise RuntimeError(f"pdftotext failed: {e}")
 
-    raise RuntimeError(
-        "Failed to extract PDF text. Install 'pdfminer.six' or 'pypdf', or ensure 'pdftotext' exists in PATH."
-    )
+class PdfBytes:
+    """A PDF held in memory, for extraction without a file on disk.
 
+    `data` is bytes or anything exposing the buffer protocol (bytearray,
+    memoryview, mmap); the pdfminer and pypdf backends read it in place
+    and pdftotext gets it on stdin. `name` stands in for the path in
+    messages, metrics and results.
+    """
 
-def _which(cmd: str) -> str | None:
-    from shutil import which
-    return which(cmd)
+    __slots__ = ("data", "name", "_sha")
 
+    def __init__(self, data, name: str = "<memory>") -> None:
+        self.data = data if isinstance(data, bytes) else memoryview(data).cast("B")
+        self.name = name
+        self._sha: str | None = None
 
-# -------- Screenplay Markdown Formatter --------
+    def __len__(self) -> int:
+        return len(self.data)
 
-import re
+    def __str__(self) -> str:
+        return self.name
 
-SCENE_RE = re.compile(r"^(INT\.|EXT\.|INT/EXT\.|I/E\.)[\w\W]*")
-TRANSITION_RE = re.compile(r"^[A-Z][A-Z \-]+TO:\s*$")
+    def __repr__(self) -> str:
+        return f"PdfBytes({self.name!r}, {len(self)} bytes)"
 
+    def __reduce__(self):
+        # Views and maps can't be pickled; worker processes get the bytes
+        return PdfBytes, (bytes(self.data), self.name)
 
-def format_screenplay_md(text: str) -> str:
-    lines = text.splitlines()
-    out: list[str] = []
-    i = 0
-    while i < len(lines):
-        line = lines[i].rstrip()
-        s = line.strip()
-        if not s:
-            out.append("")
-            i += 1
-            continue
-        if SCENE_RE.match(s):
-            out.append(f"## {s}")
-            i += 1
-            continue
-        if TRANSITION_RE.match(s):
-            out.append(f"> _{s}_")
-            i += 1
-            continue
-        if _is_character_line(s):
-            out.append(f"**{s}**")
-            i += 1
-            while i < len(lines):
-                nxt = lines[i].rstrip()
-                ns = nxt.strip()
-                if not ns:
-                    out.append("")
-                    i += 1
-                    break
-                if SCENE_RE.match(ns) or _is_character_line(ns) or TRANSITION_RE.match(ns):
-                    break
-                if ns.startswith("(") and ns.endswith(")") and len(ns) < 80:
-                    out.append(f"_{ns}_")
-                else:
-                    out.append(nxt)
-                i += 1
-            continue
-        out.append(line)
-        i += 1
-    cleaned: list[str] = []
-    blank_run = 0
-    for l in out:
-        if l.strip() == "":
-            blank_run += 1
-            if blank_run <= 2:
-                cleaned.append("")
-        else:
-            blank_run = 0
-            cleaned.append(l)
-    return "\n".join(cleaned) + ("\n" if cleaned and cleaned[-1] != "" else "")
+    def open(self) -> io.RawIOBase:
+        """A seekable binary stream over the data, without copying it."""
+        if isinstance(self.data, bytes):
+            return io.BytesIO(self.data)
+        return _MemoryReader(self.data)
 
+    def sha256(self) -> str:
+        if self._sha is None:
+            import hashlib
+            self._sha = hashlib.sha256(self.data).hexdigest()
+        return self._sha
 
-def _is_character_line(s: str) -> bool:
-    if not (2 <= len(s) <= 30):
-        return False
-    if not s.isupper():
-        return False
-    tmp = s.replace(" ", "").replace("-", "").replace("'", "")
-    return tmp.isalpha()
 
+class _MemoryReader(io.RawIOBase):
+    """Read-only seekable stream over a memoryview."""
 
-def detect_screenplay(text: str) -> bool:
-    lines = [l.rstrip() for l in text.splitlines()]
-    scene_hits = 0
-    char_hits = 0
-    for l in lines[:1000]:
-        s = l.strip()
-        if not s:
-            continue
-        if s.startswith(("INT.", "EXT.", "INT/EXT.", "I/E.")):
-            scene_hits += 1
-        if 2 <= len(s) <= 30 and s.isupper() and s.replace(" ", "").isalpha():
-            char_hits += 1
-    return scene_hits >= 1 or char_hits >= 3
+    def __init__(self, view: memoryview) -> None:
+        super().__init__()
+        self._view = view
+        self._pos = 0
 
+    def readable(self) -> bool:
+        return True
 
-# -------- Watermark detection/removal --------
+    def seekable(self) -> bool:
+        return True
 
-def _split_pages(text: str) -> list[str]:
-    # Many backends insert form feed between pages
-    if "\f" in text:
-        return text.split("\f")
-    # Fallback: single page
-    return [text]
+    def tell(self) -> int:
+        return self._pos
 
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._pos, len(self._view))[whence]
+        if base + offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = base + offset
+        return self._pos
 
-def _normalize_line(s: str) -> str:
-    return " ".join(s.strip().split())
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
 
+    def read(self, size: int | None = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        data = bytes(self._view[self._pos:end])
+        self._pos += len(data)
+        return data
 
-def detect_watermark_candidates(pages: list[str]) -> set[str]:
-    import collections
-    n = len(pages)
-    if n <= 1:
-        return set()
-    counts = collections.Counter()
-    for p in pages:
-        # consider unique short lines per page to reduce bias
-        seen = set()
-        for raw in p.splitlines():
-            s = _normalize_line(raw)
-            if not s:
-                continue
-            if len(s) > 60 or len(s) < 2:
-                continue
-            if s.isdigit():
-                continue
-            # ignore typical headings
-            if s.lower() in {"confidential", "draft"} or s.endswith(":"):
-                pass
-            seen.add(s)
-        for s in seen:
-            counts[s] += 1
-    # threshold: appears on >= 60% of pages and at least 3 pages
-    thresh = max(3, int(0.6 * n))
-    candidates = {s for s, c in counts.items() if c >= thresh}
-    return candidates
+    readall = read
 
 
-def remove_watermarks_from_text(text: str) -> tuple[str, list[str]]:
-    pages = _split_pages(text)
-    cands = detect_watermark_candidates(pages)
-    if not cands:
-        return text, []
-    cleaned_pages: list[str] = []
-    for p in pages:
-        out_lines = []
-        for raw in p.splitlines():
-            s = _normalize_line(raw)
-            if s in cands:
-                continue
-            out_lines.append(raw)
-        cleaned_pages.append("\n".join(out_lines))
-    return "\n".join(cleaned_pages), sorted(cands)
+def pdf_source(src, name: str | None = None) -> Path | PdfBytes:
+    """Normalize a PDF given as a path, bytes-like data or a binary file object.
 
+    Paths stay paths. Real files opened by the caller are memory-mapped;
+    BytesIO is used through its buffer; other streams (pipes, archive
+    members) are read into memory once.
+    """
+    if isinstance(src, (Path, PdfBytes)):
+        return src
+    if isinstance(src, str):
+        return Path(src)
+    if hasattr(src, "read"):
+        label = name or str(getattr(src, "name", "") or "<stream>")
+        if hasattr(src, "getbuffer"):
+            return PdfBytes(src.getbuffer(), label)
+        try:
+            import mmap
+            return PdfBytes(mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ), label)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            return PdfBytes(src.read(), label)
+    try:
+        return PdfBytes(src, name or "<memory>")
+    except TypeError:
+        raise TypeError(f"expected a path, bytes-like object or binary file, not {type(src).__name__}") from None
 
-# -------- Worker Thread + Spinner --------
 
-def detect_watermark_candidates_with_counts(pages: list[str]) -> list[tuple[str, int]]:
-    import collections
-    n = len(pages)
-    counts = collections.Counter()
-    for p in pages:
-        seen = set()
-        for raw in p.splitlines():
-            s = _normalize_line(raw)
-            if not s or len(s) > 60 or len(s) < 2 or s.isdigit():
-                continue
-            seen.add(s)
-        for s in seen:
-            counts[s] += 1
-    items = [(s, c) for s, c in counts.items()]
-    items.sort(key=lambda t: (-t[1], t[0]))
-    return items
+def _open_pdf(source: Path | PdfBytes):
+    """A seekable binary stream over `source`; local files are memory-mapped.
 
+    pypdf would otherwise copy the whole file into memory, and pdfminer's
+    small reads become plain memory access.
+    """
+    if isinstance(source, PdfBytes):
+        return source.open()
+    import mmap
+    with open(source, "rb") as fp:
+        try:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # empty or not mappable
+            pass
+    return open(source, "rb")
 
-def remove_watermarks_by_selection(text: str, phrases: list[str]) -> str:
-    if not phrases:
-        return text
-    norms = [ _normalize_line(p) for p in phrases if p.strip() ]
-    pages = _split_pages(text)
-    cleaned_pages: list[str] = []
-    for p in pages:
-        out_lines = []
-        for raw in p.splitlines():
-            s = _normalize_line(raw)
-            remove = False
-            for n in norms:
-                if not n:
-                    continue
-                if s == n:
-                    remove = True
-                    break
-                if len(n) >= 3 and n in s and len(s) <= 120:
-                    remove = True
-                    break
-            if not remove:
-                out_lines.append(raw)
-        cleaned_pages.append("\n".join(out_lines))
-    return "\n".join(cleaned_pages)
 
+def source_size(source: Path | PdfBytes) -> int:
+    return len(source) if isinstance(source, PdfBytes) else os.stat(source).st_size
 
-def extract_only_worker(pdf_path: Path, q: Queue) -> None:
-    try:
-        q.put(("status", "Reading PDF"))
-        txt = extract_pdf_text(pdf_path, progress=q)
-        q.put(("text", txt))
-    except Exception as e:
-        q.put(("error", str(e)))
 
+def extract_pdf_text(
+    path: Path | PdfBytes,
+    progress: Queue | None = None,
+    *,
+    jobs: int = 1,
+    cache: ExtractionCache | None = None,
+    backend: str = "auto",
+    pdftotext: PdftotextEngine | None = None,
+    metrics: PipelineMetrics | None = None,
+) -> str:
+    """Extract the text of `path`, pages separated by form feeds.
 
-def convert_worker(pdf_path: Path, out_dir: Path, q: Queue, *, remove_wm: bool) -> None:
-    try:
-        q.put(("status", "Reading PDF"))
-        txt = extract_pdf_text(pdf_path, progress=q)
-        if remove_wm:
-            q.put(("status", "Removing watermark"))
-            txt, removed = remove_watermarks_from_text(txt)
-        q.put(("status", "Formatting"))
-        md = format_screenplay_md(txt) if detect_screenplay(txt) else txt
-        out_dir.mkdir(parents=True, exist_ok=True)
-        out_path = out_dir / (pdf_path.stem + ".md")
-        out_path.write_text(md, encoding="utf-8")
-        q.put(("done", str(out_path)))
-    except Exception as e:
-        q.put(("error", str(e)))
+    `path` may also be PDF data in memory or a binary file object (see
+    pdf_source()); nothing is written to disk for it. With `jobs > 1` large documents are split into page chunks that are
+    extracted in worker processes and reassembled in order; the result is
+    identical to a serial run. With a `cache`, a previous extraction of the
+    same file content is reused without touching the PDF backends.
+    `backend` is "auto" (fixed fallback order), "fastest" (probe, see
+    choose_fastest_backend()) or the name of one backend to pin.
+    `pdftotext` sets concurrency and limits for the Poppler backend.
+    `metrics` records the backend used and any fallbacks.
+    """
+    path = pdf_source(path)
+    exe = pdftotext.exe if pdftotext else None
+    if cache is not None:
+        hit = cache.lookup(path, backend, exe)
+        if metrics is not None:
+            metrics.cache = "miss" if hit is None else "hit"
+        if hit is not None:
+            if progress:
+                progress.put(("status", "using cached extraction"))
+            name, pages = hit
+            if metrics is not None:
+                metrics.backend = name
+            return _PAGE_JOINERS[name](list(pages))
+    order = _backend_order(path, backend, progress, metrics)
+    for name in order:
+        try:
+            pages = list(_iter_backend(name, path, progress, jobs, pdftotext))
+        except _BackendMissing:
+            continue
+        except Exception as e:
+            if name == order[-1]:
+                raise RuntimeError(f"{name} failed: {e}")
+            if metrics is not None:
+                metrics.fallback(name, e)
+            continue
+        if metrics is not None:
+            metrics.backend = name
+        if cache is not None:
+            cache.put(cache.store_key(path, backend, name, exe), name, pages)
+        return _PAGE_JOINERS[name](pages)
+    raise _no_backend_error(backend)
 
 
-SPINNER_FRAMES = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+def iter_pdf_pages(
+    path: Path | PdfBytes,
+    progress: Queue | None = None,
+    *,
+    jobs: int = 1,
+    cache: ExtractionCache | None = None,
+    backend: str = "auto",
+    pdftotext: PdftotextEngine | None = None,
+    metrics: PipelineMetrics | None = None,
+) -> Iterator[str]:
+    """Yield the text of `path` one page at a time.
 
+    Backends are tried in the usual order until one produces its first
+    page; after that the stream is committed to that backend and errors
+    propagate, since pages already handed out cannot be taken back.
+    """
+    return open_page_stream(
+        path, progress, jobs=jobs, cache=cache, backend=backend, pdftotext=pdftotext, metrics=metrics
+    )[1]
 
-def run_with_spinner(thread: threading.Thread, q: Queue) -> tuple[bool, str | None]:
-    idx = 0
-    percent = None
-    status = "Idle"
-    while thread.is_alive():
-        # Drain messages
+
+def open_page_stream(
+    path: Path | PdfBytes,
+    progress: Queue | None = None,
+    *,
+    jobs: int = 1,
+    cache: ExtractionCache | None = None,
+    backend: str = "auto",
+    pdftotext: PdftotextEngine | None = None,
+    metrics: PipelineMetrics | None = None,
+    preflight: bool | dict = True,
+) -> tuple[str, Iterator[str]]:
+    """Like iter_pdf_pages() but also return the name of the backend in use.
+
+    A file preflight_pdf() finds password-protected fails before any backend
+    is tried. `preflight` may be the preflight_pdf() result the caller
+    already has, or False to skip the check.
+    """
+    import itertools
+    path = pdf_source(path)
+    exe = pdftotext.exe if pdftotext else None
+    if cache is not None:
+        hit = cache.lookup(path, backend, exe)
+        if metrics is not None:
+            metrics.cache = "miss" if hit is None else "hit"
+        if hit is not None:
+            if progress:
+                progress.put(("status", "using cached extraction"))
+            if metrics is not None:
+                metrics.backend = hit[0]
+            return hit
+    info = preflight if isinstance(preflight, dict) else None
+    if preflight is True:
         try:
-            while True:
-                kind, payload = q.get_nowait()
-                if kind == "progress":
-                    percent = int(payload)
-                elif kind == "status":
-                    status = str(payload)
-                elif kind == "error":
-                    print()
-                    return False, str(payload)
-                elif kind == "done":
-                    print()
-                    return True, str(payload)
-                elif kind == "text":
-                    print()
-                    return True, str(payload)
-        except Empty:
+            info = preflight_pdf(path)
+        except OSError:
             pass
-        spin = SPINNER_FRAMES[idx % len(SPINNER_FRAMES)]
-        idx += 1
-        if percent is not None:
-            line = f" {Fore.MAGENTA}{spin}{Style.RESET_ALL} {status} — %{percent:3d}"
-        else:
-            line = f" {Fore.MAGENTA}{spin}{Style.RESET_ALL} {status}"
-        print("\r" + line + " " * 20, end="", flush=True)
-        time.sleep(0.08)
+    if info is not None and info.get("encryption") == "password":
+        # Preflight already let a backend try the empty password; every
+        # backend would fail on it in turn
+        raise RuntimeError(info["error"])
+    order = _backend_order(path, backend, progress, metrics)
+    for name in order:
+        try:
+            it = _iter_backend(name, path, progress, jobs, pdftotext)
+            first = next(it)
+        except StopIteration:
+            it, first = iter(()), None
+        except _BackendMissing:
+            continue
+        except Exception as e:
+            if name == order[-1]:
+                raise RuntimeError(f"{name} failed: {e}")
+            if metrics is not None:
+                metrics.fallback(name, e)
+            continue
+        if metrics is not None:
+            metrics.backend = name
+        pages = it if first is None else itertools.chain((first,), it)
+        if cache is not None:
+            pages = cache.record(cache.store_key(path, backend, name, exe), name, pages)
+        return name, pages
+    raise _no_backend_error(backend)
 
-    # Final drain
-    try:
-        while True:
-            kind, payload = q.get_nowait()
-            if kind == "error":
-                print()
-                return False, str(payload)
-            elif kind == "done":
-                print()
-                return True, str(payload)
-            elif kind == "text":
-                print()
-                return True, str(payload)
-            elif kind == "progress":
-                pass
-            elif kind == "status":
-                status = str(payload)
-    except Empty:
-        pass
-    print()
-    return False, "Bilinmeyen durum"
 
+@functools.lru_cache(maxsize=None)
+def backend_available(name: str) -> bool:
+    """Whether backend `name` is installed; probed once per process."""
+    if name == "pdftotext":
+        return _which("pdftotext") is not None
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
 
-# -------- Main loop --------
 
-def main() -> int:
-    selected_file: Path | None = None
-    output_dir: Path | None = None
-    remove_wm = True
+def _backend_order(
+    path: Path, backend: str, progress: Queue | None, metrics: PipelineMetrics | None = None
+) -> tuple[str, ...]:
+    if backend == "auto":
+        return BACKENDS
+    if backend == "fastest":
+        if metrics is not None:
+            with metrics.stage("probe"):
+                winner = choose_fastest_backend(path, progress, metrics)
+        else:
+            winner = choose_fastest_backend(path, progress)
+        if winner is None:
+            return BACKENDS
+        # Keep the others as a fallback in case the full run trips over a page
+        return (winner,) + tuple(b for b in BACKENDS if b != winner)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Choose auto, fastest or one of: {', '.join(BACKENDS)}.")
+    return (backend,)
 
-    # Splash animation once at startup
-    splash_rain_lightning(2.8)
 
-    while True:
-        clear_screen()
-        print(banner())
-        choice = input(menu(selected_file, output_dir, remove_wm)).strip()
+def _no_backend_error(backend: str) -> RuntimeError:
+    if backend in BACKENDS:
+        return RuntimeError(f"Backend '{backend}' is not available.")
+    return RuntimeError(
+        "Failed to extract PDF text. Install 'pdfminer.six' or 'pypdf', or ensure 'pdftotext' exists in PATH."
+    )
 
-        if choice == "1":
-            f = choose_pdf_gui()
-            if f and f.suffix.lower() == ".pdf" and f.exists():
-                selected_file = f
-            else:
-                print(f"{Fore.RED}No valid PDF selected.{Style.RESET_ALL}")
-                input("Press Enter to continue...")
 
-        elif choice == "2":
-            d = choose_dir_gui()
-            if d:
-                output_dir = d
-            else:
-                print(f"{Fore.RED}No folder selected.{Style.RESET_ALL}")
-                input("Press Enter to continue...")
+# -------- Backend probing ("fastest" mode) --------
 
-        elif choice == "3":
-            remove_wm = not remove_wm
+# Pages sampled per backend, and the share of junk characters we tolerate
+PROBE_PAGES = 3
+MAX_GARBAGE_RATIO = 0.05
 
-        elif choice == "4":
-            if not selected_file:
-                print(f"{Fore.RED}Please select a PDF file first.{Style.RESET_ALL}")
-                input("Press Enter to continue...")
-                continue
-            if not output_dir:
-                # Default: next to the source file
-                output_dir = selected_file.parent
+# Backends this process has already read a page with
+_WARM_BACKENDS: set[str] = set()
 
-            # 1) Extract text with spinner
-            print(f"\n{Fore.YELLOW}Reading PDF...{Style.RESET_ALL}")
-            q: Queue = Queue()
-            t = threading.Thread(target=extract_only_worker, args=(selected_file, q), daemon=True)
-            t.start()
-            ok, payload = run_with_spinner(t, q)
-            if not ok or not payload:
-                print(f"{Fore.RED}Error:{Style.RESET_ALL} {payload}")
-                input("Press Enter to continue...")
+_CID_RE = None
+
+
+def text_quality(pages: list[str]) -> dict:
+    """Empty-page ratio and garbage-character ratio of extracted pages."""
+    import re
+    import unicodedata
+    global _CID_RE
+    if _CID_RE is None:
+        _CID_RE = re.compile(r"\(cid:\d+\)")
+    empty = sum(1 for p in pages if not p.strip())
+    chars = garbage = 0
+    for p in pages:
+        # pdfminer spells unmapped glyphs as "(cid:NN)"
+        garbage += sum(len(m) for m in _CID_RE.findall(p))
+        for ch in p:
+            if ch.isspace():
                 continue
+            chars += 1
+            if ch == "\ufffd" or unicodedata.category(ch) in ("Cc", "Co", "Cn"):
+                garbage += 1
+    return {
+        "empty_ratio": empty / len(pages) if pages else 1.0,
+        "garbage_ratio": min(1.0, garbage / chars) if chars else 0.0,
+    }
 
-            text = payload
 
-            # 2) Watermark interactive selection (optional)
-            if remove_wm:
-                pages = _split_pages(text)
-                ranked = detect_watermark_candidates_with_counts(pages)
-                # Propose top candidate first
-                selected_phrases: list[str] = []
-                if ranked:
-                    best, cnt = ranked[0]
-                    ans = input(f"\nPossible watermark: '{best}' (~{cnt} pages). Remove? [Y/n]: ").strip().lower()
-                    if ans in ("y", "yes", ""):  # default yes
-                        selected_phrases = [best]
-                    else:
-                        print("\nOther candidates:")
-                        # show up to 20
-                        show = ranked[:20]
-                        for i, (s, c) in enumerate(show, start=1):
-                            print(f"  {i:2d}) {s}  [{c}]")
-                        raw = input("Enter numbers to remove (e.g., 1,3) or type custom phrases (empty: none): ").strip()
-                        if raw:
-                            if any(ch.isdigit() for ch in raw):
-                                picks: list[str] = []
-                                for part in raw.split(','):
-                                    part = part.strip()
-                                    if not part:
-                                        continue
-                                    if part.isdigit():
-                                        idx = int(part)
-                                        if 1 <= idx <= len(show):
-                                            picks.append(show[idx-1][0])
-                                selected_phrases = picks
-                            else:
-                                # treat entire input as custom phrases separated by ;
-                                selected_phrases = [p.strip() for p in raw.split(';') if p.strip()]
+def _sample_indices(n: int | None, k: int) -> list[int]:
+    if not n:
+        return [0]
+    if n <= k:
+        return list(range(n))
+    return sorted({round(i * (n - 1) / (k - 1)) for i in range(k)})
 
-                if selected_phrases:
-                    print(f"\nRemoving watermark: {', '.join(selected_phrases)}")
-                    text = remove_watermarks_by_selection(text, selected_phrases)
 
-            # 3) Format and write
-            print(f"\n{Fore.YELLOW}Formatting and writing...{Style.RESET_ALL}")
-            md = format_screenplay_md(text) if detect_screenplay(text) else text
-            output_dir.mkdir(parents=True, exist_ok=True)
-            out_path = output_dir / (selected_file.stem + ".md")
-            out_path.write_text(md, encoding="utf-8")
-            print(f"{Fore.GREEN}Done:{Style.RESET_ALL} {out_path}")
-            input("Press Enter to continue...")
+def _probe_page_count(path: Path | PdfBytes) -> int | None:
+    try:
+        n = preflight_pdf(path)["pages"]
+    except OSError:
+        n = None
+    if n:
+        return n
+    for name in ("pypdf", "pdfminer"):
+        if backend_available(name):
+            try:
+                return _count_pdf_pages(name, path)
+            except Exception:
+                pass
+    exe = _which("pdfinfo") if not isinstance(path, PdfBytes) else None
+    if exe:
+        import subprocess
+        try:
+            cp = subprocess.run([exe, str(path)], capture_output=True, check=True, timeout=30)
+            for line in cp.stdout.decode("utf-8", errors="ignore").splitlines():
+                if line.startswith("Pages:"):
+                    return int(line.split(":", 1)[1])
+        except Exception:
+            pass
+    return None
 
-        elif choice == "5":
-            clear_screen()
-            print(banner())
+
+def probe_backends(path: Path, sample_pages: int = PROBE_PAGES) -> list[dict]:
+    """Time every available backend on a few pages spread through `path`."""
+    indices = _sample_indices(_probe_page_count(path), sample_pages)
+    results: list[dict] = []
+    for name in BACKENDS:
+        if not backend_available(name):
+            continue
+        if name not in _WARM_BACKENDS:
+            # Imports and first-use setup are paid once per process, not per
+            # document: read one page untimed so they don't count against it
+            _WARM_BACKENDS.add(name)
+            try:
+                extract_page_range(name, path, indices[0], indices[0] + 1)
+            except Exception:
+                pass
+        start = time.perf_counter()
+        try:
+            pages: list[str] = []
+            for i in indices:
+                pages.extend(extract_page_range(name, path, i, i + 1))
+        except Exception as e:
+            results.append({"backend": name, "ok": False, "error": str(e) or e.__class__.__name__})
+            continue
+        secs = time.perf_counter() - start
+        results.append({"backend": name, "ok": True, "seconds": secs, "pages": len(pages), **text_quality(pages)})
+    return results
+
+
+def choose_fastest_backend(
+    path: Path, progress: Queue | None = None, metrics: PipelineMetrics | None = None
+) -> str | None:
+    """Pick the fastest backend whose sample output is as good as the best one's.
+
+    A backend is acceptable when its garbage ratio stays under
+    MAX_GARBAGE_RATIO and it finds no more empty pages than the best
+    backend did. If none qualifies, the cleanest output wins.
+    """
+    if progress:
+        progress.put(("status", "probing backends"))
+    results = probe_backends(path)
+    if metrics is not None:
+        for r in results:
+            if not r["ok"]:
+                metrics.fallback(r["backend"], r["error"], during="probe")
+    ok = [r for r in results if r["ok"] and r["pages"]]
+    if not ok:
+        return None
+    best_empty = min(r["empty_ratio"] for r in ok)
+    acceptable = [r for r in ok if r["garbage_ratio"] <= MAX_GARBAGE_RATIO and r["empty_ratio"] <= best_empty]
+    if acceptable:
+        winner = min(acceptable, key=lambda r: r["seconds"])
+    else:
+        winner = min(ok, key=lambda r: (r["empty_ratio"] + r["garbage_ratio"], r["seconds"]))
+    if progress:
+        progress.put(("status", f"fastest backend: {winner['backend']}"))
+    return winner["backend"]
+
+
+class _BackendMissing(Exception):
+    pass
+
+
+def _iter_backend(
+    backend: str,
+    path: Path | PdfBytes,
+    progress: Queue | None,
+    jobs: int = 1,
+    pdftotext: PdftotextEngine | None = None,
+) -> Iterator[str]:
+    if backend != "pdftotext" and not backend_available(backend):
+        # Memoized, so a missing backend is not searched for on every document
+        raise _BackendMissing(backend)
+    if backend == "pdfminer":
+        try:
+            import pdfminer.high_level  # type: ignore  # noqa: F401
+        except ImportError:
+            raise _BackendMissing(backend)
+        if progress:
+            progress.put(("status", "extracting with pdfminer"))
+    elif backend == "pypdf":
+        try:
+            import pypdf  # type: ignore  # noqa: F401
+        except ImportError:
+            raise _BackendMissing(backend)
+    else:
+        if not (pdftotext and pdftotext.exe) and not _which("pdftotext"):
+            raise _BackendMissing(backend)
+        if progress:
+            progress.put(("status", "extracting with pdftotext"))
+        engine = pdftotext or PdftotextEngine()
+        return engine.iter_pages(path, progress, concurrency=max(jobs, engine.concurrency))
+    if jobs > 1 and not isinstance(path, PdfBytes):
+        return _iter_parallel(backend, path, jobs, progress)
+    if backend == "pdfminer":
+        return _iter_pages_pdfminer(path)
+    return _iter_pages_pypdf(path, progress)
+
+
+def _iter_pages_pdfminer(path: Path | PdfBytes, pagenos=None, maxpages: int = 0) -> Iterator[str]:
+    # Same machinery as pdfminer.high_level.extract_text, drained page by page
+    from io import StringIO
+    from pdfminer.converter import TextConverter  # type: ignore
+    from pdfminer.layout import LAParams  # type: ignore
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager  # type: ignore
+    from pdfminer.pdfpage import PDFPage  # type: ignore
+    with _open_pdf(path) as fp:
+        buf = StringIO()
+        rsrcmgr = PDFResourceManager(caching=True)
+        device = TextConverter(rsrcmgr, buf, codec="utf-8", laparams=LAParams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page in PDFPage.get_pages(fp, pagenos, maxpages=maxpages, caching=True):
+            interpreter.process_page(page)
+            txt = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            # TextConverter closes every page with a form feed
+            yield txt[:-1] if txt.endswith("\f") else txt
+
+
+def _iter_pages_pypdf(path: Path | PdfBytes, progress: Queue | None = None) -> Iterator[str]:
+    from pypdf import PdfReader  # type: ignore
+    with _open_pdf(path) as fp:
+        reader = PdfReader(fp)
+        n = len(reader.pages)
+        for i, page in enumerate(reader.pages, start=1):
+            try:
+                txt = page.extract_text() or ""
+            except Exception:
+                txt = ""
+            yield txt
+            if progress:
+                progress.put(("progress", int(i * 100 / max(1, n))))
+
+
+def _count_pdf_pages(backend: str, path: Path | PdfBytes) -> int:
+    with _open_pdf(path) as fp:
+        if backend == "pdfminer":
+            from pdfminer.pdfpage import PDFPage  # type: ignore
+            return sum(1 for _ in PDFPage.get_pages(fp))
+        from pypdf import PdfReader  # type: ignore
+        return len(PdfReader(fp).pages)
+
+
+def extract_page_range(backend: str, path: Path | PdfBytes, start: int, stop: int) -> list[str]:
+    """Return the text of pages [start, stop) (0-based) as one string per page."""
+    if backend == "pdfminer":
+        return list(_iter_pages_pdfminer(path, range(start, stop), maxpages=stop))
+    if backend == "pdftotext":
+        import subprocess
+        exe = _which("pdftotext")
+        mem = isinstance(path, PdfBytes)
+        cmd = [exe, "-layout", "-f", str(start + 1), "-l", str(stop), "-" if mem else str(path), "-"]
+        cp = subprocess.run(cmd, input=path.data if mem else None, capture_output=True, check=True)
+        return cp.stdout.decode("utf-8", errors="ignore").split("\f")[:-1]
+    from pypdf import PdfReader  # type: ignore
+    with _open_pdf(path) as fp:
+        reader = PdfReader(fp)
+        texts: list[str] = []
+        for i in range(start, min(stop, len(reader.pages))):
+            try:
+                texts.append(reader.pages[i].extract_text() or "")
+            except Exception:
+                texts.append("")
+    return texts
+
+
+def extract_page_sample(path: Path | PdfBytes, indices: list[int], backend: str = "auto") -> tuple[str, list[str]]:
+    """Text of the given pages (0-based, ascending) from the first backend that reads them all.
+
+    Returns (backend, texts). The document is opened once, not per page.
+    """
+    if not indices:
+        return "", []
+    for name in _backend_order(path, backend, None):
+        if not backend_available(name):
+            continue
+        try:
+            if name == "pdfminer":
+                pages = list(_iter_pages_pdfminer(path, set(indices), maxpages=indices[-1] + 1))
+            elif name == "pypdf":
+                from pypdf import PdfReader  # type: ignore
+                with _open_pdf(path) as fp:
+                    reader = PdfReader(fp)
+                    pages = [reader.pages[i].extract_text() or "" for i in indices if i < len(reader.pages)]
+            else:
+                pages = [t for i in indices for t in extract_page_range(name, path, i, i + 1)]
+        except Exception:
+            continue
+        return name, pages
+    raise _no_backend_error(backend)
+
+
+def _iter_parallel(backend: str, path: Path, jobs: int, progress: Queue | None) -> Iterator[str]:
+    """Extract page chunks in a process pool and yield pages in order.
+
+    Only a bounded window of chunks is in flight, so memory does not grow
+    with document length. Small files are extracted serially.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    n = _count_pdf_pages(backend, path)
+    if n < PARALLEL_MIN_PAGES:
+        if backend == "pdfminer":
+            yield from _iter_pages_pdfminer(path)
+        else:
+            yield from _iter_pages_pypdf(path, progress)
+        return
+    # ~4 chunks per worker keeps the pool busy when page costs are uneven
+    chunk = max(PARALLEL_MIN_PAGES // 4, -(-n // (jobs * 4)))
+    starts = deque(range(0, n, chunk))
+    workers = min(jobs, len(starts))
+    ex = ProcessPoolExecutor(max_workers=workers)
+    try:
+        inflight: deque = deque()
+        done = 0
+        while starts or inflight:
+            while starts and len(inflight) < workers * 2:
+                s = starts.popleft()
+                inflight.append(ex.submit(extract_page_range, backend, path, s, min(s + chunk, n)))
+            pages = inflight.popleft().result()
+            done += len(pages)
+            yield from pages
+            if progress:
+                progress.put(("progress", int(done * 100 / n)))
+    finally:
+        # Don't wait on stragglers if we are being interrupted (e.g. a timeout)
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _which(cmd: str) -> str | None:
+    from shutil import which
+    return which(cmd)
+
+
+# -------- Preflight --------
+
+# startxref is required to sit in the last 1 KB; some writers append junk
+PREFLIGHT_TAIL_BYTES = 64 << 10
+PREFLIGHT_SAMPLE_PAGES = 5
+# Objects read per sampled page before the page tree walk gives up
+PREFLIGHT_MAX_READS = 200
+# Jobs without a page count are scheduled as if they had one page per this many bytes
+PREFLIGHT_BYTES_PER_PAGE = 64 << 10
+
+# What a malformed file can make the preflight reader raise
+_PREFLIGHT_ERRORS = (ValueError, IndexError, KeyError, TypeError, AttributeError, RecursionError)
+
+_PDF_PAD = bytes.fromhex("28bf4e5e4e758a4164004e56fffa01082e2e00b6d0683e802f0ca9fe6453697a")
+
+
+class _PdfName(str):
+    __slots__ = ()
+
+
+class _PdfRef(tuple):
+    __slots__ = ()
+
+
+class _PdfLite:
+    """Just enough of a PDF reader for preflight: xref, trailer, plain objects.
+
+    Reads the cross-reference data (tables or streams, following /Prev)
+    and single objects on demand; content streams are never decoded.
+    Every method may raise ValueError on input it does not understand.
+    """
+
+    _TOKEN = None
+    _REF = None
+
+    def __init__(self, f, size: int) -> None:
+        import re
+        if _PdfLite._TOKEN is None:
+            _PdfLite._TOKEN = re.compile(rb"[^\s()<>\[\]{}/%]+")
+            _PdfLite._REF = re.compile(rb"\s+(\d+)\s+R(?=[\s()<>\[\]{}/%]|$)")
+        self.f = f
+        self.size = size
+        self.xref: dict[int, tuple] = {}
+        self.trailer: dict = {}
+        self._objstm: dict[int, tuple[bytes, dict[int, int]]] = {}
+        self.reads = 0
+        self._load_xref()
+
+    # -- parsing --
+
+    def _parse(self, data: bytes, i: int):
+        n = len(data)
+        while True:
+            while i < n and data[i] in b" \t\r\n\f\x00":
+                i += 1
+            if i < n and data[i] == 0x25:  # % comment
+                while i < n and data[i] not in b"\r\n":
+                    i += 1
+                continue
+            break
+        if i >= n:
+            raise ValueError("unexpected end of data")
+        c = data[i]
+        if c == 0x3C:  # <
+            if data[i + 1:i + 2] == b"<":
+                i += 2
+                d = {}
+                while True:
+                    while i < n and data[i] in b" \t\r\n\f\x00":
+                        i += 1
+                    if data[i:i + 2] == b">>":
+                        return d, i + 2
+                    key, i = self._parse(data, i)
+                    if not isinstance(key, _PdfName):
+                        raise ValueError("dictionary key is not a name")
+                    d[key], i = self._parse(data, i)
+            j = data.index(b">", i)
+            hexs = bytes(ch for ch in data[i + 1:j] if ch not in b" \t\r\n\f")
+            return bytes.fromhex((hexs + b"0" * (len(hexs) % 2)).decode("ascii")), j + 1
+        if c == 0x5B:  # [
+            i += 1
+            out = []
+            while True:
+                while i < n and data[i] in b" \t\r\n\f\x00":
+                    i += 1
+                if i >= n:
+                    raise ValueError("unterminated array")
+                if data[i] == 0x5D:
+                    return out, i + 1
+                v, i = self._parse(data, i)
+                out.append(v)
+        if c == 0x28:  # (
+            return self._literal(data, i + 1)
+        if c == 0x2F:  # /
+            m = self._TOKEN.match(data, i + 1)
+            raw = m.group() if m else b""
+            if b"#" in raw:
+                import re
+                raw = re.sub(rb"#([0-9A-Fa-f]{2})", lambda h: bytes([int(h.group(1), 16)]), raw)
+            return _PdfName(raw.decode("latin-1")), (m.end() if m else i + 1)
+        m = self._TOKEN.match(data, i)
+        if not m:
+            raise ValueError(f"unexpected byte {data[i:i + 1]!r}")
+        tok = m.group()
+        if tok == b"true" or tok == b"false":
+            return tok == b"true", m.end()
+        if tok == b"null":
+            return None, m.end()
+        try:
+            num = int(tok)
+        except ValueError:
+            try:
+                return float(tok), m.end()
+            except ValueError:
+                return _PdfName(tok.decode("latin-1")), m.end()  # bare keyword
+        r = self._REF.match(data, m.end())
+        if r:
+            return _PdfRef((num, int(r.group(1)))), r.end()
+        return num, m.end()
+
+    @staticmethod
+    def _literal(data: bytes, i: int) -> tuple[bytes, int]:
+        out = bytearray()
+        depth = 1
+        esc = {ord("n"): 10, ord("r"): 13, ord("t"): 9, ord("b"): 8, ord("f"): 12}
+        while i < len(data):
+            c = data[i]
+            if c == 0x5C:  # backslash
+                i += 1
+                c = data[i]
+                if c in esc:
+                    out.append(esc[c])
+                elif 0x30 <= c <= 0x37:
+                    j = i
+                    while j < i + 3 and j < len(data) and 0x30 <= data[j] <= 0x37:
+                        j += 1
+                    out.append(int(data[i:j], 8) & 0xFF)
+                    i = j
+                    continue
+                elif c in b"\r\n":
+                    if c == 13 and data[i + 1:i + 2] == b"\n":
+                        i += 1
+                else:
+                    out.append(c)
+            elif c == 0x28:
+                depth += 1
+                out.append(c)
+            elif c == 0x29:
+                depth -= 1
+                if depth == 0:
+                    return bytes(out), i + 1
+                out.append(c)
+            else:
+                out.append(c)
+            i += 1
+        raise ValueError("unterminated string")
+
+    # -- file access --
+
+    def _read(self, offset: int, n: int) -> bytes:
+        self.reads += 1
+        self.f.seek(offset)
+        return self.f.read(n)
+
+    def _object_at(self, offset: int, want_stream: bool = False):
+        """Parse `N G obj <value>` at `offset`; returns (value, stream bytes or None)."""
+        import re
+        size = 4096
+        while True:
+            data = self._read(offset, size)
+            m = re.match(rb"\s*\d+\s+\d+\s+obj", data)
+            if not m:
+                raise ValueError(f"no object at offset {offset}")
+            try:
+                value, end = self._parse(data, m.end())
+                break
+            except (ValueError, IndexError):
+                if len(data) < size or size >= 1 << 22:
+                    raise ValueError(f"cannot parse object at offset {offset}")
+                size *= 4
+        if not want_stream or not isinstance(value, dict):
+            return value, None
+        s = re.compile(rb"\s*stream\r?\n").match(data, end)
+        if not s:
+            return value, None
+        length = value.get("Length")
+        if isinstance(length, _PdfRef):
+            length = self.get(length)
+        start = offset + s.end()
+        if not isinstance(length, int):
+            tail = self._read(start, min(self.size - start, 1 << 24))
+            length = tail.find(b"endstream")
+            if length < 0:
+                raise ValueError("unterminated stream")
+        return value, self._read(start, length)
+
+    @staticmethod
+    def _decode(d: dict, data: bytes) -> bytes:
+        import zlib
+        filters = d.get("Filter")
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        if any(f != "FlateDecode" for f in filters):
+            raise ValueError(f"unsupported filter {filters}")
+        if filters:
+            try:
+                data = zlib.decompressobj().decompress(data)
+            except zlib.error as e:
+                raise ValueError(f"bad stream: {e}")
+        parms = d.get("DecodeParms") or {}
+        if isinstance(parms, list):
+            parms = parms[0] or {}
+        pred = parms.get("Predictor", 1)
+        if pred >= 10:
+            cols = parms.get("Columns", 1)
+            out = bytearray()
+            prev = bytearray(cols)
+            for r in range(0, len(data) - cols, cols + 1):
+                kind, row = data[r], bytearray(data[r + 1:r + 1 + cols])
+                for k in range(cols):
+                    left = row[k - 1] if k else 0
+                    if kind == 1:
+                        row[k] = (row[k] + left) & 0xFF
+                    elif kind == 2:
+                        row[k] = (row[k] + prev[k]) & 0xFF
+                    elif kind == 3:
+                        row[k] = (row[k] + ((left + prev[k]) >> 1)) & 0xFF
+                    elif kind == 4:
+                        up_left = prev[k - 1] if k else 0
+                        p = left + prev[k] - up_left
+                        pa, pb, pc = abs(p - left), abs(p - prev[k]), abs(p - up_left)
+                        row[k] = (row[k] + (left if pa <= pb and pa <= pc else prev[k] if pb <= pc else up_left)) & 0xFF
+                out += row
+                prev = row
+            data = bytes(out)
+        return data
+
+    def _load_xref(self) -> None:
+        import re
+        tail = self._read(max(0, self.size - PREFLIGHT_TAIL_BYTES), PREFLIGHT_TAIL_BYTES)
+        m = None
+        for m in re.finditer(rb"startxref\s+(\d+)", tail):
+            pass
+        if m is None:
+            raise ValueError("no startxref")
+        offset, seen = int(m.group(1)), set()
+        while offset is not None and offset not in seen and 0 <= offset < self.size:
+            seen.add(offset)
+            head = self._read(offset, 64)
+            if head.lstrip().startswith(b"xref"):
+                trailer = self._xref_table(offset)
+            else:
+                trailer = self._xref_stream(offset)
+            for k, v in trailer.items():
+                self.trailer.setdefault(k, v)
+            # Hybrid files keep the newer objects in an extra xref stream
+            if isinstance(trailer.get("XRefStm"), int) and trailer["XRefStm"] not in seen:
+                seen.add(trailer["XRefStm"])
+                self._xref_stream(trailer["XRefStm"])
+            prev = trailer.get("Prev")
+            offset = prev if isinstance(prev, int) else None
+
+    def _xref_table(self, offset: int) -> dict:
+        import re
+        pos = offset + self._read(offset, 64).index(b"xref") + 4
+        while True:
+            head = self._read(pos, 64)
+            m = re.match(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?", head)
+            if not m:
+                break
+            first, count = int(m.group(1)), int(m.group(2))
+            pos += m.end()
+            body = self._read(pos, count * 20 + 16)
+            entries = re.compile(rb"(\d{10})\s(\d{5})\s([nf])\s*").finditer(body)
+            end = 0
+            for k, e in zip(range(count), entries):
+                if e.group(3) == b"n":
+                    self.xref.setdefault(first + k, ("n", int(e.group(1))))
+                end = e.end()
+            if count and not end:
+                raise ValueError("bad xref table")
+            pos += end
+        t = self._read(pos, 64 << 10)
+        i = t.find(b"trailer")
+        if i < 0:
+            raise ValueError("no trailer")
+        trailer, _ = self._parse(t, i + 7)
+        return trailer
+
+    def _xref_stream(self, offset: int) -> dict:
+        d, raw = self._object_at(offset, want_stream=True)
+        if not isinstance(d, dict) or d.get("Type") != "XRef" or raw is None:
+            raise ValueError("bad xref stream")
+        data = self._decode(d, raw)
+        w = d["W"]
+        index = d.get("Index") or [0, d["Size"]]
+        row = sum(w)
+        pos = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for num in range(first, first + count):
+                if pos + row > len(data):
+                    break
+                fields = []
+                p = pos
+                for width in w:
+                    fields.append(int.from_bytes(data[p:p + width], "big") if width else None)
+                    p += width
+                pos += row
+                kind = 1 if fields[0] is None else fields[0]
+                if kind == 1:
+                    self.xref.setdefault(num, ("n", fields[1]))
+                elif kind == 2:
+                    self.xref.setdefault(num, ("s", fields[1], fields[2]))
+        return d
+
+    def get(self, ref):
+        """Resolve an indirect reference (other values pass through)."""
+        if not isinstance(ref, _PdfRef):
+            return ref
+        entry = self.xref.get(ref[0])
+        if entry is None:
+            return None
+        if entry[0] == "n":
+            return self._object_at(entry[1])[0]
+        stm = self._objstm.get(entry[1])
+        if stm is None:
+            d, raw = self._object_at(self.xref[entry[1]][1], want_stream=True)
+            data = self._decode(d, raw)
+            nums = [int(x) for x in data[:d["First"]].split()]
+            stm = self._objstm[entry[1]] = (data[d["First"]:], dict(zip(nums[0::2], nums[1::2])))
+        data, offsets = stm
+        if ref[0] not in offsets:
+            return None
+        return self._parse(data, offsets[ref[0]])[0]
+
+
+def _rc4(key: bytes, data: bytes) -> bytes:
+    s = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + s[i] + key[i % len(key)]) & 0xFF
+        s[i], s[j] = s[j], s[i]
+    out = bytearray()
+    i = j = 0
+    for ch in data:
+        i = (i + 1) & 0xFF
+        j = (j + s[i]) & 0xFF
+        s[i], s[j] = s[j], s[i]
+        out.append(ch ^ s[(s[i] + s[j]) & 0xFF])
+    return bytes(out)
+
+
+def _empty_password_opens(enc: dict, doc_id: bytes) -> bool | None:
+    """Whether the standard security handler accepts an empty user password.
+
+    None when it can't be told without AES (revision 6) or the handler is
+    not the standard one.
+    """
+    import hashlib
+    if enc.get("Filter") != "Standard":
+        return None
+    r = enc.get("R")
+    o, u = enc.get("O", b""), enc.get("U", b"")
+    if r in (2, 3, 4):
+        h = hashlib.md5(_PDF_PAD + o + (enc.get("P", 0) & 0xFFFFFFFF).to_bytes(4, "little") + doc_id)
+        if r == 4 and enc.get("EncryptMetadata") is False:
+            h.update(b"\xff\xff\xff\xff")
+        n = 5 if r == 2 else enc.get("Length", 40) // 8
+        key = h.digest()[:n]
+        if r == 2:
+            return _rc4(key, _PDF_PAD) == u[:32]
+        for _ in range(50):
+            key = hashlib.md5(key).digest()[:n]
+        x = _rc4(key, hashlib.md5(_PDF_PAD + doc_id).digest())
+        for i in range(1, 20):
+            x = _rc4(bytes(b ^ i for b in key), x)
+        return x == u[:16]
+    if r == 5:
+        return hashlib.sha256(u[32:40]).digest() == u[:32]
+    return None
+
+
+def _backend_empty_password(f) -> bool | None:
+    """Ask an installed backend whether the empty user password opens `f`.
+
+    Our own check only covers the plain standard handler; the backends are
+    the ones that will have to open the file, so their answer wins. None
+    when no backend is installed or none can tell (AES without its crypto
+    library, unsupported handlers).
+    """
+    if backend_available("pypdf"):
+        try:
+            from pypdf import PdfReader
+            f.seek(0)
+            return bool(PdfReader(f).decrypt(""))
+        except Exception:
+            pass
+    if backend_available("pdfminer"):
+        try:
+            from pdfminer.pdfdocument import PDFDocument, PDFPasswordIncorrect
+            from pdfminer.pdfparser import PDFParser
+        except ImportError:
+            return None
+        try:
+            f.seek(0)
+            PDFDocument(PDFParser(f), password="")
+            return True
+        except PDFPasswordIncorrect:
+            return False
+        except Exception:
+            pass
+    return None
+
+
+def _pdf_text_string(s) -> str | None:
+    if not isinstance(s, bytes):
+        return None
+    if s.startswith(b"\xfe\xff"):
+        return s[2:].decode("utf-16-be", errors="replace")
+    return s.decode("latin-1")
+
+
+def _sample_page_resources(pdf: _PdfLite, root: dict, count: int) -> list[dict | None]:
+    """Resources of up to PREFLIGHT_SAMPLE_PAGES pages spread through the document."""
+    out: list[dict | None] = []
+    for target in _sample_indices(count, PREFLIGHT_SAMPLE_PAGES):
+        node, res, budget = root, root.get("Resources"), pdf.reads + PREFLIGHT_MAX_READS
+        while node is not None and node.get("Type") != "Page" and "Kids" in node:
+            if pdf.reads > budget:
+                raise ValueError("page tree too large to sample")
+            kids = node.get("Kids")
+            kids = pdf.get(kids) if isinstance(kids, _PdfRef) else kids
+            if node.get("Count") == len(kids):
+                # Every kid is a leaf: index directly
+                node = pdf.get(kids[target])
+                target = 0
+            else:
+                for kid in kids:
+                    child = pdf.get(kid)
+                    n = child.get("Count", 1) if isinstance(child, dict) and "Kids" in child else 1
+                    if target < n:
+                        node = child
+                        break
+                    target -= n
+                    if pdf.reads > budget:
+                        raise ValueError("page tree too large to sample")
+                else:
+                    node = None
+            if isinstance(node, dict) and "Resources" in node:
+                res = node["Resources"]
+        if isinstance(node, dict):
+            res = node.get("Resources", res)
+        out.append(pdf.get(res) if res is not None else None)
+    return out
+
+
+def _resources_content(pdf: _PdfLite, res) -> tuple[bool, bool]:
+    """(has fonts, has images) for one resource dictionary, one form level deep."""
+    if not isinstance(res, dict):
+        return False, False
+    fonts = pdf.get(res.get("Font"))
+    has_font = isinstance(fonts, dict) and bool(fonts)
+    has_image = False
+    xobjects = pdf.get(res.get("XObject"))
+    if isinstance(xobjects, dict):
+        for ref in list(xobjects.values())[:16]:
+            x = pdf.get(ref)
+            if not isinstance(x, dict):
+                continue
+            if x.get("Subtype") == "Image":
+                has_image = True
+            elif x.get("Subtype") == "Form" and not has_font:
+                inner = pdf.get(x.get("Resources"))
+                if isinstance(inner, dict):
+                    inner_fonts = pdf.get(inner.get("Font"))
+                    has_font = isinstance(inner_fonts, dict) and bool(inner_fonts)
+                    inner_x = pdf.get(inner.get("XObject"))
+                    if isinstance(inner_x, dict) and not has_image:
+                        has_image = any(
+                            isinstance(pdf.get(v), dict) and pdf.get(v).get("Subtype") == "Image"
+                            for v in list(inner_x.values())[:4]
+                        )
+    return has_font, has_image
+
+
+def preflight_pdf(path: Path | PdfBytes) -> dict:
+    """Page count, encryption, producer and content type from the PDF's structure.
+
+    Only the header, trailer, cross-reference data, catalog, Info and the
+    resources of a few sampled pages are read; nothing is extracted.
+    Returns {"ok", "error", "pages", "encrypted", "encryption", "producer",
+    "content", "bytes", "version"}: "encryption" is None, "empty-password"
+    (opens without one), "password" or "unknown" (an installed backend has
+    the last word over the last two); "content" is "text",
+    "image" (scans without a text layer), "empty" or "unknown". Structural
+    surprises leave fields None rather than failing: extraction backends
+    are more forgiving than this reader. Memoized per (path, mtime, size).
+    """
+    if isinstance(path, PdfBytes):
+        with path.open() as f:
+            return _preflight_stream(f, len(path))
+    st = os.stat(path)
+    return dict(_preflight(os.path.abspath(path), st.st_mtime_ns, st.st_size))
+
+
+@functools.lru_cache(maxsize=4096)
+def _preflight(path: str, mtime_ns: int, size: int) -> dict:
+    with open(path, "rb") as f:
+        return _preflight_stream(f, size)
+
+
+def _preflight_stream(f, size: int) -> dict:
+    info = {"ok": True, "error": None, "bytes": size, "version": None, "pages": None, "encrypted": False,
+            "encryption": None, "producer": None, "content": "unknown"}
+    head = f.read(1024)
+    i = head.find(b"%PDF-")
+    if i < 0:
+        info.update(ok=False, error="not a PDF file")
+        return info
+    info["version"] = head[i + 5:i + 8].decode("ascii", errors="replace")
+    try:
+        pdf = _PdfLite(f, size)
+    except _PREFLIGHT_ERRORS:
+        return info
+    trailer = pdf.trailer
+    enc = None
+    try:
+        enc = pdf.get(trailer.get("Encrypt"))
+    except _PREFLIGHT_ERRORS:
+        enc = {}
+    if enc is not None:
+        info["encrypted"] = True
+        ids = trailer.get("ID")
+        doc_id = ids[0] if isinstance(ids, list) and ids and isinstance(ids[0], bytes) else b""
+        try:
+            opens = _empty_password_opens(enc, doc_id) if isinstance(enc, dict) else None
+        except _PREFLIGHT_ERRORS:
+            opens = None
+        if not opens:
+            # Advisory only: before calling a file locked (or giving up on
+            # AES-256), let a real backend try the empty password
+            checked = _backend_empty_password(f)
+            opens = opens if checked is None else checked
+        info["encryption"] = "unknown" if opens is None else "empty-password" if opens else "password"
+        if opens is False:
+            info.update(ok=False, error="password-protected PDF")
+    try:
+        if not info["encrypted"]:
+            meta = pdf.get(trailer.get("Info"))
+            if isinstance(meta, dict):
+                info["producer"] = _pdf_text_string(pdf.get(meta.get("Producer")))
+        root = pdf.get(pdf.get(trailer.get("Root")).get("Pages"))
+        count = pdf.get(root.get("Count"))
+        info["pages"] = count if isinstance(count, int) and count >= 0 else None
+    except _PREFLIGHT_ERRORS:
+        return info
+    if info["pages"] == 0:
+        info.update(ok=False, error="PDF has no pages")
+        return info
+    try:
+        seen = [_resources_content(pdf, r) for r in _sample_page_resources(pdf, root, info["pages"] or 1)]
+    except _PREFLIGHT_ERRORS:
+        return info
+    if any(font for font, _ in seen):
+        info["content"] = "text"
+    elif seen and all(img for _, img in seen):
+        info["content"] = "image"
+    elif not any(img for _, img in seen):
+        info["content"] = "empty"
+    return info
+
+
+def preflight_verdict(info: dict, *, image_only: str = "skip") -> str | None:
+    """Why a file should not go to extraction, or None to convert it."""
+    if not info["ok"]:
+        return info["error"]
+    if info["content"] == "image" and image_only == "skip":
+        return "image-only scan (no text layer)"
+    return None
+
+
+def schedule_jobs(jobs: list[tuple], *, image_only: str = "skip", threads: int = 8) -> tuple[list[tuple], list[dict]]:
+    """Preflight jobs (whose first item is the PDF) and order them largest first.
+
+    Returns (jobs to run, results for rejected files). Rejections look like
+    failed batch results; "skipped" is True when the file is readable but
+    was left out by choice (image-only scans). Running the longest
+    documents first keeps a big straggler from starting last and
+    stretching the tail of a batch. A job's third item, its options, gains
+    "preflight" so the worker doesn't read the file's structure again.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def check(job: tuple) -> dict:
+        try:
+            return preflight_pdf(job[0])
+        except OSError as e:
+            return {"ok": False, "error": str(e), "pages": None, "bytes": 0, "content": "unknown"}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(jobs)))) as ex:
+        infos = list(ex.map(check, jobs))
+    run, rejected = [], []
+    for job, info in zip(jobs, infos):
+        reason = preflight_verdict(info, image_only=image_only)
+        if reason:
+            rejected.append({"src": str(job[0]), "ok": False, "error": reason, "skipped": info["ok"], "preflight": info})
+        else:
+            if len(job) > 2 and isinstance(job[2], dict):
+                job = (job[0], job[1], {**job[2], "preflight": info}, *job[3:])
+            run.append((info["pages"] or max(1, info["bytes"] // PREFLIGHT_BYTES_PER_PAGE), job))
+    run.sort(key=lambda wj: -wj[0])
+    return [job for _, job in run], rejected
+
+
+def preflight_main(argv: list[str]) -> int:
+    import argparse
+    import json
+    ap = argparse.ArgumentParser(prog="pdf_minner preflight",
+                                 description="Report page count, encryption, producer and content type without extracting.")
+    ap.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or glob patterns")
+    ap.add_argument("--json", action="store_true", help="print one JSON object per file")
+    args = ap.parse_args(argv)
+
+    pdfs = [pdf for pdf, _ in collect_pdfs(args.inputs, None)]
+    if not pdfs:
+        print(f"{Fore.RED}No PDF files found.{Style.RESET_ALL}", file=sys.stderr)
+        return 2
+    bad = 0
+    for pdf in pdfs:
+        try:
+            info = preflight_pdf(pdf)
+        except OSError as e:
+            info = {"ok": False, "error": str(e)}
+        bad += not info["ok"]
+        if args.json:
+            print(json.dumps({"source": str(pdf), **info}, ensure_ascii=False))
+        elif not info["ok"]:
+            print(f"{Fore.RED}FAIL{Style.RESET_ALL} {pdf}: {info['error']}")
+        else:
+            enc = f", encrypted ({info['encryption']})" if info["encrypted"] else ""
+            producer = f", {info['producer']}" if info["producer"] else ""
+            print(f"{Fore.GREEN}OK{Style.RESET_ALL}   {pdf}: {info['pages'] if info['pages'] is not None else '?'} pages, "
+                  f"{info['content']}{enc}{producer}")
+    return 1 if bad else 0
+
+
+# -------- pdftotext engine --------
+
+# Pages per pdftotext invocation when a document is split across processes
+PDFTOTEXT_CHUNK_PAGES = 25
+
+_END = object()
+
+
+class PdftotextEngine:
+    """Poppler's pdftotext run as a bounded set of page-range subprocesses.
+
+    Up to `concurrency` invocations (`-f/-l` ranges of `chunk_pages`) run at
+    once; their stdout is read incrementally and pages are yielded in order
+    as soon as they are complete, with per-page progress on the queue.
+    Every invocation is killed after `timeout` seconds and, on POSIX, capped
+    at `mem_limit_mb` of address space. stderr goes to a temp file so a
+    chatty PDF can never fill the pipe and stall the reader.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 1,
+        chunk_pages: int = PDFTOTEXT_CHUNK_PAGES,
+        timeout: float | None = None,
+        mem_limit_mb: int | None = None,
+        exe: str | None = None,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.chunk_pages = max(1, chunk_pages)
+        self.timeout = timeout
+        self.mem_limit_mb = mem_limit_mb
+        self.exe = exe
+
+    def iter_pages(
+        self, path: Path | PdfBytes, progress: Queue | None = None, *, concurrency: int | None = None
+    ) -> Iterator[str]:
+        import threading as _threading
+        from collections import deque
+        exe = self.exe or _which("pdftotext")
+        if not exe:
+            raise RuntimeError("pdftotext not found in PATH")
+        workers = max(1, concurrency or self.concurrency)
+        n = _probe_page_count(path)
+        if not n or workers == 1 or n <= self.chunk_pages:
+            done = 0
+            for page in self._run(exe, path, None, None, None):
+                done += 1
+                self._report(progress, done, n)
+                yield page
+            return
+
+        ranges = deque((s + 1, min(s + self.chunk_pages, n)) for s in range(0, n, self.chunk_pages))
+        stop = _threading.Event()
+        procs: set = set()
+        window: deque = deque()
+
+        def pump(first: int, last: int, q: Queue) -> None:
+            try:
+                for page in self._run(exe, path, first, last, (stop, procs)):
+                    q.put(page)
+                q.put(_END)
+            except BaseException as e:
+                q.put(e)
+
+        def start_next() -> None:
+            first, last = ranges.popleft()
+            q: Queue = Queue()
+            t = _threading.Thread(target=pump, args=(first, last, q), daemon=True)
+            t.start()
+            window.append(q)
+
+        done = 0
+        try:
+            while ranges or window:
+                while ranges and len(window) < workers:
+                    start_next()
+                q = window.popleft()
+                while True:
+                    item = q.get()
+                    if item is _END:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    done += 1
+                    self._report(progress, done, n)
+                    yield item
+        finally:
+            stop.set()
+            for proc in list(procs):
+                if proc.poll() is None:
+                    proc.kill()
+
+    @staticmethod
+    def _report(progress: Queue | None, done: int, n: int | None) -> None:
+        if progress:
+            if n:
+                progress.put(("progress", int(min(done, n) * 100 / n)))
+            else:
+                progress.put(("status", f"extracting with pdftotext (page {done})"))
+
+    @staticmethod
+    def _feed(pipe, data) -> None:
+        # pdftotext may exit (or be killed) before reading everything
+        try:
+            pipe.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def _run(self, exe: str, path: Path | PdfBytes, first: int | None, last: int | None, shared) -> Iterator[str]:
+        """Stream pages from one pdftotext invocation (PDF data in memory goes in on stdin)."""
+        import codecs
+        import subprocess
+        import tempfile
+        mem = isinstance(path, PdfBytes)
+        cmd = [exe, "-layout"]
+        if first is not None:
+            cmd += ["-f", str(first), "-l", str(last)]
+        cmd += ["-" if mem else str(path), "-"]
+        if self.mem_limit_mb and os.name == "posix":
+            # Set the cap in a shell that then execs pdftotext: preexec_fn is
+            # not safe when Popen is called from several threads, as here
+            cmd = ["/bin/sh", "-c", 'ulimit -v "$0" && exec "$@"', str(self.mem_limit_mb << 10), *cmd]
+        err = tempfile.TemporaryFile()
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if mem else subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=err)
+        if mem:
+            threading.Thread(target=self._feed, args=(proc.stdin, path.data), daemon=True).start()
+        if shared is not None:
+            stop, procs = shared
+            procs.add(proc)
+        timer = None
+        expired = []
+        if self.timeout:
+            def kill() -> None:
+                expired.append(True)
+                proc.kill()
+            timer = threading.Timer(self.timeout, kill)
+            timer.daemon = True
+            timer.start()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        try:
+            pending = ""
+            while True:
+                if shared is not None and shared[0].is_set():
+                    return
+                # read1: whatever has arrived, so pages aren't held back for a full buffer
+                block = proc.stdout.read1(1 << 16)
+                if not block:
+                    break
+                pending += decoder.decode(block)
+                *pages, pending = pending.split("\f")
+                yield from pages
+            pending += decoder.decode(b"", final=True)
+            if pending:
+                yield pending
+            rc = proc.wait()
+            if expired:
+                raise TimeoutError(f"pdftotext timed out after {self.timeout:g}s")
+            if rc != 0:
+                err.seek(0)
+                msg = err.read(4096).decode("utf-8", errors="ignore").strip()
+                raise RuntimeError(f"exit status {rc}: {msg}" if msg else f"exit status {rc}")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            err.close()
+            if shared is not None:
+                shared[1].discard(proc)
+
+
+# -------- Extraction cache --------
+
+# Bump when the cached page format or extraction semantics change
+CACHE_FORMAT = 1
+DEFAULT_CACHE_BYTES = 1 << 30
+# Eviction trims the cache to this share of max_bytes, so the next few
+# writes don't each trigger another full scan
+CACHE_EVICT_TO = 0.9
+
+# Bytes each cache directory is believed to hold, per process: set by a
+# full scan, then advanced by this process's own writes (cache objects
+# are pickled afresh for every pool job, so this can't live on them)
+_CACHE_USAGE: dict[str, int] = {}
+
+
+def file_digest(path: Path | PdfBytes) -> str:
+    """SHA-256 of the file content, memoized per (path, mtime, size)."""
+    if isinstance(path, PdfBytes):
+        return path.sha256()
+    st = os.stat(path)
+    return _file_digest(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=4096)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while True:
+            block = fp.read(1 << 20)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """On-disk cache of raw extracted pages, keyed by PDF content.
+
+    Entries are gzip-compressed JSON lines (a header naming the backend,
+    then one page per line) stored under `root/<k[:2]>/<k>.jsonl.gz`.
+    Reads refresh an entry's mtime and the oldest entries are evicted once
+    the directory grows past `max_bytes`; its size is scanned once per
+    process and then tracked from our own writes, so a write costs no
+    directory walk until the budget is reached. Writers use a temp file
+    plus os.replace(), so concurrent workers never see half-written entries.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def key(self, path: Path | PdfBytes, backend: str, options: dict | None = None) -> str:
+        import hashlib
+        import json
+        opts = json.dumps(options or {}, sort_keys=True)
+        raw = f"{CACHE_FORMAT}\0{file_digest(path)}\0{backend}\0{opts}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.jsonl.gz"
+
+    # Text is stored under the backend that produced it, with that backend's
+    # version, so a pinned run and an "auto" run that resolves to the same
+    # backend share an entry. What "auto" falls back to, and what "fastest"
+    # picks, depends on the installed set, so those are stored under a key
+    # naming every available backend: installing or upgrading one misses.
+
+    def lookup_keys(self, path: Path | PdfBytes, backend: str, exe: str | None = None) -> list[str]:
+        """Keys that may hold the text a `backend` request would produce, most specific first."""
+        if backend in BACKENDS:
+            return [self.key(path, backend, _backend_signature(backend, exe))]
+        keys = []
+        available = _available_backends(exe)
+        if backend == "auto" and available:
+            keys.append(self.key(path, available[0], _backend_signature(available[0], exe)))
+        return keys + [self.key(path, backend, {b: _backend_signature(b, exe) for b in available})]
+
+    def store_key(self, path: Path | PdfBytes, backend: str, name: str, exe: str | None = None) -> str:
+        """Key for the text backend `name` produced for a `backend` request."""
+        available = _available_backends(exe)
+        if backend in BACKENDS or (backend == "auto" and available[:1] == [name]):
+            return self.key(path, name, _backend_signature(name, exe))
+        return self.key(path, backend, {b: _backend_signature(b, exe) for b in available})
+
+    def lookup(self, path: Path | PdfBytes, backend: str, exe: str | None = None) -> tuple[str, Iterator[str]] | None:
+        """get() for the first of lookup_keys() that is cached."""
+        for key in self.lookup_keys(path, backend, exe):
+            hit = self.get(key)
+            if hit is not None:
+                return hit
+        return None
+
+    def get(self, key: str) -> tuple[str, Iterator[str]] | None:
+        """Return (backend, pages) for a hit, or None."""
+        import gzip
+        import json
+        entry = self._entry(key)
+        try:
+            fp = gzip.open(entry, "rt", encoding="utf-8")
+        except OSError:
+            return None
+        try:
+            header = json.loads(fp.readline())
+            os.utime(entry)
+        except (OSError, ValueError):
+            fp.close()
+            return None
+
+        def pages() -> Iterator[str]:
+            with fp:
+                for line in fp:
+                    yield json.loads(line)
+
+        return header["backend"], pages()
+
+    def record(self, key: str, backend: str, pages: Iterable[str]) -> Iterator[str]:
+        """Pass `pages` through, storing them once the stream is exhausted."""
+        import gzip
+        import json
+        import tempfile
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=entry.parent, suffix=".tmp")
+        committed = False
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8", compresslevel=6) as fp:
+                fp.write(json.dumps({"backend": backend}) + "\n")
+                for page in pages:
+                    fp.write(json.dumps(page) + "\n")
+                    yield page
+            try:
+                grown = os.path.getsize(tmp) - os.path.getsize(entry)
+            except OSError:
+                grown = os.path.getsize(tmp)
+            os.replace(tmp, entry)
+            committed = True
+        finally:
+            if not committed:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+        used = _CACHE_USAGE.get(str(self.root))
+        if used is None or used + grown > self.max_bytes:
+            self.evict()
+        else:
+            _CACHE_USAGE[str(self.root)] = used + grown
+
+    def put(self, key: str, backend: str, pages: Iterable[str]) -> None:
+        for _ in self.record(key, backend, pages):
+            pass
+
+    def evict(self) -> None:
+        """Drop least recently used entries once the cache is over max_bytes.
+
+        Trims to CACHE_EVICT_TO of the budget and records the resulting
+        size for later writes to count from.
+        """
+        # Writers killed mid-entry (e.g. a broken process pool) leave temp files
+        stale = time.time() - 3600
+        for f in self.root.glob("*/*.tmp"):
+            try:
+                if f.stat().st_mtime < stale:
+                    f.unlink()
+            except OSError:
+                pass
+        entries = []
+        total = 0
+        for f in self.root.glob("*/*.jsonl.gz"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        if total > self.max_bytes:
+            target = self.max_bytes * CACHE_EVICT_TO
+            entries.sort()
+            for _, size, f in entries:
+                try:
+                    f.unlink()
+                except OSError:
+                    continue
+                total -= size
+                if total <= target:
+                    break
+        _CACHE_USAGE[str(self.root)] = total
+
+
+def default_cache() -> ExtractionCache | None:
+    """The per-user cache, or None when PDF_MINNER_CACHE is set to 0/off."""
+    if os.environ.get("PDF_MINNER_CACHE", "").lower() in ("0", "off", "no", "false"):
+        return None
+    root = os.environ.get("PDF_MINNER_CACHE_DIR")
+    if not root:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "pdf_minner", "extract")
+    return ExtractionCache(Path(root))
+
+
+def _available_backends(exe: str | None = None) -> list[str]:
+    return [b for b in BACKENDS if backend_available(b) or (b == "pdftotext" and exe)]
+
+
+@functools.lru_cache(maxsize=None)
+def _backend_signature(name: str, exe: str | None = None) -> dict:
+    """What backend `name`'s text depends on: its version (pdftotext: the binary)."""
+    if name == "pdftotext":
+        exe = exe or _which("pdftotext")
+        try:
+            st = os.stat(exe)
+        except (OSError, TypeError):
+            return {"exe": exe}
+        return {"exe": exe, "mtime": st.st_mtime_ns, "size": st.st_size}
+    from importlib import metadata
+    try:
+        return {"version": metadata.version({"pdfminer": "pdfminer.six"}.get(name, name))}
+    except metadata.PackageNotFoundError:
+        return {"version": None}
+
+
+# -------- Pipeline metrics --------
+
+# Allocation sites kept per document when tracing memory
+TRACE_TOP_SITES = 10
+
+
+class PipelineMetrics:
+    """Stage timings and counters for one document's trip through the pipeline.
+
+    Pages and lines are pulled through generators, so stages interleave;
+    time is charged to whichever stage is running at the innermost level,
+    which makes the per-stage numbers add up to the document's total. CPU
+    time is the process's own (pdftotext subprocesses show up under
+    `child_cpu`). `callback` receives event dicts ("fallback" as it
+    happens, "document" when the document is finished). `profile_dir`
+    saves a cProfile dump per document; `trace_memory` records the peak of
+    Python allocations and the top allocation sites via tracemalloc.
+    """
+
+    def __init__(self, callback=None, *, profile_dir: Path | None = None, trace_memory: bool = False) -> None:
+        self.callback = callback
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.trace_memory = trace_memory
+        self._reset(None)
+
+    def _reset(self, source) -> None:
+        self.source = str(source) if source is not None else None
+        self.stages: dict[str, dict] = {}
+        self.backend: str | None = None
+        self.cache: str | None = None
+        self.fallbacks: list[dict] = []
+        self.record: dict = {}
+        self._stack: list[str] = []
+        self._mark = (0.0, 0.0)
+
+    # -- stage accounting --
+
+    def _stage(self, name: str) -> dict:
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = {"wall": 0.0, "cpu": 0.0, "pages": 0, "lines": 0, "chars": 0}
+        return st
+
+    def _switch(self, push: str | None) -> None:
+        now, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            st = self._stage(self._stack[-1])
+            st["wall"] += now - self._mark[0]
+            st["cpu"] += cpu - self._mark[1]
+        if push is None:
+            self._stack.pop()
+        else:
+            self._stack.append(push)
+        self._mark = (now, cpu)
+
+    def stage(self, name: str):
+        """Context manager charging the enclosed work to stage `name`."""
+        import contextlib
+
+        @contextlib.contextmanager
+        def timed():
+            self._switch(name)
+            try:
+                yield
+            finally:
+                self._switch(None)
+        return timed()
+
+    def wrap(self, name: str, items: Iterable[str], unit: str = "pages") -> Iterator[str]:
+        """Pass `items` through, charging the time spent producing them to `name`."""
+        it = iter(items)
+        st = self._stage(name)
+        while True:
+            self._switch(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self._switch(None)
+            st[unit] += 1
+            st["chars"] += len(item)
+            yield item
+
+    def fallback(self, backend: str, error, during: str = "extract") -> None:
+        """Note a backend that failed and was skipped over."""
+        ev = {"backend": backend, "during": during}
+        if isinstance(error, BaseException):
+            ev.update(error=str(error) or error.__class__.__name__, type=error.__class__.__name__)
+        else:
+            ev["error"] = str(error)
+        self.fallbacks.append(ev)
+        self.emit("fallback", **ev)
+
+    def emit(self, event: str, **data) -> None:
+        if self.callback is not None:
+            self.callback({"event": event, "source": self.source, **data})
+
+    # -- per-document lifecycle --
+
+    def document(self, source: Path):
+        """Context manager around one conversion; fills in `record`."""
+        import contextlib
+
+        @contextlib.contextmanager
+        def run():
+            self._reset(source)
+            prof = tracing = None
+            if self.profile_dir is not None:
+                import cProfile
+                prof = cProfile.Profile()
+                try:
+                    prof.enable()
+                except ValueError:  # another profiler is already active
+                    prof = None
+            if self.trace_memory:
+                import tracemalloc
+                tracing = not tracemalloc.is_tracing()
+                if tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+            t0, c0, k0 = time.perf_counter(), time.process_time(), _child_cpu()
+            error = None
+            try:
+                yield self
+            except BaseException as e:
+                error = str(e) or e.__class__.__name__
+                raise
+            finally:
+                while self._stack:
+                    self._switch(None)
+                rec = {
+                    "source": self.source,
+                    "bytes": _file_size(source),
+                    "pages": max((s["pages"] for s in self.stages.values()), default=0),
+                    "backend": self.backend,
+                    "cache": self.cache,
+                    "wall": time.perf_counter() - t0,
+                    "cpu": time.process_time() - c0,
+                    "child_cpu": _child_cpu() - k0,
+                    "stages": self.stages,
+                    "fallbacks": self.fallbacks,
+                    "peak_rss_mb": _peak_rss_mb(),
+                    "error": error,
+                }
+                if prof is not None:
+                    prof.disable()
+                    rec["profile"] = str(self._dump_profile(prof, Path(source)))
+                if self.trace_memory:
+                    import tracemalloc
+                    rec["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                    top = tracemalloc.take_snapshot().statistics("lineno")[:TRACE_TOP_SITES]
+                    rec["top_allocations"] = [
+                        {"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "kb": s.size / 1024}
+                        for s in top
+                    ]
+                    if tracing:
+                        tracemalloc.stop()
+                self.record = rec
+                self.emit("document", **{k: v for k, v in rec.items() if k != "source"})
+        return run()
+
+    def _dump_profile(self, prof, source: Path) -> Path:
+        import hashlib
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        tag = hashlib.sha1(str(source.resolve()).encode("utf-8")).hexdigest()[:8]
+        out = self.profile_dir / f"{source.stem}-{tag}.prof"
+        prof.dump_stats(str(out))
+        return out
+
+
+def _file_size(path: Path | PdfBytes) -> int | None:
+    try:
+        return source_size(path)
+    except (OSError, TypeError):
+        return None
+
+
+def _child_cpu() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+def _peak_rss_mb() -> float | None:
+    """High-water mark of this process's resident memory (not reset per document)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def metrics_jsonl_writer(path: Path):
+    """A PipelineMetrics callback appending "document" events to `path` as JSON lines."""
+    import json
+    lock = threading.Lock()
+
+    def write(event: dict) -> None:
+        if event.get("event") != "document":
+            return
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    return write
+
+
+# -------- Screenplay Markdown Formatter --------
+
+import re
+
+# Bump whenever formatter output changes so manifests know to re-format
+FORMATTER_VERSION = 2
+
+SCENE_RE = re.compile(r"^(INT\.|EXT\.|INT/EXT\.|I/E\.)[\w\W]*")
+TRANSITION_RE = re.compile(r"^[A-Z][A-Z \-]+TO:\s*$")
+
+
+def format_screenplay_md(text: str) -> str:
+    cleaned = list(iter_format_screenplay_md(text.splitlines()))
+    return "\n".join(cleaned) + ("\n" if cleaned and cleaned[-1] != "" else "")
+
+
+def iter_format_screenplay_md(lines: Iterable[str]) -> Iterator[str]:
+    """Streaming form of format_screenplay_md(): lines in, Markdown lines out."""
+    return _format_classified(map(_classify_line, lines))
+
+
+def format_lines(lines: Iterable[str], doc_format: str = "auto", *, tracker=None) -> tuple[str, Iterator[str]]:
+    """Pick a formatter for `lines` (or use `doc_format`) and stream the Markdown.
+
+    Returns (format name, output lines). Head lines are classified once and
+    the classes are reused by the formatter; see FORMATTERS. A _PageTracker
+    `tracker` counts the input lines the formatter has taken.
+    """
+    lines = iter(lines)
+    if doc_format == "auto":
+        name, head = _detect_format(lines)
+    elif doc_format in FORMATTERS:
+        name, head = doc_format, []
+    else:
+        raise ValueError(f"unknown document format {doc_format!r}")
+    if tracker is not None:
+        return name, FORMATTERS[name].format(tracker.tally(head), tracker.tally(lines))
+    return name, FORMATTERS[name].format(head, lines)
+
+
+def format_document_md(text: str, doc_format: str = "auto") -> str:
+    cleaned = list(format_lines(text.splitlines(), doc_format)[1])
+    return "\n".join(cleaned) + ("\n" if cleaned and cleaned[-1] != "" else "")
+
+
+# Line classes; scene headings, transitions and character cues are disjoint
+# (a heading has a ".", a transition a ":", a cue only letters)
+_BLANK, _SCENE, _TRANSITION, _CHARACTER, _TEXT = range(5)
+_SCENE_PREFIXES = ("INT.", "EXT.", "INT/EXT.", "I/E.")  # SCENE_RE without the regex
+
+
+def _classify_line(raw: str) -> tuple[str, str, int]:
+    """(raw, stripped, class) for one line; the formatter's only per-line checks."""
+    s = raw.strip()
+    if not s:
+        return raw, s, _BLANK
+    if s.startswith(_SCENE_PREFIXES):
+        return raw, s, _SCENE
+    if s.endswith("TO:") and TRANSITION_RE.match(s):
+        return raw, s, _TRANSITION
+    # Short, all caps, only letters besides spaces, hyphens and apostrophes
+    if 2 <= len(s) <= 30 and s.isupper() and s.replace(" ", "").replace("-", "").replace("'", "").isalpha():
+        return raw, s, _CHARACTER
+    return raw, s, _TEXT
+
+
+def _format_classified(items: Iterable[tuple[str, str, int]]) -> Iterator[str]:
+    """Screenplay state machine over classified lines, collapsing blank runs as it goes."""
+    in_dialogue = False
+    blank_run = 0
+    for raw, s, kind in items:
+        if kind == _BLANK:
+            in_dialogue = False
+            blank_run += 1
+            if blank_run <= 2:
+                yield ""
+            continue
+        blank_run = 0
+        if kind == _TEXT:
+            if in_dialogue and s.startswith("(") and s.endswith(")") and len(s) < 80:
+                yield f"_{s}_"
+            else:
+                yield raw.rstrip()
+        elif kind == _SCENE:
+            in_dialogue = False
+            yield f"## {s}"
+        elif kind == _TRANSITION:
+            in_dialogue = False
+            yield f"> _{s}_"
+        else:
+            in_dialogue = True
+            yield f"**{s}**"
+
+
+def detect_screenplay(text: str) -> bool:
+    return detect_document_format(text) == "screenplay"
+
+
+def detect_screenplay_lines(lines: Iterable[str]) -> bool:
+    return _detect_format(iter(lines))[0] == "screenplay"
+
+
+def detect_document_format(text: str) -> str:
+    """Name of the formatter auto-detection picks for `text`."""
+    return _detect_format(iter(text.splitlines()))[0]
+
+
+# -------- Document formatters --------
+
+# Detectors only ever look at the head of a document
+FORMAT_SCAN_LINES = 1000
+
+ACT_RE = re.compile(
+    r"^(ACT|SCENE)\s+([IVXLC]+|\d+|ONE|TWO|THREE|FOUR|FIVE|SIX|SEVEN|EIGHT|NINE|TEN)\b(\s*[.:\-].{0,60})?$",
+    re.IGNORECASE,
+)
+# "HAMLET. To be..." / "NORA: Torvald!" / "DR. RANK. Yes."
+INLINE_CUE_RE = re.compile(
+    r"^((?:(?:DR|MR|MRS|MS|MISS|ST|REV|PROF|SGT|CAPT|LT|COL|GEN)\. )?"
+    r"[A-Z][A-Z'\-]+(?: [A-Z][A-Z'\-]+){0,2})([.:])\s+(\S.*)$"
+)
+# "[00:01:02] Jane Doe: text" / "SPEAKER 2: text"
+SPEAKER_RE = re.compile(
+    r"^(?:[\[(]?(\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?)[\])]?\s+)?"
+    r"([A-Z][\w.'\-]*(?: [A-Z0-9][\w.'\-]*){0,3}):(?:\s+(\S.*))?$"
+)
+TIMESTAMP_RE = re.compile(r"^[\[(]?\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?[\])]?(?:\s|$)")
+QA_RE = re.compile(r"^[QA][.:]\s")
+# Screenplay dialogue is set in a narrow column; a CAPS heading over a
+# paragraph is not a character cue
+SCREENPLAY_DIALOGUE_WIDTH = 45
+# Paragraph text never stays in one block for longer than this when reflowing
+PROSE_MAX_BLOCK_LINES = 200
+# "Chapter 3", "PART II", "Book One", "Prologue": an UPPER or Title case keyword alone or before a
+# number, so wrapped lines like "part of the reason" or "Book was on the table" stay in their paragraph
+_PROSE_HEADING_RE = re.compile(
+    r"^(?:CHAPTER|PART|BOOK|PROLOGUE|EPILOGUE|APPENDIX|Chapter|Part|Book|Prologue|Epilogue|Appendix)"
+    r"(?:$|:|\s+(?:\d+|[IVXLCDM]+|[A-Z]"
+    r"|(?i:one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen"
+    r"|sixteen|seventeen|eighteen|nineteen|twenty))\b)"
+)
+
+
+class DocumentFormatter:
+    """One document type: an incremental detector and a streaming formatter.
+
+    `detector()` makes a fresh detector: feed(raw, stripped, cls) is called
+    for each head line and returns True once it is sure, verdict() decides
+    when the scan window ends without anyone being sure. None means the
+    type is only used when asked for. `format(head, rest)` gets the
+    classified head lines and the iterator of remaining raw lines, and
+    yields Markdown lines.
+    """
+
+    __slots__ = ("name", "detector", "format")
+
+    def __init__(self, name: str, detector, format) -> None:
+        self.name = name
+        self.detector = detector
+        self.format = format
+
+
+# Detectors are consulted in this order; "plain" is the fallback
+FORMATTERS: dict[str, DocumentFormatter] = {}
+
+
+def register_formatter(name: str, detector, format) -> None:
+    """Add or replace a document type (see DocumentFormatter)."""
+    FORMATTERS[name] = DocumentFormatter(name, detector, format)
+
+
+def _detect_format(lines: Iterator[str]) -> tuple[str, list[tuple[str, str, int]]]:
+    """Feed head lines to every detector until one is sure.
+
+    Returns (format name, classified lines read); lines after an early
+    verdict are left unread in the iterator.
+    """
+    import itertools
+    detectors = [(f.name, f.detector()) for f in FORMATTERS.values() if f.detector is not None]
+    head = []
+    for raw in itertools.islice(lines, FORMAT_SCAN_LINES):
+        item = _classify_line(raw)
+        head.append(item)
+        for name, d in detectors:
+            if d.feed(*item):
+                return name, head
+    for name, d in detectors:
+        if d.verdict():
+            return name, head
+    return "plain", head
+
+
+def _head_raw(head: list[tuple[str, str, int]], rest: Iterator[str]) -> Iterator[str]:
+    yield from (raw for raw, _, _ in head)
+    yield from rest
+
+
+class _ScreenplayDetector:
+    """INT./EXT. headings and transitions, CHARACTER cues followed by dialogue."""
+
+    def __init__(self) -> None:
+        self.scenes = self.cues = 0
+        self._prev = _BLANK
+
+    def feed(self, raw: str, s: str, kind: int) -> bool:
+        prev, self._prev = self._prev, kind
+        if kind == _SCENE or kind == _TRANSITION:
+            self.scenes += 1
+        elif kind == _TEXT and prev == _CHARACTER and len(s) <= SCREENPLAY_DIALOGUE_WIDTH:
+            self.cues += 1
+        else:
+            return False
+        return self.scenes >= 2 or (self.scenes and self.cues >= 3)
+
+    def verdict(self) -> bool:
+        return self.scenes >= 1 or self.cues >= 5
+
+
+class _StageplayDetector:
+    """ACT/SCENE headings, NAME. or NAME: speech prefixes, cue lines, (directions)."""
+
+    def __init__(self) -> None:
+        self.acts = self.cues = self.periods = self.colons = self.directions = 0
+        self._prev = _BLANK
+
+    def feed(self, raw: str, s: str, kind: int) -> bool:
+        prev, self._prev = self._prev, kind
+        if kind == _BLANK:
+            return False
+        c = s[0]
+        if c in "AaSs" and ACT_RE.match(s):
+            self.acts += 1
+        elif kind != _TEXT:
+            return False
+        elif prev == _CHARACTER:
+            self.cues += 1
+        elif c in "([" and s[-1] in ")]":
+            self.directions += 1
+        elif c.isupper() and (m := INLINE_CUE_RE.match(s)):
+            if m[2] == ".":
+                self.periods += 1
+            else:
+                self.colons += 1
+        else:
+            return False
+        speeches = self.cues + self.periods + self.colons
+        return (
+            (self.acts and speeches >= 3) or self.periods >= 5
+            or (self.colons >= 6 and self.directions >= 2)
+        )
+
+    def verdict(self) -> bool:
+        return (
+            (self.acts and self.cues + self.periods + self.colons >= 1) or self.periods >= 3
+            or (self.colons >= 4 and self.directions >= 1)
+        )
+
+
+class _TranscriptDetector:
+    """A few recurring "Speaker:" prefixes, timestamps or Q./A. lines."""
+
+    def __init__(self) -> None:
+        self.turns = self.titled = self.stamps = self.qa = 0
+        self.speakers: set[str] = set()
+
+    def feed(self, raw: str, s: str, kind: int) -> bool:
+        if kind != _TEXT:
+            return False
+        c = s[0]
+        if c in "QA" and QA_RE.match(s):
+            self.qa += 1
+            return self.qa >= 6
+        if c.isdigit() or c in "[(":
+            if not TIMESTAMP_RE.match(s):
+                return False
+            self.stamps += 1
+        m = SPEAKER_RE.match(s) if ":" in s else None
+        if m is None:
+            return False
+        self.turns += 1
+        self.speakers.add(m[2])
+        if not m[2].isupper():
+            self.titled += 1
+        return (self.stamps >= 3 and self.turns >= 3) or (self.titled >= 8 and len(self.speakers) <= 12)
+
+    def verdict(self) -> bool:
+        return self.qa >= 3 or (self.turns >= 5 and len(self.speakers) * 2 <= self.turns)
+
+
+class _ProseDetector:
+    """Mostly long lines and next to nothing that looks like a script."""
+
+    def __init__(self) -> None:
+        self.lines = self.long = self.script = 0
+        self._prev = _BLANK
+
+    def feed(self, raw: str, s: str, kind: int) -> bool:
+        prev, self._prev = self._prev, kind
+        if kind == _BLANK:
+            return False
+        self.lines += 1
+        if len(s) >= 50:
+            self.long += 1
+        elif kind == _SCENE or kind == _TRANSITION or (kind == _TEXT and prev == _CHARACTER):
+            self.script += 1
+        # Only call it early when a script would have shown itself by now
+        return self.lines >= 300 and self.long * 10 >= self.lines * 7 and self.script * 100 <= self.lines
+
+    def verdict(self) -> bool:
+        return self.lines >= 10 and self.long * 2 >= self.lines and self.script * 20 <= self.lines
+
+
+def _format_screenplay(head: list, rest: Iterator[str]) -> Iterator[str]:
+    import itertools
+    return _format_classified(itertools.chain(head, map(_classify_line, rest)))
+
+
+def _format_stageplay(head: list, rest: Iterator[str]) -> Iterator[str]:
+    """ACT -> ##, SCENE -> ###, speaker names in bold, (directions) in italics."""
+    import itertools
+    blank_run = 0
+    for raw, s, kind in itertools.chain(head, map(_classify_line, rest)):
+        if kind == _BLANK:
+            blank_run += 1
+            if blank_run <= 2:
+                yield ""
+            continue
+        blank_run = 0
+        c = s[0]
+        if c in "AaSs" and ACT_RE.match(s):
+            yield ("## " if c in "Aa" else "### ") + s
+        elif kind == _CHARACTER:
+            yield f"**{s}**"
+        elif c in "([" and s[-1] in ")]":
+            yield f"_{s}_"
+        elif kind == _TEXT and c.isupper() and (m := INLINE_CUE_RE.match(s)):
+            yield f"**{m[1]}{m[2]}** {m[3]}"
+        else:
+            yield raw.rstrip()
+
+
+def _format_transcript(head: list, rest: Iterator[str]) -> Iterator[str]:
+    """Speaker names in bold, timestamps as code, Q./A. markers in bold."""
+    blank_run = 0
+    for raw in _head_raw(head, rest):
+        s = raw.strip()
+        if not s:
+            blank_run += 1
+            if blank_run <= 2:
+                yield ""
+            continue
+        blank_run = 0
+        if QA_RE.match(s):
+            yield f"**{s[:2]}**{s[2:]}"
+        elif ":" in s and (m := SPEAKER_RE.match(s)):
+            stamp, speaker, text = m.groups()
+            line = f"**{speaker}:**" + (f" {text}" if text else "")
+            yield f"`{stamp}` {line}" if stamp else line
+        else:
+            yield raw.rstrip()
+
+
+def _is_prose_heading(s: str) -> bool:
+    if len(s) > 70 or s[-1] in ".,;:!?" or not (s[0].isupper() or s[0].isdigit()):
+        return False
+    if s.isupper() or _PROSE_HEADING_RE.match(s):
+        return True
+    words = s.split()
+    return len(words) <= 10 and sum(w[0].isupper() or w[0].isdigit() for w in words) * 2 > len(words)
+
+
+def _format_prose(head: list, rest: Iterator[str]) -> Iterator[str]:
+    """Reflow wrapped lines into one line per paragraph; short standalone or CAPS lines become headings.
+
+    A paragraph ends at a blank line, or at a line well short of the widest
+    line so far that ends a sentence (for text extracted without blank
+    lines). Words hyphenated across lines are rejoined and bare page
+    numbers dropped.
+    """
+    block: list[str] = []
+    wide = 0
+    first = True
+
+    def flush() -> Iterator[str]:
+        nonlocal first
+        if not block:
+            return
+        if not first:
+            yield ""
+        first = False
+        if len(block) == 1 and _is_prose_heading(block[0]):
+            yield f"## {block[0]}"
+        else:
+            yield " ".join(block)
+        block.clear()
+
+    for raw in _head_raw(head, rest):
+        s = raw.strip()
+        if not s:
+            yield from flush()
+            continue
+        if s.isdigit() and len(s) <= 4:
+            continue
+        if len(s) <= 60 and _PROSE_HEADING_RE.match(s) and s[-1] not in ".,;:":
+            yield from flush()
+            block.append(s)
+            yield from flush()
+            continue
+        wide = max(wide, min(len(s), 120))
+        if len(block) == 1 and block[0].isupper() and _is_prose_heading(block[0]):
+            # A CAPS heading set directly over its paragraph
+            yield from flush()
+        if block and block[-1].endswith("-") and len(block[-1]) > 1 and block[-1][-2].isalpha() and s[0].islower():
+            block[-1] = block[-1][:-1] + s
+        else:
+            block.append(s)
+        if len(block) >= PROSE_MAX_BLOCK_LINES or (
+            len(s) * 4 < wide * 3 and s[-1] in ".!?\"'”)" and len(block) > 1
+        ):
+            yield from flush()
+    yield from flush()
+
+
+def _format_plain(head: list, rest: Iterator[str]) -> Iterator[str]:
+    return _head_raw(head, rest)
+
+
+register_formatter("screenplay", _ScreenplayDetector, _format_screenplay)
+register_formatter("stageplay", _StageplayDetector, _format_stageplay)
+register_formatter("transcript", _TranscriptDetector, _format_transcript)
+register_formatter("prose", _ProseDetector, _format_prose)
+register_formatter("plain", None, _format_plain)
+
+
+# -------- Watermark detection/removal --------
+
+def _split_pages(text: str) -> list[str]:
+    # Many backends insert form feed between pages
+    if "\f" in text:
+        return text.split("\f")
+    # Fallback: single page
+    return [text]
+
+
+def _normalize_line(s: str) -> str:
+    return " ".join(s.strip().split())
+
+
+def _page_short_lines(page: str) -> set[str]:
+    # consider unique short lines per page to reduce bias
+    seen = set()
+    for raw in page.splitlines():
+        s = _normalize_line(raw)
+        if not s or len(s) > 60 or len(s) < 2 or s.isdigit():
+            continue
+        seen.add(s)
+    return seen
+
+
+def _watermark_threshold(n: int) -> int:
+    # appears on >= 60% of pages and at least 3 pages
+    return max(3, int(0.6 * n))
+
+
+# Below this many lines importing NumPy costs more than its counting saves
+LINE_TABLE_NUMPY_MIN = 1_000_000
+
+
+class LineTable:
+    """Every line of a document, split into pages and normalized once.
+
+    lines[i] is the raw text of line i and ids[i] its normalized form as an
+    index into `phrases` (each distinct line is normalized and stored once);
+    lines page_starts[p]:page_starts[p + 1] belong to page p, and short[i]
+    flags lines that qualify as watermark candidates. Counting candidates
+    and dropping phrases work on the ids, so the text is split and
+    normalized a single time however many questions are asked of it.
+    Large tables are counted with NumPy when it is installed (or already
+    imported).
+    """
+
+    __slots__ = ("lines", "ids", "page_starts", "short", "phrases")
+
+    def __init__(self, pages: Iterable[str]) -> None:
+        from array import array
+        self.lines: list[str] = []
+        self.ids = array("I")
+        self.page_starts = array("I", [0])
+        self.phrases: list[str] = []
+        by_norm: dict[str, int] = {}
+        phrases = self.phrases
+        for page in pages:
+            raws = page.splitlines()
+            # _normalize_line() without a Python call per line
+            norms = list(map(" ".join, map(str.split, raws)))
+            new = set(norms).difference(by_norm)
+            by_norm.update(zip(new, range(len(phrases), len(phrases) + len(new))))
+            phrases.extend(new)
+            self.lines += raws
+            self.ids.extend(map(by_norm.__getitem__, norms))
+            self.page_starts.append(len(self.lines))
+        short_of = bytes(2 <= len(s) <= 60 and not s.isdigit() for s in phrases)
+        self.short = bytearray(map(short_of.__getitem__, self.ids))
+
+    @classmethod
+    def from_text(cls, text: str) -> "LineTable":
+        return cls(_split_pages(text))
+
+    @property
+    def n_pages(self) -> int:
+        return len(self.page_starts) - 1
+
+    def page_counts(self) -> list[int]:
+        """For each phrase id, the number of pages it appears on as a short line."""
+        n = len(self.phrases)
+        if len(self.ids) >= LINE_TABLE_NUMPY_MIN or "numpy" in sys.modules:
+            try:
+                import numpy as np
+            except ImportError:
+                pass
+            else:
+                ids = np.frombuffer(self.ids, dtype=np.uint32).astype(np.int64)
+                short = np.frombuffer(self.short, dtype=np.bool_)
+                page_of = np.repeat(np.arange(self.n_pages, dtype=np.int64),
+                                    np.diff(np.frombuffer(self.page_starts, dtype=np.uint32)))
+                # One key per (page, phrase) occurrence; after sorting, the
+                # first of each run counts that page once
+                keys = page_of[short] * n + ids[short]
+                keys.sort()
+                first = np.ones(len(keys), dtype=np.bool_)
+                first[1:] = keys[1:] != keys[:-1]
+                return np.bincount(keys[first] % n, minlength=n).tolist()
+        import itertools
+        counts = [0] * n
+        starts, ids, short = self.page_starts, self.ids, self.short
+        for p in range(self.n_pages):
+            a, b = starts[p], starts[p + 1]
+            for nid in set(itertools.compress(ids[a:b], short[a:b])):
+                counts[nid] += 1
+        return counts
+
+    def ranked(self, limit: int | None = None) -> list[tuple[str, int]]:
+        """(phrase, pages) for every short line, most frequent first; `limit` keeps the top ones."""
+        import heapq
+        items = [(self.phrases[nid], c) for nid, c in enumerate(self.page_counts()) if c]
+        key = lambda t: (-t[1], t[0])  # noqa: E731
+        if limit is not None:
+            return heapq.nsmallest(limit, items, key=key)
+        items.sort(key=key)
+        return items
+
+    def candidates(self) -> set[str]:
+        """Short lines on enough pages to be watermarks (see _watermark_threshold)."""
+        if self.n_pages <= 1:
+            return set()
+        thresh = _watermark_threshold(self.n_pages)
+        return {self.phrases[nid] for nid, c in enumerate(self.page_counts()) if c >= thresh}
+
+    def keep_mask(self, is_watermark) -> bytearray:
+        """Per line, 1 unless `is_watermark` (called once per phrase) matches it."""
+        keep_of = bytes(not is_watermark(s) for s in self.phrases)
+        return bytearray(map(keep_of.__getitem__, self.ids))
+
+    def pages(self, keep: bytearray | None = None) -> Iterator[str]:
+        """Yield each page's text, without the lines `keep` clears."""
+        import itertools
+        starts, lines = self.page_starts, self.lines
+        for p in range(self.n_pages):
+            a, b = starts[p], starts[p + 1]
+            yield "\n".join(lines[a:b] if keep is None else itertools.compress(lines[a:b], keep[a:b]))
+
+    def text(self, keep: bytearray | None = None) -> str:
+        return "\n".join(self.pages(keep))
+
+    def kept_lines(self, keep: bytearray | None = None) -> list[str]:
+        """Same as text(keep).splitlines(), without building the text."""
+        import itertools
+        out: list[str] = []
+        starts, lines = self.page_starts, self.lines
+        for p in range(self.n_pages):
+            a, b = starts[p], starts[p + 1]
+            before = len(out)
+            out.extend(lines[a:b] if keep is None else itertools.compress(lines[a:b], keep[a:b]))
+            if len(out) == before:
+                out.append("")
+        if out and out[-1] == "":
+            out.pop()
+        return out
+
+
+def detect_watermark_candidates(pages: Iterable[str] | LineTable) -> set[str]:
+    table = pages if isinstance(pages, LineTable) else LineTable(pages)
+    return table.candidates()
+
+
+def remove_watermarks_from_text(text: str) -> tuple[str, list[str]]:
+    table = LineTable.from_text(text)
+    cands = table.candidates()
+    if not cands:
+        return text, []
+    return table.text(table.keep_mask(cands.__contains__)), sorted(cands)
+
+
+# -------- Layout-aware watermark detection (pdfminer) --------
+
+# Position grid (fraction of the page) and angle step used to call two boxes "the same"
+LAYOUT_GRID = 50
+LAYOUT_ANGLE_STEP = 15
+LAYOUT_MAX_TEXT = 200
+
+
+def _box_signature(item, width: float, height: float) -> tuple | None:
+    """Where and how a text element is drawn, or None if it can't be a stamp."""
+    import math
+    from pdfminer.layout import LTChar  # type: ignore
+    text = _normalize_line(item.get_text()) if hasattr(item, "get_text") else _figure_text(item)
+    if not text or len(text) > LAYOUT_MAX_TEXT:
+        return None
+    size = angle = 0
+    for ch in _iter_chars(item):
+        if isinstance(ch, LTChar):
+            a, b = ch.matrix[0], ch.matrix[1]
+            angle = round(math.degrees(math.atan2(b, a)) / LAYOUT_ANGLE_STEP) * LAYOUT_ANGLE_STEP
+            size = round(ch.size)
+            break
+    gx = round(item.x0 / max(width, 1) * LAYOUT_GRID)
+    gy = round(item.y0 / max(height, 1) * LAYOUT_GRID)
+    return (text, gx, gy, size, angle)
+
+
+def _iter_chars(item):
+    from pdfminer.layout import LTContainer, LTChar  # type: ignore
+    if isinstance(item, LTChar):
+        yield item
+    elif isinstance(item, LTContainer):
+        for child in item:
+            yield from _iter_chars(child)
+
+
+def _figure_text(item) -> str:
+    from pdfminer.layout import LTText  # type: ignore
+    return _normalize_line("".join(ch.get_text() for ch in _iter_chars(item) if isinstance(ch, LTText)))
+
+
+def _layout_segments(ltpage) -> list[tuple[tuple | None, str]]:
+    """Flatten a page into (signature, text) runs in TextConverter order.
+
+    Text boxes and figures (where stamps drawn as forms end up) each become
+    one run; joining the texts of all runs gives exactly what pdfminer's
+    TextConverter writes for the page, minus the closing form feed.
+    """
+    from pdfminer.layout import LTContainer, LTFigure, LTText, LTTextBox  # type: ignore
+    width, height = ltpage.width, ltpage.height
+    segments: list[tuple[tuple | None, str]] = []
+
+    def text_of(item) -> str:
+        parts: list[str] = []
+
+        def render(it) -> None:
+            if isinstance(it, LTContainer):
+                for child in it:
+                    render(child)
+            elif isinstance(it, LTText):
+                parts.append(it.get_text())
+            if isinstance(it, LTTextBox):
+                parts.append("\n")
+
+        render(item)
+        return "".join(parts)
+
+    for item in ltpage:
+        if isinstance(item, (LTTextBox, LTFigure)):
+            segments.append((_box_signature(item, width, height), text_of(item)))
+        elif isinstance(item, (LTContainer, LTText)):
+            segments.append((None, text_of(item)))
+    return segments
+
+
+def strip_layout_watermarks(
+    path: Path | PdfBytes, progress: Queue | None = None, *, min_ratio: float = 0.6
+) -> tuple[list[str], Iterator[str]]:
+    """Drop text drawn at the same place, size and angle on most pages.
+
+    Unlike the text-line heuristics this sees rotated or diagonal stamps,
+    and it leaves alone repeated dialogue that sits at a different spot on
+    every page. Layout objects are reduced to (signature, text) runs as
+    each page is parsed and then released; runs are spooled to a temp file
+    for the second pass. Returns (removed texts, cleaned page iterator).
+    """
+    import collections
+    import json
+    from pdfminer.high_level import extract_pages  # type: ignore
+    if progress:
+        progress.put(("status", "detecting layout watermarks"))
+    sig_ids: dict[tuple, int] = {}
+    counts = collections.Counter()
+    spool = _PageSpool()
+    try:
+        for ltpage in extract_pages(path.open() if isinstance(path, PdfBytes) else str(path)):
+            runs = []
+            seen = set()
+            for sig, text in _layout_segments(ltpage):
+                sid = -1
+                if sig is not None:
+                    sid = sig_ids.setdefault(sig, len(sig_ids))
+                    seen.add(sid)
+                runs.append((sid, text))
+            del ltpage
+            counts.update(seen)
+            spool.append(json.dumps(runs))
+    except BaseException:
+        spool.close()
+        raise
+    n = len(spool)
+    thresh = max(2, int(min_ratio * n))
+    drop = {sid for sid, c in counts.items() if c >= thresh} if n > 1 else set()
+    removed = sorted({sig[0] for sig, sid in sig_ids.items() if sid in drop})
+    del sig_ids, counts
+
+    def pages() -> Iterator[str]:
+        try:
+            for raw in spool:
+                yield "".join(text for sid, text in json.loads(raw) if sid not in drop)
+        finally:
+            spool.close()
+
+    return removed, pages()
+
+
+# -------- Markdown output --------
+
+# fsync policies: "none" relies on the rename alone (safe against crashes of
+# this process), "file" also flushes the data to disk before the rename,
+# "dir" additionally persists the rename itself
+FSYNC_POLICIES = ("none", "file", "dir")
+# Encoded output is handed to the OS in chunks of this size
+WRITE_CHUNK_BYTES = 1 << 20
+PAGE_INDEX_SUFFIX = ".pages.json"
+
+
+class MarkdownWriter:
+    """Write a Markdown file in chunks to a temp file and rename it into place.
+
+    Nothing appears at `out_path` until commit(): a crash, a cancelled
+    conversion or an exception leaves any previous file untouched (and at
+    worst a hidden `.name.*.tmp` next to it). Used as a context manager it
+    commits on success and aborts on error.
+
+    With `page_index`, the byte offset where each page's text starts is
+    recorded and saved next to the output (see read_markdown_page()).
+    """
+
+    def __init__(self, out_path: Path, *, fsync: str = "none", page_index: bool = False) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {fsync!r}")
+        self.out_path = Path(out_path)
+        self.fsync = fsync
+        self.offsets: list[int] | None = [] if page_index else None
+        self.size = 0
+        self._text: list[str] = []
+        self._chunks: list[bytes] = []
+        self._pending = 0
+        self._started = False
+        self._last = None
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        # Not tempfile.mkstemp(): its 0600 mode would outlive the rename
+        self._tmp = self.out_path.with_name(f".{self.out_path.name}.{os.urandom(4).hex()}.tmp")
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        self._fd = os.open(self._tmp, flags, 0o666)
+
+    def __enter__(self) -> MarkdownWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def write_lines(self, lines: Iterable[str], page_of=None) -> None:
+        """Append lines, same layout as "\n".join() plus a final newline.
+
+        `page_of()` returns the 0-based page the line being written came
+        from; it is only consulted with page_index.
+        """
+        text = self._text
+        if page_of is None or self.offsets is None:
+            import itertools
+            lines = iter(lines)
+            while batch := list(itertools.islice(lines, 1024)):
+                text += batch
+                self._last = batch[-1]
+                self._pending += sum(map(len, batch))
+                if self._pending >= WRITE_CHUNK_BYTES:
+                    self._flush()
+            return
+        append = text.append
+        offsets = self.offsets
+        pending = self._pending
+        line = self._last
+        for line in lines:
+            if len(offsets) <= page_of():
+                self._encode()
+                start = self.size + (self._started or bool(text))
+                offsets.extend([start] * (page_of() + 1 - len(offsets)))
+            append(line)
+            pending += len(line)
+            if pending >= WRITE_CHUNK_BYTES:
+                self._flush()
+                pending = 0
+        self._pending = pending
+        self._last = line
+
+    def _encode(self) -> None:
+        # Lines stay str until a chunk is full or an exact offset is needed
+        if self._text:
+            data = "\n".join(self._text).encode("utf-8", errors="surrogatepass")
+            if self._started:
+                data = b"\n" + data
+            self._started = True
+            self._text.clear()
+            self._chunks.append(data)
+            self.size += len(data)
+
+    def _flush(self) -> None:
+        self._encode()
+        self._write(b"".join(self._chunks))
+        self._chunks.clear()
+        self._pending = 0
+
+    def _write(self, data: bytes) -> None:
+        data = memoryview(data)
+        while data:
+            data = data[os.write(self._fd, data):]
+
+    def commit(self, pages: int | None = None) -> None:
+        """Finish the file and move it to out_path; `pages` pads the page index."""
+        try:
+            self._flush()
+            if self._last:
+                self._write(b"\n")
+                self.size += 1
+            self._last = None
+            if self.fsync != "none":
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+            try:
+                os.chmod(self._tmp, self.out_path.stat().st_mode & 0o7777)
+            except OSError:
+                pass
+            os.replace(self._tmp, self.out_path)
+        except BaseException:
+            self.abort()
+            raise
+        index = self.out_path.with_name(self.out_path.name + PAGE_INDEX_SUFFIX)
+        if self.offsets is None:
+            # An index left over from an earlier run would point into the wrong text
+            try:
+                index.unlink()
+            except OSError:
+                pass
+        else:
+            if pages is not None and len(self.offsets) < pages:
+                self.offsets.extend([self.size] * (pages - len(self.offsets)))
+            _write_page_index(index, self.offsets, self.size, self.fsync)
+        if self.fsync == "dir":
+            _fsync_dir(self.out_path.parent)
+
+    def abort(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        try:
+            os.unlink(self._tmp)
+        except OSError:
+            pass
+
+
+def _write_page_index(path: Path, offsets: list[int], size: int, fsync: str) -> None:
+    import json
+    tmp = path.with_name(f".{path.name}.{os.urandom(4).hex()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "bytes": size, "offsets": offsets}, f)
+            if fsync != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows, where directories cannot be opened
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_markdown_page(md_path: Path, page: int) -> str:
+    """Text of page `page` (1-based) of a Markdown file written with a page index.
+
+    Offsets are at line granularity: a paragraph reflowed across a page
+    break belongs to the page where it ends.
+    """
+    import json
+    md_path = Path(md_path)
+    index = json.loads(md_path.with_name(md_path.name + PAGE_INDEX_SUFFIX).read_text(encoding="utf-8"))
+    offsets = index["offsets"]
+    if not 1 <= page <= len(offsets):
+        raise IndexError(f"page {page} out of range 1-{len(offsets)}")
+    end = offsets[page] if page < len(offsets) else index["bytes"]
+    with open(md_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size != index["bytes"]:
+            raise ValueError(f"page index of {md_path} is out of date")
+        f.seek(offsets[page - 1])
+        return f.read(end - offsets[page - 1]).decode("utf-8", errors="surrogatepass")
+
+
+class _PageTracker:
+    """Maps the formatter's position in the line stream back to a page.
+
+    With `keep_text`, page texts wait in `texts` (by 0-based page) until
+    their consumer pops them.
+    """
+
+    def __init__(self, keep_text: bool = False) -> None:
+        self.starts: list[int] = []
+        self.consumed = 0
+        self.texts: dict[int, str] | None = {} if keep_text else None
+
+    def lines(self, pages: Iterable[str]) -> Iterator[str]:
+        """_iter_doc_lines() that remembers where each page starts."""
+        n = 0
+        for p in pages:
+            if self.texts is not None:
+                self.texts[len(self.starts)] = p
+            self.starts.append(n)
+            lines = p.splitlines()
+            n += len(lines)
+            yield from lines
+
+    def tally(self, items: Iterable) -> Iterator:
+        for item in items:
+            self.consumed += 1
+            yield item
+
+    def page(self) -> int:
+        """0-based page of the last line the formatter took."""
+        import bisect
+        return max(0, bisect.bisect_right(self.starts, self.consumed - 1) - 1)
+
+
+# -------- Worker Thread + Spinner --------
+
+def detect_watermark_candidates_with_counts(pages: Iterable[str] | LineTable) -> list[tuple[str, int]]:
+    table = pages if isinstance(pages, LineTable) else LineTable(pages)
+    return table.ranked()
+
+
+def remove_watermarks_by_selection(text: str | LineTable, phrases: list[str] | WatermarkMatcher) -> str:
+    if not phrases:
+        return text if isinstance(text, str) else text.text()
+    table = text if isinstance(text, LineTable) else LineTable.from_text(text)
+    matcher = phrases if isinstance(phrases, WatermarkMatcher) else compile_watermark_matcher(phrases)
+    return table.text(table.keep_mask(matcher))
+
+
+# Pages read for a watermark preview, and the shortest document worth previewing
+WM_PREVIEW_PAGES = 12
+WM_PREVIEW_MIN_PAGES = 40
+
+
+def _stratified_indices(n: int, k: int) -> list[int]:
+    """The middle page of each of `k` equal slices of `n` pages."""
+    if n <= k:
+        return list(range(n))
+    return [(2 * i + 1) * n // (2 * k) for i in range(k)]
+
+
+def preview_watermark_candidates(
+    path: Path, *, sample_pages: int = WM_PREVIEW_PAGES, backend: str = "auto"
+) -> tuple[list[tuple[str, int]], int, int] | None:
+    """Rank watermark candidates from a few pages spread through `path`.
+
+    Returns (top 20 as (phrase, estimated pages), document pages, pages
+    sampled), or None when the page count is unknown or the document is
+    short enough that reading it all is as quick.
+    """
+    n = _probe_page_count(path)
+    if not n or n < WM_PREVIEW_MIN_PAGES:
+        return None
+    _, pages = extract_page_sample(path, _stratified_indices(n, sample_pages), backend)
+    if not pages:
+        return None
+    k = len(pages)
+    ranked = LineTable(pages).ranked(limit=20)
+    return [(phrase, round(c * n / k)) for phrase, c in ranked], n, k
+
+
+class WatermarkMatcher:
+    """Selected watermark phrases compiled for single-pass line matching.
+
+    A normalized line is a watermark if it equals a phrase, or if it is at
+    most 120 characters and contains a phrase of 3-120 characters (longer
+    ones could never fit in such a line, so they only match exactly). Equality is
+    a set lookup; the substring rule is one regex built from a trie of all
+    phrases, so each line is scanned once however many phrases are chosen.
+    Instances are immutable and can be shared across a whole batch.
+    """
+
+    def __init__(self, phrases: Iterable[str]) -> None:
+        norms = (_normalize_line(p) for p in phrases if p.strip())
+        self.phrases = tuple(sorted({n for n in norms if n}))
+        self._exact = frozenset(self.phrases)
+        subs = [n for n in self.phrases if 3 <= len(n) <= 120]
+        self._search = re.compile(_trie_pattern(subs)).search if subs else None
+
+    def __call__(self, s: str) -> bool:
+        """Match an already normalized line."""
+        if s in self._exact:
+            return True
+        return self._search is not None and len(s) <= 120 and self._search(s) is not None
+
+
+def _trie_pattern(words: list[str]) -> str:
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = None
+
+    # Built bottom-up with an explicit stack: one level per character would
+    # otherwise recurse as deep as the longest phrase
+    built: dict[int, str] = {}
+    stack = [(trie, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if "" in node:
+            # Any match will do, so a phrase that ends here makes its longer
+            # extensions irrelevant
+            built[id(node)] = ""
+        elif not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.values())
+        else:
+            alts = [re.escape(ch) + built[id(child)] for ch, child in sorted(node.items())]
+            built[id(node)] = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    return built[id(trie)]
+
+
+def compile_watermark_matcher(phrases: Iterable[str]) -> WatermarkMatcher:
+    """Return a (cached) matcher for `phrases`; order and duplicates don't matter."""
+    return _compile_watermark_matcher(frozenset(phrases))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_watermark_matcher(phrases: frozenset) -> WatermarkMatcher:
+    return WatermarkMatcher(phrases)
+
+
+def iter_remove_watermarks(pages: Iterable[str], phrases: Iterable[str] | WatermarkMatcher) -> Iterator[str]:
+    """Page-at-a-time form of remove_watermarks_by_selection()."""
+    matcher = phrases if isinstance(phrases, WatermarkMatcher) else compile_watermark_matcher(phrases)
+    return _drop_lines(pages, matcher)
+
+
+def _drop_lines(pages: Iterable[str], is_watermark) -> Iterator[str]:
+    for p in pages:
+        out_lines = []
+        for raw in p.splitlines():
+            if not is_watermark(_normalize_line(raw)):
+                out_lines.append(raw)
+        # One newline per kept line: the blank line that ended the page stays
+        yield "".join(line + "\n" for line in out_lines)
+
+
+class _PageSpool:
+    """Pages parked in an anonymous temp file so they can be read twice.
+
+    Automatic watermark detection needs to see every page before the first
+    one can be cleaned; spooling keeps that second pass off the heap.
+    """
+
+    def __init__(self) -> None:
+        import tempfile
+        from array import array
+        self._fp = tempfile.TemporaryFile()
+        self._sizes = array("Q")
+
+    def append(self, page: str) -> None:
+        data = page.encode("utf-8", errors="surrogatepass")
+        self._fp.write(data)
+        self._sizes.append(len(data))
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __iter__(self) -> Iterator[str]:
+        self._fp.flush()
+        self._fp.seek(0)
+        for size in self._sizes:
+            yield self._fp.read(size).decode("utf-8", errors="surrogatepass")
+
+    def close(self) -> None:
+        self._fp.close()
+
+
+def extract_only_worker(
+    pdf_path: Path, q: Queue, page_jobs: int = 1, cache: ExtractionCache | None = None
+) -> None:
+    try:
+        q.put(("status", "Reading PDF"))
+        txt = extract_pdf_text(pdf_path, progress=q, jobs=page_jobs, cache=cache)
+        q.put(("text", txt))
+    except Exception as e:
+        q.put(("error", str(e)))
+
+
+def _iter_doc_lines(pages: Iterable[str]) -> Iterator[str]:
+    for p in pages:
+        yield from p.splitlines()
+
+
+def write_markdown(out_path: Path, lines: Iterable[str], *, fsync: str = "none") -> None:
+    """Write lines to `out_path` as they arrive, same layout as "\n".join().
+
+    The file only appears, complete, once every line is written.
+    """
+    with MarkdownWriter(out_path, fsync=fsync) as w:
+        w.write_lines(lines)
+
+
+class ConversionCancelled(Exception):
+    """Raised inside convert_file() when its `cancel` flag is set."""
+
+
+def convert_file(
+    pdf_path: Path | PdfBytes,
+    out_path: Path,
+    *,
+    remove_wm: bool,
+    progress: Queue | None = None,
+    page_jobs: int = 1,
+    cache: ExtractionCache | None = None,
+    backend: str = "auto",
+    pdftotext: PdftotextEngine | None = None,
+    watermarks: Iterable[str] | WatermarkMatcher | None = None,
+    wm_mode: str = "text",
+    doc_format: str = "auto",
+    fsync: str = "none",
+    page_index: bool = False,
+    sink=None,
+    metrics: PipelineMetrics | None = None,
+    cancel=None,
+    preflight: bool | dict = True,
+) -> dict:
+    """Convert one PDF to Markdown at `out_path` and return simple stats.
+
+    `pdf_path` may also be PDF data in memory or a file object (see
+    pdf_source()). Pages stream from the backend through watermark removal and formatting
+    straight into the output file, so memory use does not depend on the
+    size of the document. A known `watermarks` set (e.g. a profile's
+    phrases) replaces per-document detection and keeps it single-pass.
+    `wm_mode="layout"` detects watermarks from pdfminer's layout boxes
+    instead of text lines (falls back to "text" without pdfminer).
+    `doc_format` names a formatter in FORMATTERS, or "auto" to detect one.
+    The output is written through a MarkdownWriter (`fsync` policy,
+    optional `page_index` sidecar), so it only appears once complete.
+    `sink(stats, tracker)` may return another writer with the same
+    write_lines/commit/abort methods to use instead (see export_job()).
+    With `metrics`, per-stage timings end up in `metrics.record`.
+    `cancel` is anything with is_set() (e.g. a threading.Event); it is
+    checked between pages and raises ConversionCancelled, leaving
+    `out_path` as it was. `preflight` is passed on to open_page_stream().
+    """
+    import contextlib
+    import collections
+    pdf_path = pdf_source(pdf_path)
+    if progress:
+        progress.put(("status", "Reading PDF"))
+    stats = {"out": str(out_path), "pages": 0, "removed": [], "backend": None, "screenplay": False,
+             "format": None}
+    m = metrics
+    stage = m.stage if m is not None else (lambda name: contextlib.nullcontext())
+
+    def tally(pages: Iterable[str]) -> Iterator[str]:
+        for p in pages:
+            if cancel is not None and cancel.is_set():
+                raise ConversionCancelled(str(pdf_path))
+            stats["pages"] += 1
+            yield p
+
+    layout = (
+        remove_wm and watermarks is None and wm_mode == "layout"
+        and backend in ("auto", "fastest", "pdfminer") and backend_available("pdfminer")
+    )
+    with m.document(pdf_path) if m is not None else contextlib.nullcontext():
+        if layout:
+            stats["backend"] = "pdfminer"
+            if m is not None:
+                m.backend = "pdfminer"
+            # Layout analysis parses every page up front, so extraction is counted here
+            with stage("watermark_detect"):
+                stats["removed"], pages = strip_layout_watermarks(pdf_path, progress)
+            if m is not None:
+                pages = m.wrap("watermark_remove", pages)
+        else:
+            with stage("extract"):
+                stats["backend"], pages = open_page_stream(
+                    pdf_path, progress, jobs=page_jobs, cache=cache, backend=backend, pdftotext=pdftotext,
+                    metrics=m, preflight=preflight,
+                )
+            if m is not None:
+                pages = m.wrap("extract", pages)
+        pages = tally(pages)
+        spool = None
+        try:
+            if watermarks is not None:
+                pages = iter_remove_watermarks(pages, watermarks)
+                if m is not None:
+                    pages = m.wrap("watermark_remove", pages)
+            elif remove_wm and not layout:
+                spool = _PageSpool()
+                counts = collections.Counter()
+                with stage("watermark_detect"):
+                    for p in pages:
+                        spool.append(p)
+                        counts.update(_page_short_lines(p))
+                    cands: set[str] = set()
+                    if len(spool) > 1:
+                        thresh = _watermark_threshold(len(spool))
+                        cands = {s for s, c in counts.items() if c >= thresh}
+                del counts
+                pages = spool
+                if cands:
+                    if progress:
+                        progress.put(("status", "Removing watermark"))
+                    stats["removed"] = sorted(cands)
+                    pages = _drop_lines(spool, cands.__contains__)
+                if m is not None:
+                    pages = m.wrap("watermark_remove", pages)
+            if progress:
+                progress.put(("status", "Formatting"))
+            tracker = _PageTracker(keep_text=sink is not None) if page_index or sink is not None else None
+            with stage("format_detect"):
+                stats["format"], lines = format_lines(
+                    tracker.lines(pages) if tracker else _iter_doc_lines(pages), doc_format, tracker=tracker
+                )
+            stats["screenplay"] = stats["format"] == "screenplay"
+            if m is not None:
+                lines = m.wrap("format", lines, unit="lines")
+            if sink is not None:
+                writer = sink(stats, tracker)
+            else:
+                writer = MarkdownWriter(out_path, fsync=fsync, page_index=page_index)
+            try:
+                with stage("write"):
+                    writer.write_lines(lines, tracker.page if tracker else None)
+                    writer.commit(stats["pages"])
+            except BaseException:
+                writer.abort()
+                raise
+        finally:
+            if spool is not None:
+                spool.close()
+    return stats
+
+
+def convert_worker(pdf_path: Path, out_dir: Path, q: Queue, *, remove_wm: bool) -> None:
+    try:
+        out_path = out_dir / (pdf_path.stem + ".md")
+        convert_file(pdf_path, out_path, remove_wm=remove_wm, progress=q)
+        q.put(("done", str(out_path)))
+    except Exception as e:
+        q.put(("error", str(e)))
+
+
+SPINNER_FRAMES = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+
+
+def run_with_spinner(thread: threading.Thread, q: Queue) -> tuple[bool, str | None]:
+    idx = 0
+    percent = None
+    status = "Idle"
+    while thread.is_alive():
+        # Drain messages
+        try:
+            while True:
+                kind, payload = q.get_nowait()
+                if kind == "progress":
+                    percent = int(payload)
+                elif kind == "status":
+                    status = str(payload)
+                elif kind == "error":
+                    print()
+                    return False, str(payload)
+                elif kind == "done":
+                    print()
+                    return True, str(payload)
+                elif kind == "text":
+                    print()
+                    return True, str(payload)
+        except Empty:
+            pass
+        spin = SPINNER_FRAMES[idx % len(SPINNER_FRAMES)]
+        idx += 1
+        if percent is not None:
+            line = f" {Fore.MAGENTA}{spin}{Style.RESET_ALL} {status} — %{percent:3d}"
+        else:
+            line = f" {Fore.MAGENTA}{spin}{Style.RESET_ALL} {status}"
+        print("\r" + line + " " * 20, end="", flush=True)
+        time.sleep(0.08)
+
+    # Final drain
+    try:
+        while True:
+            kind, payload = q.get_nowait()
+            if kind == "error":
+                print()
+                return False, str(payload)
+            elif kind == "done":
+                print()
+                return True, str(payload)
+            elif kind == "text":
+                print()
+                return True, str(payload)
+            elif kind == "progress":
+                pass
+            elif kind == "status":
+                status = str(payload)
+    except Empty:
+        pass
+    print()
+    return False, "Bilinmeyen durum"
+
+
+# -------- Batch conversion (headless) --------
+
+class _JobTimeout(BaseException):
+    # BaseException so the backend fallback chain cannot swallow it
+    pass
+
+
+def _on_job_alarm(signum, frame):  # pragma: no cover - signal handler
+    raise _JobTimeout()
+
+
+class _job_deadline:
+    """Raise _JobTimeout in the current (main) thread after `timeout` seconds.
+
+    Uses SIGALRM, so it is a no-op where setitimer() is unavailable.
+    """
+
+    def __init__(self, timeout: float | None) -> None:
+        import signal
+        self.timeout = timeout
+        self.active = bool(timeout) and hasattr(signal, "setitimer")
+
+    def __enter__(self) -> None:
+        import signal
+        if self.active:
+            signal.signal(signal.SIGALRM, _on_job_alarm)
+            signal.setitimer(signal.ITIMER_REAL, float(self.timeout))
+
+    def __exit__(self, *exc) -> None:
+        import signal
+        if self.active:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def batch_job(pdf_path: Path | PdfBytes, out_path: Path, opts: dict, expect_sha: str | None,
+              timeout: float | None) -> dict:
+    """Process-pool entry point: never raises, always returns a result dict.
+
+    `expect_sha` is the digest a manifest recorded for this file; when the
+    content still matches, the existing output is kept and the result is
+    flagged as unchanged. `opts["metrics"]`, when present, holds
+    PipelineMetrics settings; the document's record is returned under
+    "metrics", also for failed jobs.
+    """
+    result = {"src": str(pdf_path), "out": str(out_path), "ok": False, "pages": 0, "bytes": 0, "error": None}
+    start = time.perf_counter()
+    metrics = None
+    if opts.get("metrics") is not None:
+        metrics = PipelineMetrics(**opts["metrics"])
+        opts = {**opts, "metrics": metrics}
+    try:
+        with _job_deadline(timeout):
+            if isinstance(pdf_path, PdfBytes):
+                result.update(bytes=len(pdf_path), sha256=file_digest(pdf_path))
+            else:
+                st = pdf_path.stat()
+                result.update(bytes=st.st_size, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                              sha256=file_digest(pdf_path))
+            if expect_sha is not None and result["sha256"] == expect_sha and out_path.exists():
+                result.update(ok=True, unchanged=True)
+            else:
+                result.update(convert_file(pdf_path, out_path, **opts))
+                result["ok"] = True
+    except _JobTimeout:
+        result["error"] = f"timed out after {timeout:g}s"
+    except Exception as e:
+        result["error"] = str(e) or e.__class__.__name__
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        if metrics is not None and metrics.record:
+            result["metrics"] = metrics.record
+    return result
+
+
+def collect_pdfs(inputs: list[str], out_dir: Path | None) -> list[tuple[Path, Path]]:
+    """Expand files, directories (recursive) and globs into (pdf, md) pairs.
+
+    Archives named directly or by a glob are left to collect_archives().
+    """
+    import glob
+    pairs: list[tuple[Path, Path]] = []
+    seen: set[Path] = set()
+
+    def add(pdf: Path, root: Path) -> None:
+        key = pdf.resolve()
+        if key in seen:
+            return
+        seen.add(key)
+        if out_dir is None:
+            out = pdf.with_suffix(".md")
+        else:
+            # Mirror the tree below the given root so same-named files don't collide
+            out = out_dir / pdf.relative_to(root).with_suffix(".md")
+        pairs.append((pdf, out))
+
+    for raw in inputs:
+        p = Path(raw).expanduser()
+        if p.is_dir():
+            for f in sorted(p.rglob("*")):
+                if f.is_file() and f.suffix.lower() == ".pdf":
+                    add(f, p)
+        elif p.is_file():
+            if not is_archive(p):
+                add(p, p.parent)
+        else:
+            for m in sorted(glob.glob(str(p), recursive=True)):
+                f = Path(m)
+                if f.is_file() and f.suffix.lower() == ".pdf":
+                    add(f, f.parent)
+    return pairs
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_archive(path: Path) -> bool:
+    return path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def collect_archives(inputs: list[str]) -> list[Path]:
+    """The zip/tar archives among `inputs` (files or glob matches, not directory contents)."""
+    import glob
+    found: list[Path] = []
+    for raw in inputs:
+        p = Path(raw).expanduser()
+        matches = [p] if p.is_file() else [] if p.is_dir() else map(Path, sorted(glob.glob(str(p), recursive=True)))
+        for f in matches:
+            if f.is_file() and is_archive(f) and f not in found:
+                found.append(f)
+    return found
+
+
+def _archive_stem(path: Path) -> str:
+    name = path.name
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return path.stem
+
+
+def iter_archive_pdfs(archive: Path) -> Iterator[tuple[str, PdfBytes]]:
+    """Yield (member path, PdfBytes) for each PDF inside a zip or tar archive.
+
+    Members are read straight from the archive; nothing is unpacked to
+    disk. Tars (also compressed ones) are read as a stream in a single
+    pass. Each PdfBytes is named ``ARCHIVE!MEMBER``. Member paths are
+    returned relative and without ".." parts, safe to join to a folder.
+    """
+    import tarfile
+    import zipfile
+
+    def clean(name: str) -> str:
+        parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+        if parts and parts[0].endswith(":"):  # drive letter
+            parts = parts[1:]
+        return "/".join(parts)
+
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                member = clean(info.filename)
+                if not info.is_dir() and member.lower().endswith(".pdf"):
+                    yield member, PdfBytes(zf.read(info), f"{archive}!{info.filename}")
+        return
+    with tarfile.open(archive, mode="r|*") as tf:
+        for info in tf:
+            member = clean(info.name)
+            if info.isfile() and member.lower().endswith(".pdf"):
+                fp = tf.extractfile(info)
+                yield member, PdfBytes(fp.read(), f"{archive}!{info.name}")
+
+
+def archive_jobs(archives: list[Path], out_dir: Path | None, *args) -> Iterator[tuple]:
+    """Lazily yield (PdfBytes, out path, *args) jobs for every PDF in `archives`.
+
+    Outputs go to OUT/ARCHIVE_NAME/MEMBER.md (next to the archive without
+    an output folder). A broken archive ends its own jobs with a warning.
+    """
+    for archive in archives:
+        root = (out_dir if out_dir is not None else archive.parent) / _archive_stem(archive)
+        try:
+            for member, data in iter_archive_pdfs(archive):
+                yield (data, (root / member).with_suffix(".md"), *args)
+        except Exception as e:  # zipfile/tarfile errors don't share a base class
+            print(f"{Fore.RED}Cannot read archive {archive}:{Style.RESET_ALL} {e}", file=sys.stderr)
+
+
+def _run_pool(jobs: Iterable[tuple], workers: int, timeout: float | None, fn=batch_job):
+    """Yield `fn(*job, timeout=timeout)` results, surviving worker crashes.
+
+    `jobs` may be a lazy iterator (e.g. members read from an archive); it
+    is only advanced as the pool has room. A crashed worker breaks the whole ProcessPoolExecutor and fails every
+    in-flight future, so affected jobs are retried in a fresh pool.  A job
+    caught in two crashes is re-run alone; if it still kills its worker it is
+    reported as crashed instead of taking the rest of the batch down.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    fresh = iter(jobs)
+    pending: deque = deque()
+    suspects: deque = deque()
+    crashes: dict[Path, int] = {}
+
+    def refill() -> bool:
+        for job in fresh:
+            pending.append(job)
+            return True
+        return False
+
+    def crashed(job: tuple) -> dict:
+        return {"src": str(job[0]), "out": None, "ok": False, "pages": 0,
+                "bytes": 0, "seconds": 0.0, "error": "worker process crashed"}
+
+    while pending or refill() or suspects:
+        if pending:
+            queue, size = pending, workers
+        else:
+            queue, size = suspects, 1
+        window = size * 2 if size > 1 else 1
+        broken: list[tuple] = []
+        with ProcessPoolExecutor(max_workers=size) as ex:
+            inflight = {}
+            while queue or inflight:
+                # Bounded window: a crash only takes down a few jobs with it
+                while (queue or (queue is pending and refill())) and len(inflight) < window and not broken:
+                    job = queue.popleft()
+                    inflight[ex.submit(fn, *job, timeout=timeout)] = job
+                if not inflight:
+                    break
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    job = inflight.pop(fut)
+                    try:
+                        yield fut.result()
+                    except BrokenProcessPool:
+                        broken.append(job)
+                if broken:
+                    for fut, job in inflight.items():
+                        try:
+                            yield fut.result()
+                        except BrokenProcessPool:
+                            broken.append(job)
+                    inflight.clear()
+                    break
+        for job in broken:
+            crashes[job[0]] = crashes.get(job[0], 0) + 1
+            if size == 1:
+                yield crashed(job)
+            elif crashes[job[0]] >= 2:
+                suspects.append(job)
+            else:
+                pending.appendleft(job)
+
+
+def _fmt_rate(n: float, secs: float) -> str:
+    return f"{n / secs:.2f}" if secs > 0 else "-"
+
+
+MANIFEST_NAME = ".pdf_minner_manifest.json"
+
+
+def pipeline_settings(opts: dict) -> dict:
+    """The conversion inputs besides the PDF itself that shape an output."""
+    import hashlib
+    wm = opts.get("watermarks")
+    if wm is not None:
+        phrases = wm.phrases if isinstance(wm, WatermarkMatcher) else sorted(set(wm))
+        wm = hashlib.sha1("\n".join(phrases).encode("utf-8")).hexdigest()
+    return {
+        "remove_wm": bool(opts.get("remove_wm")),
+        "wm_mode": opts.get("wm_mode", "text"),
+        "watermarks": wm,
+        "backend": opts.get("backend", "auto"),
+        "format": opts.get("doc_format", "auto"),
+        "page_index": bool(opts.get("page_index")),
+        "formatter": FORMATTER_VERSION,
+    }
+
+
+class ConversionManifest:
+    """Record of what was converted into an output folder, and how.
+
+    One entry per source PDF: its mtime/size/sha256, the settings used, what
+    the pipeline decided (backend, document format, removed watermarks) and the
+    Markdown written. A re-run consults it to skip unchanged inputs; when
+    only settings changed, the file is re-converted and extraction is
+    served by the ExtractionCache.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: Path) -> ConversionManifest:
+        import json
+        m = cls(path)
+        try:
+            data = json.loads(m.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return m
+        if data.get("version") == cls.VERSION:
+            m.entries = data.get("entries", {})
+        return m
+
+    @staticmethod
+    def _key(pdf: Path) -> str:
+        return str(pdf.resolve())
+
+    def check(self, pdf: Path, out: Path, settings: dict) -> tuple[str, str | None]:
+        """Return ("current"|"verify"|"stale", recorded sha256).
+
+        "verify" means the stat changed but settings did not: the content
+        hash decides whether the file really needs converting.
+        """
+        e = self.entries.get(self._key(pdf))
+        if not e or e.get("settings") != settings or e.get("out") != str(out.resolve()) or not out.exists():
+            return "stale", None
+        try:
+            st = pdf.stat()
+        except OSError:
+            return "stale", None
+        if st.st_mtime_ns == e.get("mtime_ns") and st.st_size == e.get("size"):
+            return "current", e.get("sha256")
+        return "verify", e.get("sha256")
+
+    def update(self, pdf: Path, result: dict, settings: dict) -> None:
+        key = self._key(pdf)
+        e = dict(self.entries.get(key, {})) if result.get("unchanged") else {}
+        e.update(
+            mtime_ns=result["mtime_ns"],
+            size=result["size"],
+            sha256=result["sha256"],
+            settings=settings,
+            out=str(Path(result["out"]).resolve()),
+        )
+        if not result.get("unchanged"):
+            e.update(
+                backend=result.get("backend"),
+                pages=result.get("pages", 0),
+                screenplay=result.get("screenplay", False),
+                format=result.get("format"),
+                watermarks=result.get("removed", []),
+                converted_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            )
+        self.entries[key] = e
+        self._dirty = True
+
+    def save(self) -> None:
+        import json
+        import tempfile
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".manifest-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "entries": self.entries}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self._dirty = False
+
+
+def convert_arg_parser(prog: str = "pdf_minner convert", description: str = "Convert PDFs to Markdown without the menu."):
+    import argparse
+    ap = argparse.ArgumentParser(prog=prog, description=description)
+    ap.add_argument("inputs", nargs="+",
+                    help="PDF files, directories (searched recursively), glob patterns or zip/tar archives")
+    ap.add_argument("-o", "--output", type=Path, default=None, help="output folder (default: next to each PDF)")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    ap.add_argument("--timeout", type=float, default=None, help="per-file time limit in seconds (POSIX only)")
+    ap.add_argument("--page-jobs", type=int, default=1,
+                    help="extract large PDFs with this many processes each (default: 1)")
+    ap.add_argument("--backend", choices=("auto", "fastest") + BACKENDS, default="auto",
+                    help="auto: fixed fallback order; fastest: probe a few pages per file; or pin one backend")
+    ap.add_argument("--pdftotext-timeout", type=float, default=None, help="kill a pdftotext run after N seconds")
+    ap.add_argument("--pdftotext-mem", type=int, default=None, help="address-space cap per pdftotext run, in MB")
+    ap.add_argument("--keep-watermarks", action="store_true", help="skip automatic watermark removal")
+    ap.add_argument("--wm-mode", choices=("text", "layout"), default="text",
+                    help="detect watermarks from text lines, or from repeated layout boxes (needs pdfminer)")
+    ap.add_argument("--format", dest="doc_format", choices=("auto",) + tuple(FORMATTERS), default="auto",
+                    help="document type to format as (default: detect from the first lines)")
+    ap.add_argument("--wm-profile", default=None,
+                    help="remove the watermarks of a learned profile instead of detecting them per file")
+    ap.add_argument("--fsync", choices=FSYNC_POLICIES, default="none",
+                    help="none: atomic rename only; file: flush each .md to disk first; dir: also persist the rename")
+    ap.add_argument("--page-index", action="store_true",
+                    help=f"write NAME.md{PAGE_INDEX_SUFFIX} with the byte offset of each page")
+    ap.add_argument("--cache-dir", type=Path, default=None, help="extraction cache folder (default: ~/.cache/pdf_minner)")
+    ap.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_BYTES >> 20, help="cache budget in MB (default: 1024)")
+    ap.add_argument("--no-cache", action="store_true", help="always extract from scratch")
+    ap.add_argument("--manifest", type=Path, default=None,
+                    help=f"incremental manifest (default: OUT/{MANIFEST_NAME} when -o is given)")
+    ap.add_argument("--force", action="store_true", help="convert everything, ignoring the manifest")
+    ap.add_argument("--image-only", choices=("skip", "convert"), default="skip",
+                    help="what to do with scans that have no text layer (default: skip)")
+    ap.add_argument("--no-preflight", action="store_true",
+                    help="don't check files before extraction or schedule the largest first")
+    ap.add_argument("--metrics", type=Path, default=None,
+                    help="append per-file stage timings, fallbacks and memory to this JSON-lines file")
+    ap.add_argument("--profile-dir", type=Path, default=None, help="save a cProfile dump per file in this folder")
+    ap.add_argument("--trace-memory", action="store_true",
+                    help="record peak Python allocations and top allocation sites per file (slower)")
+    ap.add_argument("-q", "--quiet", action="store_true", help="only print failures and the summary")
+    return ap
+
+
+def batch_main(argv: list[str]) -> int:
+    args = convert_arg_parser().parse_args(argv)
+    pairs = collect_pdfs(args.inputs, args.output)
+    archives = collect_archives(args.inputs)
+    if not pairs and not archives:
+        print(f"{Fore.RED}No PDF files found.{Style.RESET_ALL}", file=sys.stderr)
+        return 2
+    report = run_batch(args, pairs, archives)
+    if report is None:
+        return 2
+    return 0 if report["failed"] == 0 else 1
+
+
+def run_batch(args, pairs: list[tuple[Path, Path]], archives: list[Path] = (), *,
+              manifest_path: Path | None = None, stop=None) -> dict | None:
+    """Convert `pairs` (and archive members) with the options in `args`, printing progress.
+
+    `args` comes from convert_arg_parser(). Returns the run's totals and
+    failures, or None when the options can't be used (the reason is
+    printed). `manifest_path` overrides the one `args` implies; `stop`
+    (anything with is_set()) ends the run early, after the files in
+    flight.
+    """
+    import itertools
+    cache = None
+    if not args.no_cache:
+        cache = ExtractionCache(args.cache_dir) if args.cache_dir else default_cache()
+        if cache is not None:
+            cache.max_bytes = args.cache_size << 20
+    opts = {
+        "remove_wm": not args.keep_watermarks,
+        "page_jobs": max(1, args.page_jobs),
+        "cache": cache,
+        "backend": args.backend,
+        "wm_mode": args.wm_mode,
+        "doc_format": args.doc_format,
+        "fsync": args.fsync,
+        "page_index": args.page_index,
+        "pdftotext": PdftotextEngine(timeout=args.pdftotext_timeout, mem_limit_mb=args.pdftotext_mem),
+        "preflight": not args.no_preflight,
+    }
+    if args.wm_profile:
+        try:
+            opts["watermarks"] = WatermarkProfile.load(args.wm_profile).matcher()
+        except (OSError, ValueError) as e:
+            print(f"{Fore.RED}Cannot load watermark profile:{Style.RESET_ALL} {e}", file=sys.stderr)
+            return None
+    settings = pipeline_settings(opts)
+    if args.metrics or args.profile_dir or args.trace_memory:
+        opts["metrics"] = {"profile_dir": args.profile_dir, "trace_memory": args.trace_memory}
+    write_metrics = metrics_jsonl_writer(args.metrics) if args.metrics else None
+    stage_totals: dict[str, float] = {}
+
+    manifest_path = manifest_path or args.manifest or (args.output / MANIFEST_NAME if args.output else None)
+    manifest = ConversionManifest.load(manifest_path) if manifest_path else None
+    start = time.perf_counter()
+    jobs = []
+    unchanged = 0
+    for pdf, out in pairs:
+        expect_sha = None
+        if manifest is not None and not args.force:
+            state, expect_sha = manifest.check(pdf, out, settings)
+            if state == "current":
+                unchanged += 1
+                continue
+        jobs.append((pdf, out, opts, expect_sha))
+    rejected = []
+    if jobs and not args.no_preflight:
+        jobs, rejected = schedule_jobs(jobs, image_only=args.image_only)
+
+    workers = max(1, min(args.jobs, len(jobs))) if not archives else max(1, args.jobs)
+    # Archive members are read as the pool asks for them, so their number isn't known up front
+    total = f"/{len(jobs) + len(rejected)}" if not archives else ""
+    if archives:
+        jobs = itertools.chain(jobs, archive_jobs(archives, args.output, opts, None))
+    ok = failed = skipped = pages = nbytes = 0
+    failures: list[dict] = []
+    last_save = time.monotonic()
+    results = itertools.chain(rejected, _run_pool(jobs, workers, args.timeout) if jobs else ())
+    for i, res in enumerate(results, start=1):
+        if not res["ok"]:
+            failures.append({"src": res["src"], "error": res["error"], "skipped": bool(res.get("skipped"))})
+        if res.get("skipped"):
+            skipped += 1
+            if not args.quiet:
+                print(f"[{i}{total}] {Fore.YELLOW}SKIP{Style.RESET_ALL} {res['src']}: {res['error']}")
+        elif res["ok"] and res.get("unchanged"):
+            unchanged += 1
+        elif res["ok"]:
+            ok += 1
+            pages += res["pages"]
+            nbytes += res["bytes"]
+            if not args.quiet:
+                print(f"[{i}{total}] {Fore.GREEN}OK{Style.RESET_ALL}   {res['src']} → {res['out']} "
+                      f"({res['pages']} pages, {res['seconds']:.2f}s)")
+        else:
+            failed += 1
+            print(f"[{i}{total}] {Fore.RED}FAIL{Style.RESET_ALL} {res['src']}: {res['error']}")
+        if "metrics" in res:
+            for name, st in res["metrics"]["stages"].items():
+                stage_totals[name] = stage_totals.get(name, 0.0) + st["wall"]
+        if write_metrics is not None and not res.get("unchanged"):
+            # Crashed workers and rejected files have no record of their own; log them anyway
+            rec = res.get("metrics") or {"source": res["src"], "error": res["error"], "preflight": res.get("preflight")}
+            write_metrics({"event": "document", **rec, "ok": res["ok"], "error": res["error"], "seconds": res.get("seconds")})
+        if manifest is not None and res["ok"] and "mtime_ns" in res:  # archive members aren't tracked
+            manifest.update(Path(res["src"]), res, settings)
+            # Checkpoint so an interrupted run keeps most of its progress
+            if time.monotonic() - last_save > 30:
+                manifest.save()
+                last_save = time.monotonic()
+        if stop is not None and stop.is_set():
+            break
+    if manifest is not None:
+        manifest.save()
+    elapsed = time.perf_counter() - start
+
+    mb = nbytes / (1024 * 1024)
+    print(
+        f"\n{Fore.YELLOW}Summary:{Style.RESET_ALL} {ok} converted, {unchanged} unchanged, {skipped} skipped, "
+        f"{failed} failed in {elapsed:.2f}s with {workers} worker(s)\n"
+        f"  {_fmt_rate(ok, elapsed)} files/s, {_fmt_rate(pages, elapsed)} pages/s, {_fmt_rate(mb, elapsed)} MB/s"
+    )
+    if stage_totals:
+        slowest = sorted(stage_totals.items(), key=lambda kv: -kv[1])
+        print("  stage time: " + ", ".join(f"{name} {secs:.2f}s" for name, secs in slowest))
+    return {"converted": ok, "unchanged": unchanged, "skipped": skipped, "failed": failed, "pages": pages,
+            "bytes": nbytes, "seconds": elapsed, "workers": workers, "failures": failures}
+
+
+# -------- Distributed runs --------
+
+CLUSTER_SHARDS = 64
+CLUSTER_LEASE_TTL = 120.0
+CLUSTER_PLAN = "plan.json"
+
+
+def shard_of(key: str, shards: int) -> int:
+    """The shard a source belongs to; the same on every host and Python build."""
+    import hashlib
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big") % shards
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    import json
+    import tempfile
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class ShardLease:
+    """Exclusive claim on one shard of a distributed run, held through a lease file.
+
+    The file is created with O_EXCL, so only one node gets it; its mtime is
+    the heartbeat, refreshed by a background thread every `ttl / 4` seconds.
+    A lease whose heartbeat is older than `ttl` belongs to a dead node and
+    is taken over. Taking over, like releasing, first creates an O_EXCL
+    marker named after the old lease's token, so exactly one node replaces
+    a given lease and nobody moves a file it has not checked; the old file
+    is then renamed aside, checked once more, and a new one created. Ages
+    are measured against the shared filesystem's clock, not the local one,
+    and ownership by a random token in the file (inode numbers get
+    reused). `lost` is set when the file stops being ours, and the holder
+    should then stop work on the shard.
+    """
+
+    def __init__(self, path: Path, node: str, ttl: float, token: str) -> None:
+        self.path = path
+        self.node = node
+        self.ttl = ttl
+        self.token = token
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _token(path: Path) -> str | None:
+        import json
+        try:
+            return json.loads(path.read_text(encoding="utf-8")).get("token")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    @classmethod
+    def acquire(cls, path: Path, node: str, ttl: float) -> ShardLease | None:
+        """Take the lease at `path`, or None while another live node holds it."""
+        import json
+        import uuid
+        path.parent.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"node": node, "pid": os.getpid(), "acquired": time.time(), "token": token}, f)
+                return cls(path, node, ttl, token)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if _fs_now(path.parent) - st.st_mtime <= ttl:
+                return None
+            stale = cls._token(path)
+            marker = cls._marker(path, stale or f"{st.st_ino}-{st.st_mtime_ns}")
+            if not cls._claim(marker, ttl):
+                return None  # another node is taking it over
+            try:
+                if cls._token(path) != stale:
+                    continue  # replaced or released since we looked
+                aside = path.with_name(f"{path.name}.expired-{token}")
+                try:
+                    os.rename(path, aside)
+                except FileNotFoundError:
+                    continue
+                if cls._token(aside) != stale:
+                    # Not the lease we judged dead after all: put it back and
+                    # leave it alone even if that fails; it is never ours to delete
+                    try:
+                        os.link(aside, path)
+                        os.unlink(aside)
+                    except OSError:
+                        pass
+                    return None
+                os.unlink(aside)
+            finally:
+                try:
+                    os.unlink(marker)
+                except FileNotFoundError:
+                    pass
+        return None
+
+    @staticmethod
+    def _marker(path: Path, key: str) -> Path:
+        return path.with_name(f"{path.name}.takeover-{key}")
+
+    @staticmethod
+    def _claim(marker: Path, ttl: float) -> bool:
+        """Create `marker` exclusively; one left by a node that died mid-takeover is cleared first."""
+        import uuid
+        for _ in range(2):
+            try:
+                os.close(os.open(marker, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                return True
+            except FileExistsError:
+                pass
+            try:
+                if _fs_now(marker.parent) - os.stat(marker).st_mtime <= ttl:
+                    return False
+                old = marker.with_name(f"{marker.name}.expired-{uuid.uuid4().hex}")
+                os.rename(marker, old)
+                os.unlink(old)
+            except FileNotFoundError:
+                return False
+        return False
+
+    def _owned(self) -> bool:
+        return self._token(self.path) == self.token
+
+    def _beat(self) -> None:
+        while not self._stop.wait(self.ttl / 4):
+            if not self._owned():
+                self.lost.set()
+                return
+            try:
+                os.utime(self.path)
+            except OSError:
+                self.lost.set()
+                return
+
+    def release(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        marker = self._marker(self.path, self.token)
+        try:
+            os.close(os.open(marker, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        except OSError:
+            return  # a node is taking it over: no longer ours to remove
+        try:
+            if self._owned():
+                os.unlink(self.path)
+        except OSError:
+            pass
+        finally:
+            try:
+                os.unlink(marker)
+            except OSError:
+                pass
+
+    def __enter__(self) -> ShardLease:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def _fs_now(directory: Path) -> float:
+    """Current time by the clock of the filesystem holding `directory`."""
+    import socket
+    probe = directory / f".clock-{socket.gethostname()}-{os.getpid()}"
+    with open(probe, "a"):
+        pass
+    try:
+        os.utime(probe)
+        return os.stat(probe).st_mtime
+    finally:
+        os.unlink(probe)
+
+
+class ClusterRun:
+    """A conversion split across hosts that share one directory.
+
+    `plan()` lists the inputs once and assigns each to a shard by hash.
+    Any number of `work()` processes, on any host that sees the shared
+    directory and the inputs at the same paths, claim shards through
+    ShardLease files and convert them with the normal batch pipeline; each
+    shard keeps its own manifest, so a shard taken over from a dead node
+    resumes where it stopped. `merge()` folds the shard manifests into
+    one and writes report.json. Layout: plan.json, leases/, shards/NNNN/
+    (manifests), done/NNNN.json (shard reports).
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def _shard_name(self, k: int) -> str:
+        return f"{k:04d}"
+
+    def lease_path(self, k: int) -> Path:
+        return self.root / "leases" / f"{self._shard_name(k)}.lease"
+
+    def done_path(self, k: int) -> Path:
+        return self.root / "done" / f"{self._shard_name(k)}.json"
+
+    def shard_manifest(self, k: int) -> Path:
+        return self.root / "shards" / self._shard_name(k) / MANIFEST_NAME
+
+    def plan(self, argv: list[str], *, shards: int = CLUSTER_SHARDS, lease_ttl: float = CLUSTER_LEASE_TTL) -> dict:
+        """Write plan.json for the convert arguments `argv`; refuses to replace an existing plan."""
+        import json
+        args = convert_arg_parser().parse_args(argv)
+        pairs = collect_pdfs(args.inputs, args.output)
+        archives = collect_archives(args.inputs)
+        if not pairs and not archives:
+            raise ValueError("no PDF files found")
+        plan = {
+            "version": 1,
+            "argv": argv,
+            "shards": shards,
+            "lease_ttl": lease_ttl,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "output": os.path.abspath(args.output) if args.output else None,
+            "manifest": os.path.abspath(self._merged_manifest_path(args)),
+            "files": [],
+            "archives": [],
+        }
+        # Absolute paths, so nodes may start from any working directory
+        for pdf, out in pairs:
+            pdf = os.path.abspath(pdf)
+            plan["files"].append([pdf, os.path.abspath(out), shard_of(pdf, shards)])
+        for a in archives:
+            a = os.path.abspath(a)
+            plan["archives"].append([a, shard_of(a, shards)])
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(self.root / CLUSTER_PLAN, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            raise FileExistsError(f"{self.root / CLUSTER_PLAN} already exists; use a fresh directory") from None
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=1)
+        return plan
+
+    def load_plan(self) -> dict:
+        import json
+        return json.loads((self.root / CLUSTER_PLAN).read_text(encoding="utf-8"))
+
+    def pending(self, plan: dict) -> list[int]:
+        """Shards that have work and no report yet."""
+        used = {sh for *_, sh in plan["files"]} | {sh for _, sh in plan["archives"]}
+        return [k for k in sorted(used) if not self.done_path(k).exists()]
+
+    def _merged_manifest_path(self, args) -> Path:
+        return args.manifest or (args.output / MANIFEST_NAME if args.output else self.root / MANIFEST_NAME)
+
+    def _seed_manifest(self, k: int, args, pairs: list[tuple[Path, Path]]) -> None:
+        # A re-run starts from what earlier merged runs recorded
+        path = self.shard_manifest(k)
+        if path.exists() or args.force:
+            return
+        merged = ConversionManifest.load(Path(self.load_plan()["manifest"]))
+        m = ConversionManifest(path)
+        keys = {ConversionManifest._key(pdf) for pdf, _ in pairs}
+        m.entries = {key: e for key, e in merged.entries.items() if key in keys}
+        if m.entries:
+            m._dirty = True
+            m.save()
+
+    def work(self, node: str, *, extra_argv: list[str] = (), quiet: bool = False) -> int:
+        """Claim and convert shards until every shard has a report. Returns shards converted here."""
+        plan = self.load_plan()
+        args = convert_arg_parser().parse_args(plan["argv"] + list(extra_argv))
+        if plan["output"]:
+            args.output = Path(plan["output"])  # archive members land here
+        ttl = float(plan["lease_ttl"])
+        done_here = 0
+        while True:
+            todo = self.pending(plan)
+            if not todo:
+                return done_here
+            # Start at a node-specific shard so nodes don't all contend for the same lease
+            start = shard_of(node, len(todo))
+            claimed = False
+            for k in todo[start:] + todo[:start]:
+                if self.done_path(k).exists():
+                    continue
+                lease = ShardLease.acquire(self.lease_path(k), node, ttl)
+                if lease is None:
+                    continue
+                claimed = True
+                with lease:
+                    if self.done_path(k).exists():  # finished while we were looking
+                        continue
+                    pairs = [(Path(pdf), Path(out)) for pdf, out, sh in plan["files"] if sh == k]
+                    archives = [Path(a) for a, sh in plan["archives"] if sh == k]
+                    if not quiet:
+                        print(f"{Fore.CYAN}[{node}] shard {self._shard_name(k)}:{Style.RESET_ALL} "
+                              f"{len(pairs)} file(s), {len(archives)} archive(s)")
+                    self._seed_manifest(k, args, pairs)
+                    t0 = time.time()
+                    report = run_batch(args, pairs, archives, manifest_path=self.shard_manifest(k), stop=lease.lost)
+                    if report is None:
+                        raise ValueError("conversion options in the plan can't be used")
+                    if lease.lost.is_set():
+                        print(f"{Fore.YELLOW}[{node}] lost the lease on shard {self._shard_name(k)}; "
+                              f"another node continues it{Style.RESET_ALL}", file=sys.stderr)
+                        continue
+                    _write_json_atomic(self.done_path(k), {
+                        "shard": k, "node": node, "started": t0, "finished": time.time(), "report": report,
+                    })
+                    done_here += 1
+            if not claimed:
+                # Everything left is held by live nodes; wait for them to finish or expire
+                time.sleep(min(ttl / 4, 15.0))
+
+    def merge(self) -> dict:
+        """Fold shard manifests into one and write report.json; returns the report."""
+        import json
+        plan = self.load_plan()
+        target = Path(plan["manifest"])
+        merged = ConversionManifest.load(target)
+        totals = {key: 0 for key in ("converted", "unchanged", "skipped", "failed", "pages", "bytes")}
+        nodes: dict[str, dict] = {}
+        failures: list[dict] = []
+        missing: list[int] = []
+        used = sorted({sh for *_, sh in plan["files"]} | {sh for _, sh in plan["archives"]})
+        for k in used:
+            try:
+                done = json.loads(self.done_path(k).read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                missing.append(k)
+                continue
+            rep = done["report"]
+            for key in totals:
+                totals[key] += rep[key]
+            n = nodes.setdefault(done["node"], {"shards": 0, "converted": 0, "pages": 0, "seconds": 0.0})
+            n["shards"] += 1
+            n["converted"] += rep["converted"]
+            n["pages"] += rep["pages"]
+            n["seconds"] += done["finished"] - done["started"]
+            failures += rep["failures"]
+            merged.entries.update(ConversionManifest.load(self.shard_manifest(k)).entries)
+            merged._dirty = True
+        merged.save()
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "shards": len(used),
+            "missing_shards": missing,
+            "manifest": str(target),
+            **totals,
+            "nodes": nodes,
+            "failures": failures,
+        }
+        _write_json_atomic(self.root / "report.json", report)
+        return report
+
+
+def cluster_main(argv: list[str]) -> int:
+    import argparse
+    import socket
+    usage = "usage: pdf_minner cluster {plan,work,merge} SHARED_DIR [...]"
+    if not argv or argv[0] not in ("plan", "work", "merge"):
+        print(usage, file=sys.stderr)
+        print("  plan SHARED_DIR INPUTS... [convert options] [--shards N] [--lease-ttl S]\n"
+              "  work SHARED_DIR [-j N] [--node NAME] [-q]\n"
+              "  merge SHARED_DIR", file=sys.stderr)
+        return 0 if argv and argv[0] in ("-h", "--help") else 2
+    cmd, rest = argv[0], argv[1:]
+
+    if cmd == "plan":
+        pre = argparse.ArgumentParser(add_help=False)
+        pre.add_argument("shared", type=Path)
+        pre.add_argument("--shards", type=int, default=CLUSTER_SHARDS)
+        pre.add_argument("--lease-ttl", type=float, default=CLUSTER_LEASE_TTL)
+        if not rest or rest[0] in ("-h", "--help"):
+            ap = convert_arg_parser(prog="pdf_minner cluster plan SHARED_DIR",
+                                    description="Split a conversion into shards that several hosts work through.")
+            ap.add_argument("--shards", type=int, default=CLUSTER_SHARDS, help="number of shards (default: 64)")
+            ap.add_argument("--lease-ttl", type=float, default=CLUSTER_LEASE_TTL,
+                            help="seconds without a heartbeat before a shard is taken over (default: 120)")
+            ap.print_help()
+            return 0
+        ns, conv = pre.parse_known_args(rest)
+        try:
+            plan = ClusterRun(ns.shared).plan(conv, shards=max(1, ns.shards), lease_ttl=max(1.0, ns.lease_ttl))
+        except (OSError, ValueError) as e:
+            print(f"{Fore.RED}Cannot plan:{Style.RESET_ALL} {e}", file=sys.stderr)
+            return 2
+        used = len({sh for *_, sh in plan["files"]} | {sh for _, sh in plan["archives"]})
+        print(f"Planned {len(plan['files'])} file(s) and {len(plan['archives'])} archive(s) in {used} shard(s) "
+              f"under {ns.shared}")
+        return 0
+
+    ap = argparse.ArgumentParser(prog=f"pdf_minner cluster {cmd}")
+    ap.add_argument("shared", type=Path, help="directory shared by every node, as given to `cluster plan`")
+    if cmd == "work":
+        ap.add_argument("-j", "--jobs", type=int, default=None, help="worker processes on this node (default: CPU count)")
+        ap.add_argument("--node", default=f"{socket.gethostname()}-{os.getpid()}", help="name in leases and reports")
+        ap.add_argument("-q", "--quiet", action="store_true", help="only print failures and summaries")
+    args = ap.parse_args(rest)
+    run = ClusterRun(args.shared)
+    if not (run.root / CLUSTER_PLAN).exists():
+        print(f"{Fore.RED}No {CLUSTER_PLAN} in {run.root}; run `cluster plan` first.{Style.RESET_ALL}", file=sys.stderr)
+        return 2
+
+    if cmd == "work":
+        extra = (["-j", str(args.jobs)] if args.jobs else []) + (["-q"] if args.quiet else [])
+        try:
+            n = run.work(args.node, extra_argv=extra, quiet=args.quiet)
+        except (OSError, ValueError) as e:
+            print(f"{Fore.RED}Cannot work:{Style.RESET_ALL} {e}", file=sys.stderr)
+            return 2
+        print(f"{Fore.YELLOW}[{args.node}]{Style.RESET_ALL} all shards done ({n} converted on this node)")
+        return 0
+
+    try:
+        report = run.merge()
+    except (OSError, ValueError) as e:
+        print(f"{Fore.RED}Cannot merge:{Style.RESET_ALL} {e}", file=sys.stderr)
+        return 2
+    print(
+        f"{Fore.YELLOW}Merged:{Style.RESET_ALL} {report['converted']} converted, {report['unchanged']} unchanged, "
+        f"{report['skipped']} skipped, {report['failed']} failed, {report['pages']} pages "
+        f"from {len(report['nodes'])} node(s)\n  manifest {report['manifest']}, report {run.root / 'report.json'}"
+    )
+    for node, n in sorted(report["nodes"].items()):
+        print(f"  {node}: {n['shards']} shard(s), {n['converted']} file(s), {n['pages']} pages, {n['seconds']:.1f}s")
+    for f in report["failures"]:
+        print(f"  {Fore.RED}FAIL{Style.RESET_ALL} {f['src']}: {f['error']}")
+    if report["missing_shards"]:
+        print(f"{Fore.RED}{len(report['missing_shards'])} shard(s) not finished yet:{Style.RESET_ALL} "
+              + ", ".join(f"{k:04d}" for k in report["missing_shards"]), file=sys.stderr)
+        return 1
+    return 0 if report["failed"] == 0 else 1
+
+
+
+# -------- Watermark profiles --------
+
+# Phrases tracked while learning before rare ones are pruned
+PROFILE_MAX_TRACKED = 200_000
+
+
+def document_short_line_counts(pages: Iterable[str]) -> tuple[int, dict[str, int]]:
+    """Return (page count, {short line: pages it appears on}) in one pass."""
+    import collections
+    counts = collections.Counter()
+    n = 0
+    for p in pages:
+        n += 1
+        counts.update(_page_short_lines(p))
+    return n, counts
+
+
+def profile_path(name: str) -> Path:
+    """Where a named profile lives; names that look like paths are used as-is."""
+    if name.endswith(".json") or os.sep in name or "/" in name:
+        return Path(name).expanduser()
+    base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return Path(base) / "pdf_minner" / "profiles" / f"{name}.json"
+
+
+class WatermarkProfile:
+    """Watermark phrases learned from a corpus, plus the evidence for each.
+
+    `evidence` maps a phrase to [documents, pages seen on, pages in those
+    documents]. Apply a profile with matcher(); no per-document detection
+    or prompting is needed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, name: str, phrases: Iterable[str], *, docs: int = 0, pages: int = 0,
+                 evidence: dict[str, list[int]] | None = None) -> None:
+        self.name = name
+        self.phrases = sorted(set(phrases))
+        self.docs = docs
+        self.pages = pages
+        self.evidence = evidence or {}
+
+    def matcher(self) -> WatermarkMatcher:
+        return compile_watermark_matcher(self.phrases)
+
+    def save(self, path: Path | None = None) -> Path:
+        import json
+        import tempfile
+        path = Path(path) if path else profile_path(self.name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": self.VERSION,
+            "name": self.name,
+            "phrases": self.phrases,
+            "docs": self.docs,
+            "pages": self.pages,
+            "evidence": self.evidence,
+        }
+        # Written aside and swapped in, so an interrupted save (or a batch
+        # loading the profile meanwhile) never sees a truncated file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return path
+
+    @classmethod
+    def load(cls, name: str) -> WatermarkProfile:
+        import json
+        data = json.loads(profile_path(name).read_text(encoding="utf-8"))
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"unsupported profile version {data.get('version')!r}")
+        return cls(data["name"], data["phrases"], docs=data.get("docs", 0), pages=data.get("pages", 0),
+                   evidence=data.get("evidence"))
+
+
+class WatermarkProfileLearner:
+    """Aggregate short-line statistics across documents in one streaming pass.
+
+    Per phrase we keep how many documents it occurred in, how many pages it
+    was on and how many pages those documents had. Judging page coverage
+    inside the documents that carry a phrase works for short files too,
+    where the per-document 60% rule cannot. When more than `max_tracked`
+    phrases accumulate, the half seen in the fewest documents is dropped.
+    """
+
+    def __init__(self, max_tracked: int = PROFILE_MAX_TRACKED) -> None:
+        self.max_tracked = max_tracked
+        self.docs = 0
+        self.pages = 0
+        self._stats: dict[str, list[int]] = {}
+
+    def add_document(self, pages: Iterable[str]) -> None:
+        self.add_counts(*document_short_line_counts(pages))
+
+    def add_counts(self, n_pages: int, counts: dict[str, int]) -> None:
+        self.docs += 1
+        self.pages += n_pages
+        stats = self._stats
+        for s, c in counts.items():
+            st = stats.get(s)
+            if st is None:
+                st = stats[s] = [0, 0, 0]
+            st[0] += 1
+            st[1] += c
+            st[2] += n_pages
+        if len(stats) > self.max_tracked:
+            keep = sorted(stats.items(), key=lambda kv: (-kv[1][0], -kv[1][1]))[: self.max_tracked // 2]
+            self._stats = dict(keep)
+
+    def build(self, name: str, *, min_docs: int = 3, min_doc_ratio: float = 0.02,
+              min_page_ratio: float = 0.6) -> WatermarkProfile:
+        need_docs = max(min_docs, int(min_doc_ratio * self.docs))
+        evidence = {
+            s: st for s, st in self._stats.items()
+            if st[0] >= need_docs and st[1] >= min_page_ratio * st[2]
+        }
+        return WatermarkProfile(name, evidence, docs=self.docs, pages=self.pages, evidence=evidence)
+
+
+def profile_job(pdf_path: Path, opts: dict, timeout: float | None) -> dict:
+    """Process-pool entry point for learning: per-document short-line counts."""
+    result = {"src": str(pdf_path), "ok": False, "pages": 0, "bytes": 0, "error": None}
+    start = time.perf_counter()
+    try:
+        with _job_deadline(timeout):
+            result["bytes"] = pdf_path.stat().st_size
+            n, counts = document_short_line_counts(iter_pdf_pages(pdf_path, **opts))
+            result.update(ok=True, pages=n, counts=dict(counts))
+    except _JobTimeout:
+        result["error"] = f"timed out after {timeout:g}s"
+    except Exception as e:
+        result["error"] = str(e) or e.__class__.__name__
+    finally:
+        result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def profile_main(argv: list[str]) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(prog="pdf_minner profile", description="Learn and inspect watermark profiles.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    learn = sub.add_parser("learn", help="learn a profile from a corpus")
+    learn.add_argument("name", help="profile name (or a .json path)")
+    learn.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    learn.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    learn.add_argument("--timeout", type=float, default=None, help="per-file time limit in seconds")
+    learn.add_argument("--min-docs", type=int, default=3, help="documents a phrase must appear in (default: 3)")
+    learn.add_argument("--min-page-ratio", type=float, default=0.6,
+                       help="share of pages it must cover within those documents (default: 0.6)")
+    learn.add_argument("--no-cache", action="store_true", help="don't read or fill the extraction cache")
+    show = sub.add_parser("show", help="print a profile's phrases")
+    show.add_argument("name")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "show":
+        try:
+            prof = WatermarkProfile.load(args.name)
+        except (OSError, ValueError) as e:
+            print(f"{Fore.RED}Cannot load profile:{Style.RESET_ALL} {e}", file=sys.stderr)
+            return 2
+        print(f"{prof.name}: {len(prof.phrases)} phrase(s) from {prof.docs} documents / {prof.pages} pages")
+        for s in prof.phrases:
+            d, hit, tot = prof.evidence.get(s, (0, 0, 0))
+            cov = f"{hit * 100 // tot}%" if tot else "-"
+            print(f"  {s}  [{d} docs, {cov} of their pages]")
+        return 0
+
+    pdfs = [pdf for pdf, _ in collect_pdfs(args.inputs, None)]
+    if not pdfs:
+        print(f"{Fore.RED}No PDF files found.{Style.RESET_ALL}", file=sys.stderr)
+        return 2
+    opts = {"cache": None if args.no_cache else default_cache()}
+    learner = WatermarkProfileLearner()
+    failed = 0
+    jobs = [(pdf, opts) for pdf in pdfs]
+    for res in _run_pool(jobs, max(1, min(args.jobs, len(jobs))), args.timeout, fn=profile_job):
+        if res["ok"]:
+            learner.add_counts(res["pages"], res["counts"])
+        else:
+            failed += 1
+            print(f"{Fore.RED}FAIL{Style.RESET_ALL} {res['src']}: {res['error']}")
+    prof = learner.build(args.name, min_docs=args.min_docs, min_page_ratio=args.min_page_ratio)
+    path = prof.save()
+    print(f"{Fore.GREEN}Saved{Style.RESET_ALL} {path}: {len(prof.phrases)} phrase(s) from "
+          f"{learner.docs} documents ({failed} failed)")
+    for s in prof.phrases:
+        print(f"  {s}")
+    return 0
+
+
+# -------- Page deduplication --------
+
+# MinHash bins (a power of two) and LSH bands; 8 bands of 8 bins make pages
+# at 0.9 similarity candidates ~99% of the time and at 0.5 only ~3%
+DEDUP_BINS = 64
+DEDUP_BANDS = 8
+DEDUP_THRESHOLD = 0.9
+# Blank, title and other near-empty pages are never treated as duplicates
+DEDUP_MIN_CHARS = 64
+
+
+def page_fingerprint(page: str) -> tuple[bytes, bytes] | None:
+    """(exact digest, MinHash signature) of a page's normalized lines.
+
+    The signature is a one-permutation MinHash over 3-word shingles: one
+    CRC32 per shingle, split into DEDUP_BINS bins by its top bits, keeping
+    the low 16 bits of each bin's minimum. Returns None for pages shorter
+    than DEDUP_MIN_CHARS.
+    """
+    import hashlib
+    import struct
+    import zlib
+    norm = "\n".join(s for s in map(_normalize_line, page.splitlines()) if s)
+    if len(norm) < DEDUP_MIN_CHARS:
+        return None
+    data = norm.encode("utf-8", errors="surrogatepass")
+    exact = hashlib.blake2b(data, digest_size=16).digest()
+    words = norm.lower().split()
+    shift = 32 - (DEDUP_BINS.bit_length() - 1)
+    mask = (1 << shift) - 1
+    empty = 1 << shift
+    mins = [empty] * DEDUP_BINS
+    crc = zlib.crc32
+    for i in range(max(1, len(words) - 2)):
+        h = crc(" ".join(words[i:i + 3]).encode("utf-8", errors="surrogatepass"))
+        b = h >> shift
+        if h & mask < mins[b]:
+            mins[b] = h & mask
+    # Densify: an empty bin borrows from the next filled one, so short pages
+    # still get comparable signatures
+    for b in range(DEDUP_BINS):
+        if mins[b] == empty:
+            for k in range(1, DEDUP_BINS):
+                v = mins[(b + k) % DEDUP_BINS]
+                if v != empty:
+                    mins[b] = (v + k) & mask
+                    break
+    return exact, struct.pack(f"<{DEDUP_BINS}H", *(m & 0xFFFF for m in mins))
+
+
+def signature_similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two page_fingerprint() signatures."""
+    import struct
+    fmt = f"<{DEDUP_BINS}H"
+    return sum(x == y for x, y in zip(struct.unpack(fmt, a), struct.unpack(fmt, b))) / DEDUP_BINS
+
+
+def _band_keys(sig: bytes) -> list[int]:
+    import zlib
+    step = len(sig) // DEDUP_BANDS
+    return [(j << 32) | zlib.crc32(sig[j * step:(j + 1) * step]) for j in range(DEDUP_BANDS)]
+
+
+class PageDedupIndex:
+    """Persistent index of page fingerprints (sqlite), first come first kept.
+
+    check() answers whether a page repeats one seen before, in this run or
+    an earlier one, and records it when it does not. Pages match exactly
+    on their normalized text or, below `threshold` < 1, by MinHash
+    similarity among LSH candidates. A page never duplicates itself, so
+    re-exporting the same documents keeps them.
+    """
+
+    def __init__(self, path: Path, *, threshold: float = DEDUP_THRESHOLD) -> None:
+        import sqlite3
+        self.path = Path(path)
+        self.threshold = threshold
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, doc_id TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY, exact BLOB NOT NULL, sig BLOB NOT NULL,
+                doc INTEGER NOT NULL, page INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS pages_exact ON pages (exact);
+            CREATE UNIQUE INDEX IF NOT EXISTS pages_doc ON pages (doc, page);
+            CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, page INTEGER NOT NULL,
+                PRIMARY KEY (key, page)) WITHOUT ROWID;
+        """)
+        self.exact = self.near = 0
+
+    def _doc(self, doc_id: str) -> int:
+        self.db.execute("INSERT OR IGNORE INTO docs (doc_id) VALUES (?)", (doc_id,))
+        return self.db.execute("SELECT id FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()[0]
+
+    def check(self, doc_id: str, page: int, fp: tuple[bytes, bytes]) -> dict | None:
+        """{"doc_id", "page", "similarity"} of the earlier page `fp` repeats, else None."""
+        exact, sig = fp
+        db = self.db
+        doc = self._doc(doc_id)
+        mine = db.execute("SELECT id FROM pages WHERE doc = ? AND page = ?", (doc, page)).fetchone()
+        row = db.execute(
+            "SELECT d.doc_id, p.page FROM pages p JOIN docs d ON d.id = p.doc "
+            "WHERE p.exact = ? AND NOT (p.doc = ? AND p.page = ?) ORDER BY p.id LIMIT 1",
+            (exact, doc, page),
+        ).fetchone()
+        if row is not None:
+            self.exact += 1
+            return {"doc_id": row[0], "page": row[1], "similarity": 1.0}
+        keys = _band_keys(sig)
+        if self.threshold < 1:
+            best = None
+            marks = ",".join("?" * len(keys))
+            for pid, other, odoc, opage in db.execute(
+                f"SELECT p.id, p.sig, d.doc_id, p.page FROM pages p JOIN docs d ON d.id = p.doc "
+                f"WHERE p.id IN (SELECT DISTINCT page FROM bands WHERE key IN ({marks}))",
+                keys,
+            ):
+                if mine is not None and pid == mine[0]:
+                    continue
+                sim = signature_similarity(sig, other)
+                if sim >= self.threshold and (best is None or sim > best["similarity"]):
+                    best = {"doc_id": odoc, "page": opage, "similarity": sim}
+            if best is not None:
+                self.near += 1
+                return best
+        if mine is None:
+            cur = db.execute("INSERT INTO pages (exact, sig, doc, page) VALUES (?, ?, ?, ?)", (exact, sig, doc, page))
+            db.executemany("INSERT OR IGNORE INTO bands (key, page) VALUES (?, ?)",
+                           [(k, cur.lastrowid) for k in keys])
+        return None
+
+    def doc_ids(self) -> list[str]:
+        """Documents with at least one page in the index."""
+        return [r[0] for r in self.db.execute(
+            "SELECT d.doc_id FROM docs d WHERE EXISTS (SELECT 1 FROM pages p WHERE p.doc = d.id)")]
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+
+# -------- Corpus export --------
+
+# Shards are closed once this much has been written to them (after compression)
+DEFAULT_SHARD_MB = 256
+EXPORT_INDEX_NAME = "index.json"
+# Parquet rows are buffered into row groups of about this many text bytes
+PARQUET_ROW_GROUP_BYTES = 64 << 20
+
+
+class _ExportSink:
+    """convert_file() writer that turns a document into one JSON record per page.
+
+    Records go to a spool file; the parent process moves them into shards.
+    With `fingerprints`, each page's page_fingerprint() goes to a second
+    spool (`.fp`, one hex line per page, "-" when too short).
+    """
+
+    def __init__(self, spool: Path, doc_id: str, stats: dict, tracker: _PageTracker,
+                 fingerprints: bool = False) -> None:
+        self.spool = spool
+        self.doc_id = doc_id
+        self.stats = stats
+        self.tracker = tracker
+        self.page = 0
+        self._md: list[str] = []
+        # Lone surrogates come out as JSON \udXXX escapes instead of failing
+        self._f = open(spool, "w", encoding="utf-8", errors="backslashreplace")
+        self._fp = open(spool.with_suffix(".fp"), "w", encoding="ascii") if fingerprints else None
+
+    def write_lines(self, lines: Iterable[str], page_of) -> None:
+        for line in lines:
+            page = page_of()
+            while self.page < page:
+                self._emit()
+            self._md.append(line)
+
+    def _emit(self) -> None:
+        import json
+        rec = {
+            "doc_id": self.doc_id,
+            "page": self.page + 1,
+            "text": self.tracker.texts.pop(self.page, ""),
+            "markdown": "\n".join(self._md).strip("\n"),
+            "backend": self.stats["backend"],
+            "removed": self.stats["removed"],
+        }
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        if self._fp is not None:
+            fp = page_fingerprint(rec["text"])
+            self._fp.write(f"{fp[0].hex()} {fp[1].hex()}\n" if fp else "-\n")
+        self._md.clear()
+        self.page += 1
+
+    def commit(self, pages: int | None = None) -> None:
+        while self.page < (pages or 0) or self._md:
+            self._emit()
+        self.close()
+
+    def close(self) -> None:
+        self._f.close()
+        if self._fp is not None:
+            self._fp.close()
+
+    def abort(self) -> None:
+        self.close()
+        for path in (self.spool, self.spool.with_suffix(".fp")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def export_job(pdf_path: Path | PdfBytes, spool: Path, opts: dict, fingerprints: bool, timeout: float | None) -> dict:
+    """Process-pool entry point for `export`: spool a document's page records."""
+    result = {"src": str(pdf_path), "out": None, "ok": False, "pages": 0, "bytes": 0, "error": None}
+    start = time.perf_counter()
+    try:
+        with _job_deadline(timeout):
+            result["bytes"] = source_size(pdf_path)
+            doc_id = file_digest(pdf_path)
+            sink = lambda stats, tracker: _ExportSink(spool, doc_id, stats, tracker, fingerprints)  # noqa: E731
+            stats = convert_file(pdf_path, Path(os.devnull), sink=sink, **opts)
+            result.update(stats, ok=True, doc_id=doc_id, out=None)
+    except _JobTimeout:
+        result["error"] = f"timed out after {timeout:g}s"
+    except Exception as e:
+        result["error"] = str(e) or e.__class__.__name__
+    finally:
+        result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _zstd_module() -> str | None:
+    for name in ("zstandard", "compression.zstd"):  # the latter is Python 3.14+
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            pass
+    return None
+
+
+def _zstd_writer(raw):
+    """A zstd compressing writer over the binary file `raw`."""
+    if _zstd_module() == "zstandard":
+        import zstandard  # type: ignore
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+    from compression import zstd  # type: ignore
+    return zstd.ZstdFile(raw, "wb", level=3)
+
+
+class CorpusWriter:
+    """Size-bounded shards of per-page records, plus an index of documents.
+
+    `fmt` is "jsonl" (compressed with `compression`: "zstd", "gzip",
+    "none", or "auto" for zstd when available) or "parquet" (needs
+    pyarrow). Documents are added whole from a spool of JSON lines, so
+    each one occupies a contiguous run of rows; a shard is closed once it
+    holds `shard_bytes` and a large document continues in the next one.
+    Shards appear under their final name only when complete, and
+    index.json is written by close().
+
+    An existing export in `out_dir` is extended: new shards are numbered
+    after its shards, its documents stay in the index, and documents it
+    already holds are not stored again. It must use the same format.
+
+    With a PageDedupIndex `dedup`, pages that repeat an earlier one are
+    dropped (`dedup_mode="skip"`) or stored as a record without text whose
+    "duplicate_of" names the kept page ("reference"). A dedup index that
+    knows pages of documents this export doesn't hold is refused (ValueError),
+    since its "duplicates" would point at records that aren't there.
+    """
+
+    def __init__(self, out_dir: Path, *, fmt: str = "jsonl", compression: str = "auto",
+                 shard_bytes: int = DEFAULT_SHARD_MB << 20, dedup: PageDedupIndex | None = None,
+                 dedup_mode: str = "skip") -> None:
+        import json
+        if fmt not in ("jsonl", "parquet"):
+            raise ValueError(f"unknown export format {fmt!r}")
+        try:
+            previous = json.loads((Path(out_dir) / EXPORT_INDEX_NAME).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            previous = None
+        if previous is not None:
+            if previous.get("format") != fmt:
+                raise ValueError(f"{out_dir} holds a {previous.get('format')} export; use the same format "
+                                 f"or another folder")
+            if compression == "auto":
+                compression = previous.get("compression", compression)
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401  (fail early)
+            compression = "zstd"
+        elif compression == "auto":
+            compression = "zstd" if _zstd_module() else "gzip"
+        if compression not in ("zstd", "gzip", "none"):
+            raise ValueError(f"unknown compression {compression!r}")
+        if compression == "zstd" and not _zstd_module():
+            raise ImportError("zstd compression needs the zstandard package")
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self.compression = compression
+        self.shard_bytes = shard_bytes
+        if dedup_mode not in ("skip", "reference"):
+            raise ValueError(f"unknown dedup mode {dedup_mode!r}")
+        self.dedup = dedup
+        self.dedup_mode = dedup_mode
+        self.shards: list[dict] = []
+        self.documents: list[dict] = []
+        self.failed: list[dict] = []
+        self.records = 0
+        self._seen: dict[str, str] = {}
+        self._indexed: set[tuple[str, str]] = set()
+        self._raw = self._stream = self._tmp = None
+        self._rows: list[dict] = []
+        self._row_bytes = 0
+        if previous is not None:
+            self._resume(previous)
+        if dedup is not None:
+            stored = set(self._seen)
+            unknown = [d for d in dedup.doc_ids() if d not in stored]
+            if unknown:
+                raise ValueError(
+                    f"dedup index {dedup.path} has pages of {len(unknown)} document(s) that "
+                    f"{self.out_dir / EXPORT_INDEX_NAME} doesn't list; remove it or pass another --dedup-index"
+                )
+
+    def _resume(self, index: dict) -> None:
+        if index.get("compression") != self.compression:
+            raise ValueError(f"{self.out_dir} holds {index.get('compression')}-compressed shards; "
+                             f"use the same compression or another folder")
+        missing = [sh["name"] for sh in index["shards"] if not (self.out_dir / sh["name"]).exists()]
+        if missing:
+            raise ValueError(f"{self.out_dir / EXPORT_INDEX_NAME} lists missing shards: {', '.join(missing)}")
+        self.shards = index["shards"]
+        self.documents = index["documents"]
+        self.failed = index.get("failed", [])
+        self.records = index["records"]
+        for d in self.documents:
+            self._indexed.add((d["doc_id"], d["source"]))
+            if "duplicate_of" not in d:
+                self._seen.setdefault(d["doc_id"], d["source"])
+
+    @property
+    def suffix(self) -> str:
+        if self.fmt == "parquet":
+            return ".parquet"
+        return ".jsonl" + {"zstd": ".zst", "gzip": ".gz", "none": ""}[self.compression]
+
+    def _open_shard(self) -> None:
+        name = f"part-{len(self.shards):05d}{self.suffix}"
+        self._tmp = self.out_dir / f".{name}.tmp"
+        self._raw = open(self._tmp, "wb")
+        if self.fmt == "parquet":
+            import pyarrow as pa  # type: ignore
+            import pyarrow.parquet as pq  # type: ignore
+            schema = pa.schema([
+                ("doc_id", pa.string()), ("page", pa.int32()), ("text", pa.string()),
+                ("markdown", pa.string()), ("backend", pa.string()), ("removed", pa.list_(pa.string())),
+                ("duplicate_of", pa.struct([
+                    ("doc_id", pa.string()), ("page", pa.int32()), ("similarity", pa.float32()),
+                ])),
+            ])
+            self._stream = pq.ParquetWriter(self._raw, schema, compression="zstd")
+        elif self.compression == "zstd":
+            self._stream = _zstd_writer(self._raw)
+        elif self.compression == "gzip":
+            import gzip
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6, mtime=0)
+        else:
+            self._stream = self._raw
+        self.shards.append({"name": name, "records": 0, "bytes": 0})
+
+    def _flush_rows(self) -> None:
+        if self._rows:
+            import pyarrow as pa  # type: ignore
+            self._stream.write_table(pa.Table.from_pylist(self._rows, schema=self._stream.schema))
+            self._rows.clear()
+            self._row_bytes = 0
+
+    def _close_shard(self) -> None:
+        if self._raw is None:
+            return
+        if self.fmt == "parquet":
+            self._flush_rows()
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+        shard = self.shards[-1]
+        shard["bytes"] = self._tmp.stat().st_size
+        os.replace(self._tmp, self.out_dir / shard["name"])
+        self._raw = self._stream = self._tmp = None
+
+    def add_document(self, result: dict, spool: Path) -> bool:
+        """Move a finished export_job()'s spooled records into the shards.
+
+        Returns False when the index already lists this source with this
+        content (as a document or as a duplicate of one).
+        """
+        import json
+        entry = {
+            "doc_id": result["doc_id"], "source": result["src"], "pages": result["pages"],
+            "backend": result.get("backend"), "format": result.get("format"),
+            "removed": result.get("removed", []), "parts": [],
+        }
+        if (result["doc_id"], result["src"]) in self._indexed:
+            return False  # exported by an earlier run into this folder
+        self._indexed.add((result["doc_id"], result["src"]))
+        if result["doc_id"] in self._seen:
+            # Same content under another name: index it, don't store it twice
+            entry["duplicate_of"] = self._seen[result["doc_id"]]
+            self.documents.append(entry)
+            return True
+        self._seen[result["doc_id"]] = result["src"]
+        part = None
+        with open(spool, "rb") as f:
+            for line in self._dedup_lines(result, spool, f, entry) if self.dedup is not None else f:
+                if self._raw is None:
+                    self._open_shard()
+                shard = self.shards[-1]
+                if part is None or part["shard"] != shard["name"]:
+                    part = {"shard": shard["name"], "row": shard["records"], "count": 0}
+                    entry["parts"].append(part)
+                if self.fmt == "parquet":
+                    self._rows.append(json.loads(line))
+                    self._row_bytes += len(line)
+                    if self._row_bytes >= PARQUET_ROW_GROUP_BYTES:
+                        self._flush_rows()
+                else:
+                    self._stream.write(line)
+                shard["records"] += 1
+                part["count"] += 1
+                self.records += 1
+                if self._raw.tell() + self._row_bytes >= self.shard_bytes:
+                    self._close_shard()
+        if self.dedup is not None:
+            self.dedup.commit()
+        self.documents.append(entry)
+        return True
+
+    def _dedup_lines(self, result: dict, spool: Path, lines, entry: dict) -> Iterator[bytes]:
+        import json
+        entry["duplicate_pages"] = 0
+        with open(spool.with_suffix(".fp"), encoding="ascii") as fps:
+            for page, (line, fp) in enumerate(zip(lines, fps), start=1):
+                fp = fp.split()
+                dup = None
+                if fp[0] != "-":
+                    dup = self.dedup.check(result["doc_id"], page, (bytes.fromhex(fp[0]), bytes.fromhex(fp[1])))
+                if dup is None:
+                    yield line
+                    continue
+                entry["duplicate_pages"] += 1
+                if self.dedup_mode == "reference":
+                    rec = {
+                        "doc_id": result["doc_id"], "page": page, "text": None, "markdown": None,
+                        "backend": result.get("backend"), "removed": result.get("removed", []),
+                        "duplicate_of": dup,
+                    }
+                    yield (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def add_failure(self, result: dict) -> None:
+        self.failed.append({"source": result["src"], "error": result["error"]})
+
+    def close(self) -> Path:
+        """Close the open shard and write the index; returns its path."""
+        import json
+        self._close_shard()
+        # Failures of earlier runs that have been exported since are dropped
+        exported = {d["source"] for d in self.documents}
+        failed = list({f["source"]: f for f in self.failed if f["source"] not in exported}.values())
+        index = {
+            "version": 1, "format": self.fmt, "compression": self.compression,
+            "records": self.records, "shards": self.shards, "documents": self.documents, "failed": failed,
+        }
+        if self.dedup is not None:
+            index["dedup"] = {
+                "mode": self.dedup_mode, "index": str(self.dedup.path), "threshold": self.dedup.threshold,
+                "exact": self.dedup.exact, "near": self.dedup.near,
+            }
+            self.dedup.close()
+        path = self.out_dir / EXPORT_INDEX_NAME
+        tmp = self.out_dir / f".{EXPORT_INDEX_NAME}.tmp"
+        tmp.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    def abort(self) -> None:
+        if self._raw is not None:
+            if self._stream is not self._raw:
+                try:
+                    self._stream.close()
+                except Exception:
+                    pass
+            self._raw.close()
+            try:
+                self._tmp.unlink()
+            except OSError:
+                pass
+            self._raw = self._stream = None
+
+
+def export_main(argv: list[str]) -> int:
+    import argparse
+    import itertools
+    import shutil
+    import tempfile
+    ap = argparse.ArgumentParser(prog="pdf_minner export",
+                                 description="Export PDFs as sharded per-page records for data pipelines.")
+    ap.add_argument("inputs", nargs="+",
+                    help="PDF files, directories (searched recursively), glob patterns or zip/tar archives")
+    ap.add_argument("-o", "--output", type=Path, required=True, help="folder for the shards and index.json")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    ap.add_argument("--timeout", type=float, default=None, help="per-file time limit in seconds (POSIX only)")
+    ap.add_argument("--shard-format", choices=("jsonl", "parquet"), default="jsonl",
+                    help="JSON lines, or Parquet (needs pyarrow)")
+    ap.add_argument("--compression", choices=("auto", "zstd", "gzip", "none"), default="auto",
+                    help="for JSON lines; auto: zstd when available, else gzip")
+    ap.add_argument("--shard-mb", type=int, default=DEFAULT_SHARD_MB, help="shard size on disk (default: 256)")
+    ap.add_argument("--dedup", choices=("off", "skip", "reference"), default="off",
+                    help="drop pages that repeat an earlier page, or keep them as references without text")
+    ap.add_argument("--dedup-index", type=Path, default=None,
+                    help="page fingerprint database, kept across runs together with the shards "
+                         "(default: OUT/dedup.sqlite)")
+    ap.add_argument("--near-dup", type=float, default=DEDUP_THRESHOLD,
+                    help="similarity at which pages count as duplicates (default: 0.9; 1 = exact only)")
+    ap.add_argument("--page-jobs", type=int, default=1, help="extract large PDFs with this many processes each")
+    ap.add_argument("--backend", choices=("auto", "fastest") + BACKENDS, default="auto")
+    ap.add_argument("--keep-watermarks", action="store_true", help="skip automatic watermark removal")
+    ap.add_argument("--wm-mode", choices=("text", "layout"), default="text")
+    ap.add_argument("--format", dest="doc_format", choices=("auto",) + tuple(FORMATTERS), default="auto")
+    ap.add_argument("--no-cache", action="store_true", help="always extract from scratch")
+    ap.add_argument("--image-only", choices=("skip", "convert"), default="skip",
+                    help="what to do with scans that have no text layer (default: skip)")
+    ap.add_argument("--no-preflight", action="store_true",
+                    help="don't check files before extraction or schedule the largest first")
+    ap.add_argument("-q", "--quiet", action="store_true", help="only print failures and the summary")
+    args = ap.parse_args(argv)
+
+    pdfs = [pdf for pdf, _ in collect_pdfs(args.inputs, None)]
+    archives = collect_archives(args.inputs)
+    if not pdfs and not archives:
+        print(f"{Fore.RED}No PDF files found.{Style.RESET_ALL}", file=sys.stderr)
+        return 2
+    dedup = None
+    if args.dedup != "off":
+        dedup = PageDedupIndex(args.dedup_index or args.output / "dedup.sqlite", threshold=args.near_dup)
+    try:
+        writer = CorpusWriter(args.output, fmt=args.shard_format, compression=args.compression,
+                              shard_bytes=max(1, args.shard_mb) << 20, dedup=dedup,
+                              dedup_mode="skip" if args.dedup == "off" else args.dedup)
+    except ImportError as e:
+        need = "pyarrow" if args.shard_format == "parquet" else "zstandard"
+        print(f"{Fore.RED}Cannot export:{Style.RESET_ALL} {e} (pip install {need})", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        if dedup is not None:
+            dedup.close()
+        print(f"{Fore.RED}Cannot export:{Style.RESET_ALL} {e}", file=sys.stderr)
+        return 2
+    opts = {
+        "remove_wm": not args.keep_watermarks,
+        "page_jobs": max(1, args.page_jobs),
+        "cache": None if args.no_cache else default_cache(),
+        "backend": args.backend,
+        "wm_mode": args.wm_mode,
+        "doc_format": args.doc_format,
+        "preflight": not args.no_preflight,
+    }
+    # One spool per job in flight, never one file per document in the output
+    spool_dir = Path(tempfile.mkdtemp(prefix=".export-", dir=args.output))
+    jobs = [(pdf, spool_dir / f"{i}.jsonl", opts, dedup is not None) for i, pdf in enumerate(pdfs)]
+    spools = {str(pdf): spool for pdf, spool, _, _ in jobs}
+    rejected = []
+    if jobs and not args.no_preflight:
+        jobs, rejected = schedule_jobs(jobs, image_only=args.image_only)
+    total = f"/{len(jobs) + len(rejected)}" if not archives else ""
+    workers = max(1, min(args.jobs, len(jobs))) if not archives else max(1, args.jobs)
+
+    def member_jobs() -> Iterator[tuple]:
+        for n, (data, _) in enumerate(archive_jobs(archives, None), start=len(pdfs)):
+            spools[str(data)] = spool_dir / f"{n}.jsonl"
+            yield data, spools[str(data)], opts, dedup is not None
+
+    if archives:
+        jobs = itertools.chain(jobs, member_jobs())
+    start = time.perf_counter()
+    ok = failed = skipped = pages = nbytes = 0
+    try:
+        results = itertools.chain(rejected, _run_pool(jobs, workers, args.timeout, fn=export_job) if jobs else ())
+        for i, res in enumerate(results, start=1):
+            spool = spools[res["src"]]
+            if res.get("skipped"):
+                writer.add_failure(res)
+                skipped += 1
+                if not args.quiet:
+                    print(f"[{i}{total}] {Fore.YELLOW}SKIP{Style.RESET_ALL} {res['src']}: {res['error']}")
+            elif res["ok"] and not writer.add_document(res, spool):
+                skipped += 1
+                if not args.quiet:
+                    print(f"[{i}{total}] {Fore.YELLOW}SKIP{Style.RESET_ALL} {res['src']}: already in {args.output}")
+            elif res["ok"]:
+                ok += 1
+                pages += res["pages"]
+                nbytes += res["bytes"]
+                if not args.quiet:
+                    print(f"[{i}{total}] {Fore.GREEN}OK{Style.RESET_ALL}   {res['src']} ({res['pages']} pages)")
+            else:
+                writer.add_failure(res)
+                failed += 1
+                print(f"[{i}{total}] {Fore.RED}FAIL{Style.RESET_ALL} {res['src']}: {res['error']}")
+            for path in (spool, spool.with_suffix(".fp")):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        index = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+    mb = nbytes / (1024 * 1024)
+    print(
+        f"\n{Fore.YELLOW}Summary:{Style.RESET_ALL} {ok} exported, {skipped} skipped, {failed} failed: {writer.records} records "
+        f"in {len(writer.shards)} shard(s), index {index}\n"
+        f"  {_fmt_rate(ok, elapsed)} files/s, {_fmt_rate(pages, elapsed)} pages/s, {_fmt_rate(mb, elapsed)} MB/s"
+    )
+    if dedup is not None:
+        print(f"  duplicate pages: {dedup.exact} exact, {dedup.near} near ({'dropped' if args.dedup == 'skip' else 'stored as references'})")
+    return 0 if failed == 0 else 1
+
+
+# -------- Conversion daemon --------
+
+# Per-job options a client may override, with their types; everything else is fixed by `serve`
+DAEMON_JOB_OPTIONS = {
+    "remove_wm": bool, "backend": str, "wm_mode": str, "doc_format": str, "page_index": bool, "page_jobs": int,
+}
+
+
+
+def _runtime_dir() -> Path:
+    """$XDG_RUNTIME_DIR, or a private 0700 folder in the temp dir."""
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if base:
+        return Path(base)
+    import tempfile
+    uid = os.getuid() if hasattr(os, "getuid") else "user"
+    d = Path(tempfile.gettempdir()) / f"pdf_minner-{uid}"
+    d.mkdir(mode=0o700, exist_ok=True)
+    st = d.lstat()
+    if hasattr(os, "getuid") and (not os.path.isdir(d) or d.is_symlink() or st.st_uid != os.getuid()
+                                  or st.st_mode & 0o077):
+        raise PermissionError(f"{d} is not a private folder of this user")
+    return d
+
+
+def default_socket_path() -> Path:
+    return _runtime_dir() / "pdf_minner.sock"
+
+
+def default_token_path() -> Path:
+    """Where `serve --port` keeps the token TCP clients must present."""
+    return _runtime_dir() / "pdf_minner.token"
+
+
+def _write_private(path: Path, text: str) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        os.fchmod(f.fileno(), 0o600)
+        f.write(text)
+
+
+class _RelayProgress:
+    """Queue-like `progress` sink that tags a job's events and forwards them.
+
+    `events` is a multiprocessing manager queue, so the sink can be pickled
+    into worker processes.
+    """
+
+    def __init__(self, events, job_id) -> None:
+        self.events = events
+        self.job_id = job_id
+
+    def put(self, item: tuple) -> None:
+        self.events.put((self.job_id,) + tuple(item))
+
+
+def daemon_job(job_id: str, pdf_path: Path, out_path: Path, opts: dict, timeout: float | None, events) -> None:
+    """Worker-side entry point; the result travels on the event queue after the job's progress."""
+    res = batch_job(pdf_path, out_path, {**opts, "progress": _RelayProgress(events, job_id)}, None, timeout)
+    events.put((job_id, "result", res))
+
+
+class _DaemonJob:
+    __slots__ = ("id", "client", "pdf", "out", "opts", "priority", "suspect", "cancelled")
+
+    def __init__(self, job_id, client, pdf, out, opts, priority) -> None:
+        self.id = job_id
+        self.client = client
+        self.pdf = pdf
+        self.out = out
+        self.opts = opts
+        self.priority = priority
+        self.suspect = False
+        self.cancelled = False
+
+
+class _DaemonClient:
+    """One connection; events for its jobs are written back as JSON lines."""
+
+    def __init__(self, wfile) -> None:
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, msg: dict) -> None:
+        import json
+        data = (json.dumps(msg, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except (OSError, ValueError):  # peer gone, or the handler already closed the stream
+                self.closed = True
+
+
+class ConversionDaemon:
+    """Priority job queue in front of a warm process pool.
+
+    Jobs wait in a heap (higher `priority` first, then arrival order) and
+    only `workers` of them are handed to the pool at a time, so priorities
+    still apply under load. The queue holds at most `max_queue` jobs;
+    submit() blocks for up to `queue_wait` seconds when it is full, which
+    pushes back on clients, then rejects. Workers report ("status"/
+    "progress", ...) tuples through a multiprocessing queue and a pump
+    thread routes them to the submitting connection, followed by "done"
+    or "error". A worker crash fails every job in the pool, so those jobs
+    are re-run alone; only one that still crashes by itself is reported.
+    Outputs must be .md files, and with `roots` both the PDF and its
+    output must lie inside one of those folders.
+    """
+
+    def __init__(
+        self,
+        opts: dict,
+        *,
+        workers: int = 1,
+        max_queue: int = 1000,
+        queue_wait: float = 30.0,
+        timeout: float | None = None,
+        roots: Iterable[Path] = (),
+    ) -> None:
+        import itertools
+        import multiprocessing
+        self.opts = opts
+        self.roots = [Path(r).expanduser().resolve() for r in roots]
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.queue_wait = queue_wait
+        self.timeout = timeout
+        # A manager queue gives every worker its own connection: a worker
+        # killed mid-put cannot hold a shared lock or leave half a message
+        self._manager = multiprocessing.Manager()
+        self._events = self._manager.Queue()
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._jobs: dict[str, _DaemonJob] = {}
+        self._running = 0
+        self._exclusive = False
+        self._pool = None
+        self._pump_thread = None
+        self._closing = False
+        self.started = time.time()
+        self.counts = {"done": 0, "failed": 0}
+
+    def start(self) -> None:
+        self._pool = self._new_pool()
+        threading.Thread(target=self._schedule, daemon=True).start()
+        self._pump_thread = threading.Thread(target=self._pump, daemon=True)
+        self._pump_thread.start()
+
+    def _new_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, client: _DaemonClient, req: dict) -> str:
+        """Queue one conversion request and return its job id; raises ValueError if rejected."""
+        import heapq
+        if not req.get("path"):
+            raise ValueError("missing 'path'")
+        for field in ("path", "out"):
+            if req.get(field) is not None and not isinstance(req[field], str):
+                raise ValueError(f"'{field}' must be a string")
+        pdf = Path(req["path"]).expanduser().resolve()
+        if not pdf.is_file():
+            raise ValueError(f"no such file: {pdf}")
+        out = Path(req["out"]).expanduser().resolve() if req.get("out") else pdf.with_suffix(".md")
+        if out.suffix.lower() != ".md":
+            raise ValueError(f"output must be a .md file: {out}")
+        for path in (pdf, out):
+            if self.roots and not any(path.is_relative_to(root) for root in self.roots):
+                raise ValueError(f"outside the allowed folders: {path}")
+        extra = req.get("options") or {}
+        if not isinstance(extra, dict):
+            raise ValueError("'options' must be an object")
+        unknown = set(extra) - set(DAEMON_JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"unsupported option(s): {', '.join(sorted(unknown))}")
+        for name, value in extra.items():
+            kind = DAEMON_JOB_OPTIONS[name]
+            # JSON true/false arrive as bool, which is also an int
+            if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+                raise ValueError(f"option '{name}' must be {({bool: 'true or false', str: 'a string', int: 'an integer'})[kind]}")
+        opts = {**self.opts, **extra}
+        if opts.get("backend", "auto") not in ("auto", "fastest") + BACKENDS:
+            raise ValueError(f"unknown backend {opts['backend']!r}")
+        if opts.get("doc_format", "auto") not in ("auto",) + tuple(FORMATTERS):
+            raise ValueError(f"unknown document format {opts['doc_format']!r}")
+        if opts.get("wm_mode", "text") not in ("text", "layout"):
+            raise ValueError(f"unknown watermark mode {opts['wm_mode']!r}")
+        if opts.get("page_jobs", 1) < 1:
+            raise ValueError("option 'page_jobs' must be at least 1")
+        priority = req.get("priority", 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("'priority' must be an integer")
+        if not isinstance(req.get("id", ""), (str, int)):
+            raise ValueError("'id' must be a string or an integer")
+        deadline = time.monotonic() + self.queue_wait
+        with self._cond:
+            while len(self._heap) >= self.max_queue and not self._closing:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise ValueError("queue full")
+                self._cond.wait(left)
+            if self._closing:
+                raise ValueError("daemon is shutting down")
+            job_id = str(req.get("id") or next(self._ids))
+            if job_id in self._jobs:
+                raise ValueError(f"job id {job_id!r} is already in use")
+            job = _DaemonJob(job_id, client, pdf, out, opts, priority)
+            self._jobs[job_id] = job
+            heapq.heappush(self._heap, (-priority, next(self._seq), job))
+            queued = len(self._heap)
+            self._cond.notify_all()
+        client.send({"id": job_id, "event": "queued", "data": queued})
+        return job_id
+
+    def cancel_client(self, client: _DaemonClient) -> None:
+        """Drop a disconnected client's queued jobs; running ones finish unobserved."""
+        with self._cond:
+            for _, _, job in self._heap:
+                if job.client is client:
+                    job.cancelled = True
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = sum(1 for _, _, j in self._heap if not j.cancelled)
+            return {"queued": queued, "running": self._running, "workers": self.workers,
+                    "uptime": time.time() - self.started, **self.counts}
+
+    def _ready(self) -> bool:
+        import heapq
+        while self._heap and self._heap[0][2].cancelled:
+            self._jobs.pop(heapq.heappop(self._heap)[2].id, None)
+            self._cond.notify_all()  # room for a blocked submit()
+        if not self._heap or self._exclusive:
+            return False
+        # A suspect waits for the pool to drain, then runs on its own
+        return self._running == 0 if self._heap[0][2].suspect else self._running < self.workers
+
+    def _schedule(self) -> None:
+        import heapq
+        from concurrent.futures.process import BrokenProcessPool
+        while True:
+            with self._cond:
+                while not self._closing and not self._ready():
+                    self._cond.wait()
+                if self._closing:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                self._cond.notify_all()  # room for a blocked submit()
+                self._running += 1
+                self._exclusive = job.suspect
+                pool = self._pool
+            try:
+                fut = pool.submit(daemon_job, job.id, job.pdf, job.out, job.opts, self.timeout, self._events)
+            except (BrokenProcessPool, RuntimeError):
+                fut = None
+            if fut is None:
+                self._crashed(job, pool)
+            else:
+                fut.add_done_callback(lambda f, job=job, pool=pool: self._finished(f, job, pool))
+
+    def _finished(self, fut, job: _DaemonJob, pool) -> None:
+        # batch_job never raises, so an exception here means the pool died under us
+        if fut.cancelled() or fut.exception() is not None:
+            self._crashed(job, pool)
+            return
+        with self._cond:
+            self._running -= 1
+            if job.suspect:
+                self._exclusive = False
+            self._cond.notify_all()
+
+    def _crashed(self, job: _DaemonJob, pool) -> None:
+        import heapq
+        with self._cond:
+            self._running -= 1
+            if pool is self._pool and not self._closing:
+                # A dead worker breaks the executor for everyone; start a fresh one
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+            retry = not job.suspect and not self._closing and not job.cancelled
+            if job.suspect:
+                self._exclusive = False
+            if retry:
+                job.suspect = True
+                heapq.heappush(self._heap, (-job.priority, next(self._seq), job))
+            else:
+                self._jobs.pop(job.id, None)
+                self.counts["failed"] += 1
+            self._cond.notify_all()
+        if not retry:
+            job.client.send({"id": job.id, "event": "error", "data": "worker process crashed"})
+
+    def _pump(self) -> None:
+        while True:
+            try:
+                job_id, kind, payload = self._events.get()
+            except (EOFError, OSError):
+                return  # manager gone at exit
+            if job_id is None:
+                return
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            if kind != "result":
+                job.client.send({"id": job_id, "event": kind, "data": payload})
+                continue
+            with self._cond:
+                self._jobs.pop(job_id, None)
+                self.counts["done" if payload["ok"] else "failed"] += 1
+            if payload["ok"]:
+                job.client.send({"id": job_id, "event": "done", "data": payload["out"], "stats": payload})
+            else:
+                job.client.send({"id": job_id, "event": "error", "data": payload["error"]})
+
+    def close(self) -> None:
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._events.put((None, None, None))
+        if self._pump_thread is not None:
+            self._pump_thread.join(timeout=5)
+        self._manager.shutdown()
+
+
+def _daemon_handler(daemon: ConversionDaemon, token: str | None = None):
+    """Request handler class; with `token`, a connection's first request must be {"op": "auth", "token": ...}."""
+    import hmac
+    import json
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            client = _DaemonClient(self.wfile)
+            authed = token is None
+            try:
+                for raw in self.rfile:
+                    if not raw.strip():
+                        continue
+                    try:
+                        req = json.loads(raw)
+                        op = req.get("op", "convert")
+                    except (ValueError, AttributeError):
+                        client.send({"event": "error", "data": "invalid JSON request"})
+                        continue
+                    if not authed:
+                        given = req.get("token") if op == "auth" else None
+                        if not isinstance(given, str) or not hmac.compare_digest(given, token):
+                            client.send({"event": "error", "data": "authentication required"})
+                            return
+                        authed = True
+                        continue
+                    if op == "auth":
+                        continue
+                    if op == "convert":
+                        try:
+                            daemon.submit(client, req)
+                        except (ValueError, OSError) as e:
+                            client.send({"id": req.get("id"), "event": "error", "data": str(e)})
+                    elif op == "stats":
+                        client.send({"event": "stats", "data": daemon.stats()})
+                    elif op == "shutdown":
+                        client.send({"event": "bye"})
+                        threading.Thread(target=self.server.shutdown, daemon=True).start()
+                        return
+                    else:
+                        client.send({"event": "error", "data": f"unknown op {op!r}"})
+            finally:
+                client.closed = True
+                daemon.cancel_client(client)
+
+    return Handler
+
+
+def serve_main(argv: list[str]) -> int:
+    import argparse
+    import socketserver
+    ap = argparse.ArgumentParser(prog="pdf_minner serve", description="Run a resident conversion service.")
+    ap.add_argument("--socket", type=Path, default=None, help="Unix socket path (default: in $XDG_RUNTIME_DIR)")
+    ap.add_argument("--port", type=int, default=None,
+                    help="listen on 127.0.0.1:PORT instead of a Unix socket; clients need the token file")
+    ap.add_argument("--token-file", type=Path, default=None,
+                    help="where --port writes its client token (default: next to the default socket)")
+    ap.add_argument("--root", dest="roots", type=Path, action="append", default=[],
+                    help="only accept PDFs and outputs inside this folder (repeatable)")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    ap.add_argument("--max-queue", type=int, default=1000, help="queued jobs before submitters are held back")
+    ap.add_argument("--queue-wait", type=float, default=30.0,
+                    help="seconds a submit waits for queue space before it is rejected")
+    ap.add_argument("--timeout", type=float, default=None, help="per-file time limit in seconds (POSIX only)")
+    ap.add_argument("--page-jobs", type=int, default=1, help="default processes per large PDF")
+    ap.add_argument("--backend", choices=("auto", "fastest") + BACKENDS, default="auto")
+    ap.add_argument("--keep-watermarks", action="store_true", help="default to no watermark removal")
+    ap.add_argument("--wm-mode", choices=("text", "layout"), default="text")
+    ap.add_argument("--format", dest="doc_format", choices=("auto",) + tuple(FORMATTERS), default="auto")
+    ap.add_argument("--fsync", choices=FSYNC_POLICIES, default="none")
+    ap.add_argument("--page-index", action="store_true", help="default to writing page offset sidecars")
+    ap.add_argument("--no-cache", action="store_true", help="always extract from scratch")
+    args = ap.parse_args(argv)
+
+    opts = {
+        "remove_wm": not args.keep_watermarks,
+        "page_jobs": max(1, args.page_jobs),
+        "cache": None if args.no_cache else default_cache(),
+        "backend": args.backend,
+        "wm_mode": args.wm_mode,
+        "doc_format": args.doc_format,
+        "fsync": args.fsync,
+        "page_index": args.page_index,
+    }
+    daemon = ConversionDaemon(
+        opts, workers=args.jobs, max_queue=max(1, args.max_queue), queue_wait=args.queue_wait, timeout=args.timeout,
+        roots=args.roots,
+    )
+    token_file = None
+    try:
+        if args.port is not None:
+            # Anyone on this host can connect to a TCP port: require a secret only we can read
+            import secrets
+            token = secrets.token_hex(32)
+            token_file = args.token_file or default_token_path()
+            _write_private(token_file, token)
+            server = socketserver.ThreadingTCPServer(("127.0.0.1", args.port), _daemon_handler(daemon, token))
+            where = f"127.0.0.1:{server.server_address[1]} (token in {token_file})"
+        else:
+            if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+                print(f"{Fore.RED}Unix sockets are not available here; use --port.{Style.RESET_ALL}", file=sys.stderr)
+                return 2
+            sock = args.socket or default_socket_path()
+            if sock.is_socket():
+                sock.unlink()
+            # Bind under a private umask so the socket is never reachable by others, not even briefly
+            old = os.umask(0o077)
+            try:
+                server = socketserver.ThreadingUnixStreamServer(str(sock), _daemon_handler(daemon))
+            finally:
+                os.umask(old)
+            where = str(sock)
+    except OSError as e:
+        daemon.close()
+        print(f"{Fore.RED}Cannot listen:{Style.RESET_ALL} {e}", file=sys.stderr)
+        return 2
+    server.daemon_threads = True
+    daemon.start()
+    import signal
+    if hasattr(signal, "SIGTERM"):
+        # Service managers stop us with SIGTERM; shut down as cleanly as on Ctrl+C
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"{Fore.GREEN}Listening{Style.RESET_ALL} on {where} with {daemon.workers} worker(s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        try:
+            (token_file or Path(where)).unlink()
+        except OSError:
+            pass
+    return 0
+
+
+def submit_jobs(address: str | Path | int, requests: list[dict], *, token_file: Path | None = None) -> Iterator[dict]:
+    """Send conversion requests to a running daemon and yield its events until all jobs finish.
+
+    `address` is a Unix socket path or a localhost TCP port; for a port the
+    token written by `serve` is read from `token_file` (default:
+    default_token_path()).
+    """
+    import json
+    import socket
+    if isinstance(address, int):
+        token = Path(token_file or default_token_path()).read_text(encoding="utf-8").strip()
+        sock = socket.create_connection(("127.0.0.1", address))
+    else:
+        token = None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(str(address))
+    with sock, sock.makefile("rb") as rf:
+        if token is not None:
+            sock.sendall((json.dumps({"op": "auth", "token": token}) + "\n").encode("utf-8"))
+        for req in requests:
+            sock.sendall((json.dumps(req) + "\n").encode("utf-8"))
+        pending = len(requests)
+        for raw in rf:
+            ev = json.loads(raw)
+            if ev["event"] == "error" and ev["data"] == "authentication required":
+                raise PermissionError("the daemon rejected the token")
+            yield ev
+            if ev["event"] in ("done", "error"):
+                pending -= 1
+                if pending <= 0:
+                    return
+
+
+def submit_main(argv: list[str]) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(prog="pdf_minner submit", description="Queue PDFs on a running `serve` daemon.")
+    ap.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or glob patterns")
+    ap.add_argument("-o", "--output", type=Path, default=None, help="output folder (default: next to each PDF)")
+    ap.add_argument("--socket", type=Path, default=None, help="daemon socket (default: as for `serve`)")
+    ap.add_argument("--port", type=int, default=None, help="daemon TCP port on 127.0.0.1")
+    ap.add_argument("--token-file", type=Path, default=None, help="token written by `serve --port` (default: as for serve)")
+    ap.add_argument("--priority", type=int, default=0, help="higher runs first (default: 0)")
+    ap.add_argument("--backend", choices=("auto", "fastest") + BACKENDS, default=None)
+    ap.add_argument("--keep-watermarks", action="store_true")
+    ap.add_argument("--format", dest="doc_format", choices=("auto",) + tuple(FORMATTERS), default=None)
+    ap.add_argument("-q", "--quiet", action="store_true", help="only print failures")
+    args = ap.parse_args(argv)
+
+    pairs = collect_pdfs(args.inputs, args.output)
+    if not pairs:
+        print(f"{Fore.RED}No PDF files found.{Style.RESET_ALL}", file=sys.stderr)
+        return 2
+    options = {}
+    if args.backend:
+        options["backend"] = args.backend
+    if args.keep_watermarks:
+        options["remove_wm"] = False
+    if args.doc_format:
+        options["doc_format"] = args.doc_format
+    reqs = [
+        {"path": str(pdf.resolve()), "out": str(out.resolve()), "priority": args.priority, "options": options}
+        for pdf, out in pairs
+    ]
+    address = args.port if args.port is not None else (args.socket or default_socket_path())
+    failed = 0
+    try:
+        for ev in submit_jobs(address, reqs, token_file=args.token_file):
+            if ev["event"] == "error":
+                failed += 1
+                print(f"{Fore.RED}FAIL{Style.RESET_ALL} [{ev.get('id')}] {ev['data']}")
+            elif ev["event"] == "done" and not args.quiet:
+                print(f"{Fore.GREEN}OK{Style.RESET_ALL}   [{ev['id']}] {ev['data']} ({ev['stats']['pages']} pages)")
+    except OSError as e:
+        print(f"{Fore.RED}Cannot reach the daemon at {address}:{Style.RESET_ALL} {e}", file=sys.stderr)
+        return 2
+    return 0 if failed == 0 else 1
+
+
+# -------- asyncio API --------
+
+class _LoopQueue:
+    """Queue-like `progress` sink that hands events to an asyncio.Queue from any thread."""
+
+    def __init__(self, loop, queue) -> None:
+        self.loop = loop
+        self.queue = queue
+
+    def put(self, item: tuple) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, tuple(item))
+        except RuntimeError:  # loop already closed; nobody is listening
+            pass
+
+
+class _AsyncBridge:
+    """Routes events from process-pool conversions back to their event loops.
+
+    One manager queue and one pump thread serve every in-flight conversion
+    in this process, however many there are.
+    """
+
+    def __init__(self) -> None:
+        import itertools
+        import multiprocessing
+        self.manager = multiprocessing.Manager()
+        self.events = self.manager.Queue()
+        self.routes: dict[int, _LoopQueue] = {}
+        self._ids = itertools.count(1)
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def open(self, loop, queue) -> tuple[int, _RelayProgress, object]:
+        job_id = next(self._ids)
+        self.routes[job_id] = _LoopQueue(loop, queue)
+        return job_id, _RelayProgress(self.events, job_id), self.manager.Event()
+
+    def close(self, job_id: int) -> None:
+        self.routes.pop(job_id, None)
+
+    def _pump(self) -> None:
+        while True:
+            try:
+                job_id, *item = self.events.get()
+            except (EOFError, OSError):
+                return
+            route = self.routes.get(job_id)
+            if route is not None:
+                route.put(item)
+
+
+_ASYNC_BRIDGE: _AsyncBridge | None = None
+_ASYNC_BRIDGE_LOCK = threading.Lock()
+
+
+def _async_bridge() -> _AsyncBridge:
+    global _ASYNC_BRIDGE
+    with _ASYNC_BRIDGE_LOCK:
+        if _ASYNC_BRIDGE is None:
+            _ASYNC_BRIDGE = _AsyncBridge()
+        return _ASYNC_BRIDGE
+
+
+def _async_job(pdf_path: Path, out_path: Path, opts: dict, progress, cancel) -> dict:
+    """Executor entry point: convert, then mark the end of the event stream."""
+    try:
+        return convert_file(pdf_path, out_path, progress=progress, cancel=cancel, **opts)
+    finally:
+        progress.put(("end", None))
+
+
+async def _conversion_events(pdf_path, out_path, executor, limit, opts: dict):
+    import asyncio
+    import contextlib
+    from concurrent.futures import ProcessPoolExecutor
+    loop = asyncio.get_running_loop()
+    pdf_path = Path(pdf_path)
+    out_path = Path(out_path) if out_path else pdf_path.with_suffix(".md")
+    opts = {"remove_wm": True, **opts}
+    async with limit if limit is not None else contextlib.nullcontext():
+        queue: asyncio.Queue = asyncio.Queue()
+        job_id = None
+        if isinstance(executor, ProcessPoolExecutor):
+            bridge = _async_bridge()
+            job_id, progress, cancel = bridge.open(loop, queue)
+        else:
+            progress, cancel = _LoopQueue(loop, queue), threading.Event()
+        fut = loop.run_in_executor(executor, _async_job, pdf_path, out_path, opts, progress, cancel)
+        getter = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, fut}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    if fut.exception() is not None:
+                        # The job failed without its "end" event (worker died, arguments or
+                        # result not picklable, ...): pass on what arrived, then raise below
+                        getter.cancel()
+                        getter = None
+                        while not queue.empty():
+                            kind, payload = queue.get_nowait()
+                            if kind != "end":
+                                yield kind, payload
+                        break
+                    await getter
+                kind, payload = getter.result()
+                getter = None
+                if kind == "end":
+                    break
+                yield kind, payload
+            yield "done", await fut
+        finally:
+            if getter is not None:
+                getter.cancel()
+            if not fut.done():
+                # Abandoned (task cancelled or iteration stopped): stop at the next page
+                cancel.set()
+                fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            if job_id is not None:
+                bridge.close(job_id)
+
+
+async def convert(
+    pdf_path: Path | str,
+    out_path: Path | str | None = None,
+    *,
+    executor=None,
+    limit=None,
+    on_event=None,
+    **opts,
+) -> dict:
+    """Convert one PDF without blocking the event loop; returns convert_file()'s stats.
+
+    The work runs in `executor` (default: the loop's thread pool; pass a
+    ProcessPoolExecutor for CPU-bound batches). `limit` is an
+    asyncio.Semaphore shared by callers to cap conversions in flight.
+    `on_event` is called on the loop with each ("status"/"progress", ...)
+    tuple. Cancelling the awaiting task stops the conversion at the next
+    page. Other keyword arguments go to convert_file() (remove_wm
+    defaults to True). Errors are raised as they would be by convert_file().
+    """
+    async for kind, payload in _conversion_events(pdf_path, out_path, executor, limit, opts):
+        if kind == "done":
+            return payload
+        if on_event is not None:
+            on_event((kind, payload))
+    raise RuntimeError("conversion ended without a result")  # pragma: no cover
+
+
+async def convert_iter(
+    pdf_path: Path | str,
+    out_path: Path | str | None = None,
+    *,
+    executor=None,
+    limit=None,
+    **opts,
+):
+    """Async generator of ("status"/"progress", ...) events, then ("done", stats) or ("error", message).
+
+    Same arguments as convert(). Leaving the loop early cancels the
+    conversion at the next page.
+    """
+    try:
+        async for ev in _conversion_events(pdf_path, out_path, executor, limit, opts):
+            yield ev
+    except Exception as e:
+        yield "error", str(e) or e.__class__.__name__
+
+
+# -------- Main loop --------
+
+def main(argv: list[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "convert":
+        return batch_main(argv[1:])
+    if argv and argv[0] == "profile":
+        return profile_main(argv[1:])
+    if argv and argv[0] == "export":
+        return export_main(argv[1:])
+    if argv and argv[0] == "preflight":
+        return preflight_main(argv[1:])
+    if argv and argv[0] == "cluster":
+        return cluster_main(argv[1:])
+    if argv and argv[0] == "serve":
+        return serve_main(argv[1:])
+    if argv and argv[0] == "submit":
+        return submit_main(argv[1:])
+
+    selected_file: Path | None = None
+    output_dir: Path | None = None
+    remove_wm = True
+    extract_cache = default_cache()
+
+    # Animations and screen clearing only make sense for a person at a
+    # terminal; piped or scripted runs go straight to the menu prompt.
+    interactive = sys.stdin.isatty() and sys.stdout.isatty()
+    if interactive and "--no-splash" not in argv and not os.environ.get("PDF_MINNER_NO_SPLASH"):
+        splash_rain_lightning(2.8)
+
+    while True:
+        if interactive:
+            clear_screen()
+            print(banner())
+        choice = input(menu(selected_file, output_dir, remove_wm)).strip()
+
+        if choice == "1":
+            f = choose_pdf_gui()
+            if f and f.suffix.lower() == ".pdf" and f.exists():
+                selected_file = f
+            else:
+                print(f"{Fore.RED}No valid PDF selected.{Style.RESET_ALL}")
+                input("Press Enter to continue...")
+
+        elif choice == "2":
+            d = choose_dir_gui()
+            if d:
+                output_dir = d
+            else:
+                print(f"{Fore.RED}No folder selected.{Style.RESET_ALL}")
+                input("Press Enter to continue...")
+
+        elif choice == "3":
+            remove_wm = not remove_wm
+
+        elif choice == "4":
+            if not selected_file:
+                print(f"{Fore.RED}Please select a PDF file first.{Style.RESET_ALL}")
+                input("Press Enter to continue...")
+                continue
+            if not output_dir:
+                # Default: next to the source file
+                output_dir = selected_file.parent
+
+            # 1) Extract text with spinner. With watermark removal on, long
+            # documents are previewed from a page sample first, so the
+            # question is asked while the full extraction carries on.
+            print(f"\n{Fore.YELLOW}Reading PDF...{Style.RESET_ALL}")
+            q: Queue = Queue()
+            t = threading.Thread(
+                target=extract_only_worker,
+                args=(selected_file, q, os.cpu_count() or 1, extract_cache),
+                daemon=True,
+            )
+            t.start()
+            selected_phrases = None
+            if remove_wm:
+                try:
+                    preview = preview_watermark_candidates(selected_file)
+                except Exception:
+                    # The full extraction reports anything real
+                    preview = None
+                if preview and preview[0] and t.is_alive():
+                    ranked, n_pages, n_sampled = preview
+                    print(f"Sampled {n_sampled} of {n_pages} pages; still reading the rest.")
+                    selected_phrases = ask_watermark_phrases(ranked)
+                    print()
+            ok, payload = run_with_spinner(t, q)
+            if not ok or not payload:
+                print(f"{Fore.RED}Error:{Style.RESET_ALL} {payload}")
+                input("Press Enter to continue...")
+                continue
+
+            text = payload
+            lines = None
+
+            # 2) Watermark interactive selection (optional)
+            if remove_wm:
+                # Split and normalized once for both ranking and removal
+                table = LineTable.from_text(text)
+                if selected_phrases is None:
+                    selected_phrases = ask_watermark_phrases(table.ranked(limit=20))
+                if selected_phrases:
+                    print(f"\nRemoving watermark: {', '.join(selected_phrases)}")
+                    lines = table.kept_lines(table.keep_mask(compile_watermark_matcher(selected_phrases)))
+                del table
+
+            # 3) Format and write
+            print(f"\n{Fore.YELLOW}Formatting and writing...{Style.RESET_ALL}")
+            if lines is None:
+                lines = text.splitlines()
+            del text
+            doc_format, md_lines = format_lines(lines)
+            print(f"Formatting as {doc_format}.")
+            out_path = output_dir / (selected_file.stem + ".md")
+            write_markdown(out_path, md_lines)
+            print(f"{Fore.GREEN}Done:{Style.RESET_ALL} {out_path}")
+            input("Press Enter to continue...")
+
+        elif choice == "5":
+            if interactive:
+                clear_screen()
+                print(banner())
             print(
                 "A small, practical PDF → Markdown converter.\n"
-                "• Formats screenplay-like text (scenes/characters/transitions) into simple Markdown.\n"
+                "• Formats screenplays, stage plays, transcripts and prose into simple Markdown.\n"
                 "• Can help remove short repeating lines that look like watermarks.\n\n"
                 "Goal: keep things readable and easy to process.\n"
                 "Helpful for AI/agent training or data pipelines when you just need clean text\n"
@@ -669,7 +6175,8 @@ def main() -> int:
 
         else:
             print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
-            time.sleep(0.8)
+            if interactive:
+                time.sleep(0.8)
 
 
 if __name__ == "__main__":
@@ -678,3 +6185,6 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nCancelled.")
         raise SystemExit(130)
+    except EOFError:
+        # Scripted input ran out before choosing "Exit"
+        raise SystemExit(0)
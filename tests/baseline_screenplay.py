@@ -0,0 +1,154 @@
+"""format_screenplay_md(), remove_watermarks_from_text() and
+remove_watermarks_by_selection() as first released, kept as the reference
+for equivalence tests."""
+import re
+
+SCENE_RE = re.compile(r"^(INT\.|EXT\.|INT/EXT\.|I/E\.)[\w\W]*")
+TRANSITION_RE = re.compile(r"^[A-Z][A-Z \-]+TO:\s*$")
+
+
+def format_screenplay_md(text: str) -> str:
+    lines = text.splitlines()
+    out: list[str] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        s = line.strip()
+        if not s:
+            out.append("")
+            i += 1
+            continue
+        if SCENE_RE.match(s):
+            out.append(f"## {s}")
+            i += 1
+            continue
+        if TRANSITION_RE.match(s):
+            out.append(f"> _{s}_")
+            i += 1
+            continue
+        if _is_character_line(s):
+            out.append(f"**{s}**")
+            i += 1
+            while i < len(lines):
+                nxt = lines[i].rstrip()
+                ns = nxt.strip()
+                if not ns:
+                    out.append("")
+                    i += 1
+                    break
+                if SCENE_RE.match(ns) or _is_character_line(ns) or TRANSITION_RE.match(ns):
+                    break
+                if ns.startswith("(") and ns.endswith(")") and len(ns) < 80:
+                    out.append(f"_{ns}_")
+                else:
+                    out.append(nxt)
+                i += 1
+            continue
+        out.append(line)
+        i += 1
+    cleaned: list[str] = []
+    blank_run = 0
+    for l in out:
+        if l.strip() == "":
+            blank_run += 1
+            if blank_run <= 2:
+                cleaned.append("")
+        else:
+            blank_run = 0
+            cleaned.append(l)
+    return "\n".join(cleaned) + ("\n" if cleaned and cleaned[-1] != "" else "")
+
+
+def _is_character_line(s: str) -> bool:
+    if not (2 <= len(s) <= 30):
+        return False
+    if not s.isupper():
+        return False
+    tmp = s.replace(" ", "").replace("-", "").replace("'", "")
+    return tmp.isalpha()
+
+
+# -------- Watermark detection/removal --------
+
+def _split_pages(text: str) -> list[str]:
+    # Many backends insert form feed between pages
+    if "\f" in text:
+        return text.split("\f")
+    # Fallback: single page
+    return [text]
+
+
+def _normalize_line(s: str) -> str:
+    return " ".join(s.strip().split())
+
+
+def detect_watermark_candidates(pages: list[str]) -> set[str]:
+    import collections
+    n = len(pages)
+    if n <= 1:
+        return set()
+    counts = collections.Counter()
+    for p in pages:
+        # consider unique short lines per page to reduce bias
+        seen = set()
+        for raw in p.splitlines():
+            s = _normalize_line(raw)
+            if not s:
+                continue
+            if len(s) > 60 or len(s) < 2:
+                continue
+            if s.isdigit():
+                continue
+            # ignore typical headings
+            if s.lower() in {"confidential", "draft"} or s.endswith(":"):
+                pass
+            seen.add(s)
+        for s in seen:
+            counts[s] += 1
+    # threshold: appears on >= 60% of pages and at least 3 pages
+    thresh = max(3, int(0.6 * n))
+    candidates = {s for s, c in counts.items() if c >= thresh}
+    return candidates
+
+
+def remove_watermarks_from_text(text: str) -> tuple[str, list[str]]:
+    pages = _split_pages(text)
+    cands = detect_watermark_candidates(pages)
+    if not cands:
+        return text, []
+    cleaned_pages: list[str] = []
+    for p in pages:
+        out_lines = []
+        for raw in p.splitlines():
+            s = _normalize_line(raw)
+            if s in cands:
+                continue
+            out_lines.append(raw)
+        cleaned_pages.append("\n".join(out_lines))
+    return "\n".join(cleaned_pages), sorted(cands)
+
+
+def remove_watermarks_by_selection(text: str, phrases: list[str]) -> str:
+    if not phrases:
+        return text
+    norms = [ _normalize_line(p) for p in phrases if p.strip() ]
+    pages = _split_pages(text)
+    cleaned_pages: list[str] = []
+    for p in pages:
+        out_lines = []
+        for raw in p.splitlines():
+            s = _normalize_line(raw)
+            remove = False
+            for n in norms:
+                if not n:
+                    continue
+                if s == n:
+                    remove = True
+                    break
+                if len(n) >= 3 and n in s and len(s) <= 120:
+                    remove = True
+                    break
+            if not remove:
+                out_lines.append(raw)
+        cleaned_pages.append("\n".join(out_lines))
+    return "\n".join(cleaned_pages)
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+
+@pytest.fixture
+def synth_pdf(tmp_path):
+    """Write a synthetic document from benchmarks/synth_pdf.py and return its path."""
+    import synth_pdf as sp
+
+    def make(kind: str = "screenplay", pages: int = 3, seed: int = 0) -> Path:
+        data, _ = sp.make_document(kind, pages, seed)
+        path = tmp_path / f"{kind}-{pages}-{seed}.pdf"
+        path.write_bytes(data)
+        return path
+
+    return make
@@ -0,0 +1,34 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import pdf_minner as pm
+
+
+def test_convert_raises_when_job_cannot_be_sent_to_worker(synth_pdf, tmp_path):
+    # A lambda callback can't be pickled: the future fails before the job emits "end"
+    metrics = pm.PipelineMetrics(callback=lambda rec: None)
+
+    async def run():
+        with ProcessPoolExecutor(1) as pool:
+            await asyncio.wait_for(
+                pm.convert(synth_pdf(), tmp_path / "out.md", executor=pool, metrics=metrics), timeout=30
+            )
+
+    with pytest.raises(Exception) as info:
+        asyncio.run(run())
+    assert not isinstance(info.value, asyncio.TimeoutError)
+    assert not (tmp_path / "out.md").exists()
+
+
+def test_convert_iter_reports_worker_failure_as_error(synth_pdf, tmp_path):
+    metrics = pm.PipelineMetrics(callback=lambda rec: None)
+
+    async def run():
+        with ProcessPoolExecutor(1) as pool:
+            return [ev async for ev in pm.convert_iter(synth_pdf(), tmp_path / "out.md", executor=pool,
+                                                       metrics=metrics)]
+
+    events = asyncio.run(asyncio.wait_for(run(), timeout=30))
+    assert events[-1][0] == "error"
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import pdf_minner as pm
+
+
+def _fill(cache, n, page="x" * 2000):
+    for i in range(n):
+        cache.put(f"{i:064x}", "pypdf", [f"{i} {page}"])
+        # Distinct mtimes, oldest first, so LRU order is well defined
+        os.utime(cache._entry(f"{i:064x}"), (1_000_000 + i, 1_000_000 + i))
+
+
+def _size(root):
+    return sum(f.stat().st_size for f in root.glob("*/*.jsonl.gz"))
+
+
+def test_writes_under_budget_scan_the_directory_once(tmp_path, monkeypatch):
+    cache = pm.ExtractionCache(tmp_path, max_bytes=1 << 30)
+    scans = []
+    evict = pm.ExtractionCache.evict
+    monkeypatch.setattr(pm.ExtractionCache, "evict", lambda self: scans.append(1) or evict(self))
+    _fill(cache, 200)
+    assert len(scans) == 1
+    assert pm._CACHE_USAGE[str(tmp_path)] == _size(tmp_path)
+
+
+def test_eviction_keeps_the_budget_and_drops_oldest_first(tmp_path, monkeypatch):
+    cache = pm.ExtractionCache(tmp_path)
+    cache.put("0" * 64, "pypdf", ["probe"])
+    entry = cache._entry("0" * 64).stat().st_size
+    cache.max_bytes = entry * 40
+    scans = []
+    evict = pm.ExtractionCache.evict
+    monkeypatch.setattr(pm.ExtractionCache, "evict", lambda self: scans.append(1) or evict(self))
+    _fill(cache, 200)
+    assert _size(tmp_path) <= cache.max_bytes
+    assert len(scans) < 200 // 3
+    assert cache.get(f"{199:064x}") is not None
+    assert cache.get(f"{0:064x}") is None
+
+
+def _run(cache, pdf, backend="auto"):
+    metrics = pm.PipelineMetrics()
+    name, pages = pm.open_page_stream(pdf, cache=cache, backend=backend, metrics=metrics)
+    list(pages)
+    return name, metrics.cache
+
+
+needs_both = pytest.mark.skipif(
+    not (pm.backend_available("pdfminer") and pm.backend_available("pypdf")), reason="needs pdfminer and pypdf"
+)
+
+
+@needs_both
+def test_pinned_and_auto_runs_share_entries(synth_pdf, tmp_path):
+    cache, pdf = pm.ExtractionCache(tmp_path), synth_pdf()
+    assert _run(cache, pdf, "pdfminer") == ("pdfminer", "miss")
+    assert _run(cache, pdf) == ("pdfminer", "hit")
+
+
+@needs_both
+def test_auto_fallback_is_not_served_once_the_preferred_backend_appears(synth_pdf, tmp_path, monkeypatch):
+    cache, pdf = pm.ExtractionCache(tmp_path), synth_pdf()
+    available = pm.backend_available
+    with monkeypatch.context() as m:
+        m.setattr(pm, "backend_available", lambda name: name != "pdfminer" and available(name))
+        assert _run(cache, pdf) == ("pypdf", "miss")
+        assert _run(cache, pdf) == ("pypdf", "hit")
+    assert _run(cache, pdf) == ("pdfminer", "miss")
+
+
+@needs_both
+def test_auto_fallback_after_a_failure_is_cached(synth_pdf, tmp_path, monkeypatch):
+    cache, pdf = pm.ExtractionCache(tmp_path), synth_pdf()
+
+    def broken(*a, **k):
+        raise ValueError("bad page tree")
+
+    monkeypatch.setattr(pm, "_iter_pages_pdfminer", broken)
+    assert _run(cache, pdf) == ("pypdf", "miss")
+    assert _run(cache, pdf) == ("pypdf", "hit")
+
+
+@needs_both
+def test_backend_upgrade_misses(synth_pdf, tmp_path, monkeypatch):
+    cache, pdf = pm.ExtractionCache(tmp_path), synth_pdf()
+    assert _run(cache, pdf) == ("pdfminer", "miss")
+    monkeypatch.setattr(pm, "_backend_signature", lambda name, exe=None: {"version": "99"})
+    assert _run(cache, pdf) == ("pdfminer", "miss")
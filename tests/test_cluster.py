@@ -0,0 +1,72 @@
+import json
+import os
+import time
+
+import pdf_minner as pm
+
+
+def _lease(path, token, age=0.0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"node": "other", "pid": 1, "token": token}))
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+def test_stale_lease_is_taken_over(tmp_path):
+    path = tmp_path / "leases" / "0000.lease"
+    _lease(path, "dead", age=600)
+    lease = pm.ShardLease.acquire(path, "me", 60)
+    assert lease is not None and pm.ShardLease._token(path) == lease.token
+    lease.release()
+    assert list(path.parent.iterdir()) == []
+
+
+def test_live_lease_is_left_alone(tmp_path):
+    path = tmp_path / "leases" / "0000.lease"
+    _lease(path, "alive")
+    assert pm.ShardLease.acquire(path, "me", 60) is None
+    assert pm.ShardLease._token(path) == "alive"
+
+
+def test_takeover_in_progress_elsewhere_is_not_disturbed(tmp_path):
+    path = tmp_path / "leases" / "0000.lease"
+    _lease(path, "dead", age=600)
+    pm.ShardLease._marker(path, "dead").touch()
+    assert pm.ShardLease.acquire(path, "me", 60) is None
+    assert pm.ShardLease._token(path) == "dead"
+
+
+def test_lease_replaced_after_the_staleness_check_is_kept(tmp_path, monkeypatch):
+    # Another node takes the dead lease over between our check and our move:
+    # its fresh lease must survive
+    path = tmp_path / "leases" / "0000.lease"
+    _lease(path, "dead", age=600)
+    claim = pm.ShardLease._claim
+
+    def racing_claim(marker, ttl):
+        _lease(path, "winner")
+        return claim(marker, ttl)
+
+    monkeypatch.setattr(pm.ShardLease, "_claim", staticmethod(racing_claim))
+    assert pm.ShardLease.acquire(path, "me", 60) is None
+    assert pm.ShardLease._token(path) == "winner"
+    assert sorted(p.name for p in path.parent.iterdir()) == ["0000.lease"]
+
+
+def test_release_keeps_a_lease_someone_else_took_over(tmp_path):
+    path = tmp_path / "leases" / "0000.lease"
+    lease = pm.ShardLease.acquire(path, "me", 60)
+    _lease(path, "new-holder")
+    lease.release()
+    assert pm.ShardLease._token(path) == "new-holder"
+
+
+def test_cluster_work_reports_os_errors(tmp_path, monkeypatch, capsys):
+    (tmp_path / pm.CLUSTER_PLAN).write_text("{}")
+
+    def fail(self, *a, **k):
+        raise PermissionError(13, "Permission denied", str(tmp_path / "shards"))
+
+    monkeypatch.setattr(pm.ClusterRun, "work", fail)
+    assert pm.cluster_main(["work", str(tmp_path), "-q"]) == 2
+    assert "Cannot work" in capsys.readouterr().err
@@ -0,0 +1,72 @@
+import json
+import socket
+import threading
+
+import pytest
+
+import pdf_minner as pm
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    d = pm.ConversionDaemon({"remove_wm": True}, workers=1, roots=[tmp_path])
+    yield d
+    d.close()
+
+
+def _client():
+    sent = []
+    client = pm._DaemonClient(None)
+    client.send = sent.append
+    return client, sent
+
+
+def test_submit_requires_markdown_output_inside_roots(daemon, synth_pdf, tmp_path):
+    pdf = synth_pdf()
+    client, sent = _client()
+    with pytest.raises(ValueError, match=r"\.md"):
+        daemon.submit(client, {"path": str(pdf), "out": str(tmp_path / "notes.txt")})
+    with pytest.raises(ValueError, match="outside"):
+        daemon.submit(client, {"path": str(pdf), "out": str(tmp_path.parent / "elsewhere.md")})
+    daemon.submit(client, {"path": str(pdf), "out": str(tmp_path / "ok.md")})
+    assert sent[-1]["event"] == "queued"
+
+
+def test_tcp_connection_needs_the_token(daemon):
+    import socketserver
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), pm._daemon_handler(daemon, "s3cret"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        def ask(*lines):
+            with socket.create_connection(server.server_address) as s, s.makefile("rb") as rf:
+                for line in lines:
+                    s.sendall((json.dumps(line) + "\n").encode())
+                return json.loads(rf.readline())
+
+        assert ask({"op": "stats"})["data"] == "authentication required"
+        assert ask({"op": "auth", "token": "wrong"}, {"op": "stats"})["data"] == "authentication required"
+        assert ask({"op": "auth", "token": "s3cret"}, {"op": "stats"})["event"] == "stats"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("bad", [
+    {"path": 5},
+    {"out": ["x.md"]},
+    {"options": ["backend"]},
+    {"options": {"remove_wm": "yes"}},
+    {"options": {"page_jobs": "4"}},
+    {"options": {"page_jobs": True}},
+    {"options": {"page_jobs": 0}},
+    {"options": {"wm_mode": "pixels"}},
+    {"priority": [1]},
+    {"priority": {"high": 1}},
+    {"id": {"x": 1}},
+])
+def test_malformed_request_fields_are_rejected(daemon, synth_pdf, tmp_path, bad):
+    client, sent = _client()
+    req = {"path": str(synth_pdf()), "out": str(tmp_path / "ok.md"), **bad}
+    with pytest.raises(ValueError):
+        daemon.submit(client, req)
+    assert sent == []
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import pdf_minner as pm
+
+pytestmark = pytest.mark.skipif(
+    not (pm.backend_available("pdfminer") or pm.backend_available("pypdf")), reason="needs a PDF backend"
+)
+
+
+def _rows(out):
+    index = json.loads((out / "index.json").read_text())
+    rows = []
+    for shard in index["shards"]:
+        rows += [json.loads(line) for line in (out / shard["name"]).read_text().splitlines()]
+    return index, rows
+
+
+def _export(inputs, out, *extra):
+    return pm.export_main([*map(str, inputs), "-o", str(out), "-j", "1", "--no-cache", "-q",
+                           "--compression", "none", *extra])
+
+
+def test_second_export_with_dedup_appends_to_the_corpus(synth_pdf, tmp_path):
+    out = tmp_path / "corpus"
+    first, second = synth_pdf("prose", 4, seed=1), synth_pdf("screenplay", 3, seed=2)
+    assert _export([first], out, "--dedup", "skip") == 0
+    index, rows = _rows(out)
+    assert len(rows) == 4
+
+    assert _export([first, second], out, "--dedup", "skip") == 0
+    index, rows = _rows(out)
+    assert [s["name"] for s in index["shards"]] == ["part-00000.jsonl", "part-00001.jsonl"]
+    assert sorted(d["source"] for d in index["documents"]) == sorted([str(first), str(second)])
+    assert len(rows) == index["records"] == 7
+
+
+def test_stale_dedup_index_is_refused(synth_pdf, tmp_path):
+    out = tmp_path / "corpus"
+    pdf = synth_pdf("prose", 4, seed=1)
+    assert _export([pdf], out, "--dedup", "skip") == 0
+    for shard in out.glob("part-*"):
+        shard.unlink()
+    (out / "index.json").unlink()
+    assert _export([pdf], out, "--dedup", "skip") == 2
+    assert not (out / "index.json").exists()
+
+
+def test_rerun_does_not_index_same_content_copies_again(synth_pdf, tmp_path, capsys):
+    out = tmp_path / "corpus"
+    pdf = synth_pdf("screenplay", 3, seed=3)
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(pdf.read_bytes())
+    for _ in range(3):
+        assert _export([pdf, copy], out) == 0
+    index, rows = _rows(out)
+    assert sorted(d["source"] for d in index["documents"]) == sorted([str(pdf), str(copy)])
+    assert len(rows) == 3
+    assert "0 exported, 2 skipped" in capsys.readouterr().out.split("Summary:")[-1]
@@ -0,0 +1,41 @@
+import pdf_minner as pm
+
+
+def _prose(text: str) -> list[str]:
+    name, out = pm.format_lines(text.splitlines(), "prose")
+    assert name == "prose"
+    return [line for line in out if line]
+
+
+def test_lowercase_part_and_book_continue_the_paragraph():
+    text = (
+        "She had packed the car before anyone was awake and\n"
+        "part of the reason she left\n"
+        "was the silence in the house, the letter she meant to finish, the\n"
+        "book was still on the table\n"
+        "open at the same page where the\n"
+        "Part of the deal\n"
+        "had been written in pencil.\n"
+    )
+    assert _prose(text) == [
+        "She had packed the car before anyone was awake and part of the reason she left was the silence "
+        "in the house, the letter she meant to finish, the book was still on the table open at the same "
+        "page where the Part of the deal had been written in pencil."
+    ]
+
+
+def test_numbered_keywords_are_headings():
+    text = "Chapter 2\nThe rain had not stopped\nfor three days.\nPART IV\nBook One\nPrologue\n"
+    out = _prose(text)
+    assert out[0].lstrip("# ") == "Chapter 2"
+    assert out[1] == "The rain had not stopped for three days."
+    assert [line.lstrip("# ") for line in out[2:]] == ["PART IV", "Book One", "Prologue"]
+
+
+def test_stageplay_speaker_with_title_stays_whole():
+    text = "ACT I\n\nNORA. Torvald!\n\nDR. RANK. Yes, I am going.\n\nMRS. LINDE: Then stay.\n\n(She goes out)\n"
+    name, out = pm.format_lines(text.splitlines(), "stageplay")
+    assert [line for line in out if line] == [
+        "## ACT I", "**NORA.** Torvald!", "**DR. RANK.** Yes, I am going.", "**MRS. LINDE:** Then stay.",
+        "_(She goes out)_",
+    ]
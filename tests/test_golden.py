@@ -0,0 +1,80 @@
+"""Golden Markdown for every formatter, from benchmarks/synth_pdf documents.
+
+The inputs are the documents' ground-truth page lines, so the expected
+output doesn't depend on an extraction backend. After an intended change
+to a formatter, regenerate the files with PDF_MINNER_UPDATE_GOLDEN=1 and
+review the diff.
+"""
+import os
+import random
+from pathlib import Path
+
+import pytest
+import synth_pdf
+
+import baseline_screenplay
+import pdf_minner as pm
+
+GOLDEN = Path(__file__).parent / "golden"
+KINDS = ("screenplay", "stageplay", "transcript", "prose", "plain")
+
+
+def _lines(kind: str, pages: int = 3, seed: int = 0) -> list[str]:
+    return [line for page in synth_pdf.document_pages(kind, pages, seed) for line in page]
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_formatter_output_matches_golden(kind):
+    name, out = pm.format_lines(_lines(kind))
+    assert name == kind
+    text = "\n".join(out) + "\n"
+    path = GOLDEN / f"{kind}.md"
+    if os.environ.get("PDF_MINNER_UPDATE_GOLDEN"):
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    assert text == path.read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_forced_format_matches_detected(kind):
+    lines = _lines(kind)
+    assert list(pm.format_lines(lines, kind)[1]) == list(pm.format_lines(lines)[1])
+
+
+@pytest.mark.parametrize("kind", ("screenplay", "watermarked"))
+@pytest.mark.parametrize("seed", range(5))
+def test_screenplay_matches_baseline(kind, seed):
+    text = "\n".join(_lines(kind, 4, seed)) + "\n"
+    assert pm.format_screenplay_md(text) == baseline_screenplay.format_screenplay_md(text)
+
+
+def test_screenplay_matches_baseline_on_random_lines():
+    pool = ["INT. HOUSE - DAY", "EXT. YARD", "JOHN", "MARY O'NEIL", "(beat)", "(quietly whispering)", "CUT TO:",
+            "", "   ", "Hello there.", "Some action line here.", "  indented  ", "X", "JEAN-LUC", "DR. OKAFOR",
+            "SMASH CUT TO:  ", "  (to herself)  ", "I/E. CAR", "\tTABBED\t", "(" + "x" * 80 + ")", "ÉLISE"]
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "\n".join(rng.choice(pool) for _ in range(rng.randint(0, 40)))
+        if rng.random() < 0.3:
+            text += "\n"
+        assert pm.format_screenplay_md(text) == baseline_screenplay.format_screenplay_md(text), repr(text)
+
+
+@pytest.mark.skipif(not (pm.backend_available("pdfminer") or pm.backend_available("pypdf")),
+                    reason="needs a PDF backend")
+@pytest.mark.parametrize("kind", KINDS)
+def test_converted_pdf_is_detected_as_its_kind(kind, synth_pdf, tmp_path):
+    stats = pm.convert_file(synth_pdf(kind), tmp_path / "out.md", remove_wm=False, cache=None)
+    assert stats["format"] == kind
+
+
+@pytest.mark.skipif(not pm.backend_available("pdfminer"), reason="needs pdfminer")
+@pytest.mark.parametrize("kind", ("screenplay", "watermarked"))
+def test_watermark_removal_matches_baseline(kind, synth_pdf, tmp_path):
+    # Blank lines at page ends must survive watermark removal, as they did
+    # when the whole text was cleaned at once
+    from pdfminer.high_level import extract_text
+    path = synth_pdf(kind, 40)
+    pm.convert_file(path, tmp_path / "out.md", remove_wm=True, cache=None, backend="pdfminer")
+    text, _ = baseline_screenplay.remove_watermarks_from_text(extract_text(str(path)))
+    assert (tmp_path / "out.md").read_text(encoding="utf-8") == baseline_screenplay.format_screenplay_md(text)
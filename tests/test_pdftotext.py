@@ -0,0 +1,50 @@
+import os
+import subprocess
+
+import pytest
+
+import pdf_minner as pm
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="fake pdftotext is a shell script")
+
+
+@pytest.fixture
+def fake_pdftotext(tmp_path):
+    # Prints the address-space limit it runs under, one "page" per call
+    exe = tmp_path / "pdftotext"
+    exe.write_text('#!/bin/sh\nprintf "limit %s\\f" "$(ulimit -v)"\n')
+    exe.chmod(0o755)
+    return str(exe)
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_memory_cap_applies_without_preexec_fn(synth_pdf, fake_pdftotext, monkeypatch, concurrency):
+    popen = subprocess.Popen
+    seen = []
+
+    def spy(*args, **kwargs):
+        seen.append(kwargs.get("preexec_fn"))
+        return popen(*args, **kwargs)
+
+    monkeypatch.setattr(subprocess, "Popen", spy)
+    engine = pm.PdftotextEngine(concurrency=concurrency, chunk_pages=1, mem_limit_mb=512, exe=fake_pdftotext)
+    pages = list(engine.iter_pages(synth_pdf("prose", 3)))
+    assert pages == ["limit 524288"] * len(seen)
+    assert seen and not any(seen)
+
+
+def test_pages_arrive_as_soon_as_they_are_complete(synth_pdf, tmp_path):
+    # The second page is only printed once the first has reached us
+    flag = tmp_path / "got-first-page"
+    exe = tmp_path / "slow-pdftotext"
+    exe.write_text(
+        '#!/bin/sh\nprintf "one\\f"\n'
+        f'i=0; while [ ! -e "{flag}" ] && [ $i -lt 100 ]; do sleep 0.05; i=$((i+1)); done\n'
+        f'if [ -e "{flag}" ]; then printf "two\\f"; else printf "held back\\f"; fi\n'
+    )
+    exe.chmod(0o755)
+    pages = []
+    for page in pm.PdftotextEngine(exe=str(exe)).iter_pages(synth_pdf("prose", 3)):
+        pages.append(page)
+        flag.touch()
+    assert pages == ["one", "two"]
@@ -0,0 +1,56 @@
+import pytest
+
+import pdf_minner as pm
+
+pypdf = pytest.importorskip("pypdf")
+
+
+def _encrypted(tmp_path, name, user_password):
+    w = pypdf.PdfWriter()
+    w.add_blank_page(200, 200)
+    w.encrypt(user_password=user_password, owner_password="owner", algorithm="RC4-128")
+    path = tmp_path / name
+    with open(path, "wb") as f:
+        w.write(f)
+    return path
+
+
+def test_preflight_reports_encryption(tmp_path):
+    assert pm.preflight_pdf(_encrypted(tmp_path, "open.pdf", ""))["encryption"] == "empty-password"
+    info = pm.preflight_pdf(_encrypted(tmp_path, "locked.pdf", "secret"))
+    assert info["encryption"] == "password" and not info["ok"]
+
+
+@pytest.mark.parametrize("own_verdict", [False, None])
+def test_backend_decides_when_own_check_says_locked_or_unknown(tmp_path, monkeypatch, own_verdict):
+    # A handler our check gets wrong (or AES-256, which it can't check) must
+    # not stop a file the backends open with the empty password
+    monkeypatch.setattr(pm, "_empty_password_opens", lambda enc, doc_id: own_verdict)
+    path = _encrypted(tmp_path, f"open-{own_verdict}.pdf", "")
+    info = pm.preflight_pdf(path)
+    assert info["ok"] and info["encryption"] == "empty-password"
+    assert pm.schedule_jobs([(path,)])[1] == []
+    name, pages = pm.open_page_stream(path)
+    assert list(pages) == [""]
+
+
+def test_locked_file_still_fails_fast(tmp_path):
+    with pytest.raises(RuntimeError, match="password"):
+        pm.open_page_stream(_encrypted(tmp_path, "locked.pdf", "secret"))
+
+
+def test_conversion_reuses_or_skips_preflight(synth_pdf, tmp_path, monkeypatch):
+    pdf = synth_pdf()
+    [job], _ = pm.schedule_jobs([(pdf, tmp_path / "out.md", {"remove_wm": False}, None)])
+    info = job[2]["preflight"]
+    assert info["pages"] == 3
+
+    def no_second_read(path):
+        raise AssertionError("preflight ran again")
+
+    monkeypatch.setattr(pm, "preflight_pdf", no_second_read)
+    assert pm.convert_file(pdf, tmp_path / "a.md", remove_wm=False, preflight=info)["pages"] == 3
+    assert pm.convert_file(pdf, tmp_path / "b.md", remove_wm=False, preflight=False)["pages"] == 3
+    with pytest.raises(RuntimeError, match="password"):
+        pm.convert_file(pdf, tmp_path / "c.md", remove_wm=False,
+                        preflight={**info, "encryption": "password", "error": "password-protected PDF"})
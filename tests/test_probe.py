@@ -0,0 +1,30 @@
+import pytest
+
+import pdf_minner as pm
+
+pytestmark = pytest.mark.skipif(not pm.backend_available("pdfminer"), reason="needs pdfminer")
+
+
+def test_first_probe_in_a_process_reads_an_untimed_page(synth_pdf, monkeypatch):
+    monkeypatch.setattr(pm, "_WARM_BACKENDS", set())
+    monkeypatch.setattr(pm, "backend_available", lambda name: name == "pdfminer")
+    calls = []
+    timing = []
+    extract, clock = pm.extract_page_range, pm.time.perf_counter
+
+    def spy(name, path, start, stop):
+        calls.append(bool(timing))
+        return extract(name, path, start, stop)
+
+    def perf_counter():
+        timing.append(True)
+        return clock()
+
+    monkeypatch.setattr(pm, "extract_page_range", spy)
+    monkeypatch.setattr(pm.time, "perf_counter", perf_counter)
+    pdf = synth_pdf("screenplay", 6)
+    pm.probe_backends(pdf)
+    assert calls[0] is False and "pdfminer.converter" in pm.sys.modules
+    calls.clear()
+    pm.probe_backends(pdf)
+    assert len(calls) == pm.PROBE_PAGES and all(calls)
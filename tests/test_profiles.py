@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+import pdf_minner as pm
+
+
+def test_failed_save_keeps_the_previous_profile(tmp_path, monkeypatch):
+    path = tmp_path / "studio.json"
+    pm.WatermarkProfile("studio", ["DRAFT – DO NOT COPY"], docs=3, pages=30).save(path)
+    dump = json.dump
+
+    def crash(obj, fp, **kw):
+        fp.write('{"version": 1, "na')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(json, "dump", crash)
+    with pytest.raises(KeyboardInterrupt):
+        pm.WatermarkProfile("studio", ["NEW"]).save(path)
+    monkeypatch.setattr(json, "dump", dump)
+    assert json.loads(path.read_text(encoding="utf-8"))["phrases"] == ["DRAFT – DO NOT COPY"]
+    assert [p.name for p in tmp_path.iterdir()] == ["studio.json"]
+    assert pm.WatermarkProfile.load(str(path)).docs == 3
@@ -0,0 +1,16 @@
+"""The startup budget from benchmarks/check_startup.py, enforced by the test suite."""
+import py_compile
+
+import check_startup
+import pytest
+
+
+@pytest.mark.parametrize("argv", [[], ["convert", "--help"]], ids=["import", "convert-help"])
+def test_no_heavy_modules_at_startup(argv):
+    assert check_startup.heavy_modules(argv) == []
+
+
+def test_import_time_within_budget():
+    py_compile.compile(str(check_startup.ROOT / "pdf_minner.py"), doraise=True)
+    best = min(check_startup.import_ms() for _ in range(5))
+    assert best <= check_startup.IMPORT_BUDGET_MS, f"import pdf_minner took {best:.1f} ms"
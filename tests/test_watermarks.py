@@ -0,0 +1,27 @@
+import random
+
+import baseline_screenplay
+import pdf_minner as pm
+
+
+def test_long_phrases_compile_and_match_exactly():
+    long = "x" * 500
+    matcher = pm.WatermarkMatcher([long, "y" * 121])
+    assert matcher(long) and matcher("y" * 121)
+    assert not matcher("x" * 499)
+
+
+def test_selection_matches_baseline():
+    rng = random.Random(0)
+    words = ["CONFIDENTIAL", "draft", "Page", "copy", "DO NOT", "x", "studio", "©", "ab"]
+
+    def line(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    for _ in range(300):
+        phrases = [line(rng.randint(1, 3)) for _ in range(rng.randint(1, 6))]
+        phrases += ["lorem " * rng.randint(20, 40)] if rng.random() < 0.3 else []
+        text = "\f".join("\n".join(line(rng.randint(0, 30)) for _ in range(8)) for _ in range(3))
+        expected = baseline_screenplay.remove_watermarks_by_selection(text, phrases)
+        got = "\n".join(pm.remove_watermarks_by_selection(text, phrases).split("\f"))
+        assert got == expected